@@ -0,0 +1,122 @@
+"""
+Benchmark of the cross-fund analytics: pairwise weight overlap of every
+fund's top 10 holdings and sector exposure by management company, with the
+sparse matrices of fundatascraper.analytics against loops over the funds.
+
+The holdings are drawn from a universe of securities whose popularity falls
+off like a real market's, so a few securities are held by many funds.
+
+Usage: python benchmarks/bench_analytics.py [funds] [securities] [companies]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+# pylint: disable=wrong-import-position
+import numpy as np
+import pandas as pd
+from fundatascraper import analytics
+
+SECTORS = ['Energy', 'Financial Services', 'Technology', 'Industrials',
+           'Healthcare', 'Real Estate', 'Utilities', 'Consumer Defensive']
+
+
+def tables(num_funds, num_securities, num_companies):
+    """Return synthetic top10_holdings, allocations and single_values."""
+    rng = np.random.default_rng(0)
+    popularity = 1.0 / np.arange(1, num_securities + 1)
+    popularity /= popularity.sum()
+    holdings, allocations, single_values = [], [], []
+    for fund_id in range(num_funds):
+        href = '/fund?id={}'.format(fund_id)
+        securities = rng.choice(num_securities, 10, replace=False,
+                                p=popularity)
+        weights = np.sort(rng.uniform(1.0, 8.0, 10))[::-1].round(2)
+        holdings.extend(
+            {'href': href, 'rank': rank + 1,
+             'security': 'Security {}'.format(security), 'weight': weight}
+            for rank, (security, weight) in enumerate(zip(securities,
+                                                          weights)))
+        sectors = rng.dirichlet(np.ones(len(SECTORS))) * 100
+        allocations.extend(
+            {'href': href, 'allocation_type': 'sector', 'category': sector,
+             'weight': weight} for sector, weight in zip(SECTORS, sectors))
+        single_values.append({
+            'href': href,
+            'management_co': 'Company {}'.format(fund_id % num_companies)})
+    return (pd.DataFrame(holdings), pd.DataFrame(allocations),
+            pd.DataFrame(single_values))
+
+
+def loop_overlap(holdings):
+    """Return {(href_a, href_b): overlap} with a loop over fund pairs."""
+    funds = {}
+    for row in holdings.itertuples():
+        funds.setdefault(row.href, {})[row.security] = row.weight
+    hrefs = sorted(funds)
+    pairs = {}
+    for index, href_a in enumerate(hrefs):
+        held_a = funds[href_a]
+        for href_b in hrefs[index + 1:]:
+            held_b = funds[href_b]
+            shared = sum(min(weight, held_b[security])
+                         for security, weight in held_a.items()
+                         if security in held_b)
+            if shared:
+                pairs[href_a, href_b] = shared
+    return pairs
+
+
+def loop_exposure(allocations, single_values):
+    """Return {(company, sector): average weight} with loops over funds."""
+    companies = dict(zip(single_values.href, single_values.management_co))
+    totals, counts = {}, {}
+    for row in allocations.itertuples():
+        key = companies[row.href], row.category
+        totals[key] = totals.get(key, 0.0) + row.weight
+    for href in allocations.href.unique():
+        counts[companies[href]] = counts.get(companies[href], 0) + 1
+    return {key: total / counts[key[0]] for key, total in totals.items()}
+
+
+def timed(function, *args):
+    """Return the result of function(*args) and the seconds it took."""
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def main(num_funds=3000, num_securities=2000, num_companies=50):
+    """Compute both analytics both ways and compare results and times."""
+    holdings, allocations, single_values = tables(
+        num_funds, num_securities, num_companies)
+    print("{} funds, {} securities, {} companies".format(
+        num_funds, num_securities, num_companies))
+
+    matrix, encode_time = timed(analytics.holdings_matrix, holdings)
+    pairs, sparse_time = timed(analytics.overlap_pairs, matrix)
+    expected, loop_time = timed(loop_overlap, holdings)
+    assert len(pairs) == len(expected), (len(pairs), len(expected))
+    assert all(abs(expected[href_a, href_b] - shared) < 1e-6
+               for href_a, href_b, shared in pairs.itertuples(index=False))
+    print("  overlap of {} pairs: encode {:.2f} s, sparse {:.2f} s,"
+          " loops {:.1f} s".format(len(pairs), encode_time, sparse_time,
+                                    loop_time))
+
+    groups = single_values.set_index('href').management_co
+    start = time.perf_counter()
+    exposure = analytics.group_exposure(
+        analytics.allocation_matrix(allocations, 'sector'), groups)
+    sparse_time = time.perf_counter() - start
+    expected, loop_time = timed(loop_exposure, allocations, single_values)
+    assert all(abs(exposure.loc[company, sector] - weight) < 1e-6
+               for (company, sector), weight in expected.items())
+    print("  sector exposure of {} companies: sparse {:.1f} ms,"
+          " loops {:.1f} ms".format(len(exposure), sparse_time * 1000,
+                                    loop_time * 1000))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:4]])
@@ -0,0 +1,94 @@
+"""
+Benchmark of database output: the time to answer "funds of one management
+company with an MER under 1%" from funds.sqlite, against loading the
+pickled single_values table and filtering it with pandas.
+
+Usage: python benchmarks/bench_database.py [funds] [companies]
+"""
+import glob
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+# pylint: disable=wrong-import-position
+import pandas as pd
+from fundatascraper import normalize, writers
+from fundatascraper.fund_page import FundProfileScraper
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+QUERY = ("SELECT href, mer FROM single_values"
+         " WHERE management_co = ? AND mer < 1")
+
+
+def funds(num_funds, num_companies):
+    """Yield the records of `num_funds` funds spread over companies."""
+    pages = []
+    for path in sorted(glob.glob(os.path.join(FIXTURE_DIR, '*.html'))):
+        with open(path, 'rb') as fixture:
+            pages.append(FundProfileScraper('replay', html=fixture.read())
+                         .scrape_records('/fund'))
+    random.seed(0)
+    for fund_id in range(num_funds):
+        href = '/fund?id={}'.format(fund_id)
+        records = {table: [dict(row, href=href) for row in rows]
+                   for table, rows in pages[fund_id % len(pages)].items()}
+        records['single_values'][0].update(
+            management_co='Company {}'.format(fund_id % num_companies),
+            mer='{:.2f}%'.format(random.uniform(0.1, 3.0)))
+        yield records
+
+
+def write(output_format, directory, num_funds, num_companies):
+    """Write every fund in `output_format`; return the seconds taken."""
+    start = time.perf_counter()
+    sinks = writers.open_sinks(output_format, directory)
+    for records in funds(num_funds, num_companies):
+        for table, rows in records.items():
+            sinks[table].write_many(rows)
+    writers.close_sinks(sinks)
+    return time.perf_counter() - start
+
+
+def main(num_funds=20000, num_companies=100):
+    """Write both formats and time the query against each."""
+    directory = tempfile.mkdtemp()
+    try:
+        print("{} funds of {} companies".format(num_funds, num_companies))
+        for output_format in ('pickle', 'sqlite'):
+            print("  write {}: {:.1f} s".format(output_format, write(
+                output_format, directory, num_funds, num_companies)))
+
+        company = 'Company 7'
+        start = time.perf_counter()
+        frame = normalize.normalize_single_values(
+            pd.read_pickle(os.path.join(directory, 'single_values.pkl')))
+        expected = frame[(frame.management_co == company) &
+                         (frame.mer < 1)]
+        pickle_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        database = sqlite3.connect(os.path.join(directory, 'funds.sqlite'))
+        rows = database.execute(QUERY, (company,)).fetchall()
+        query_time = time.perf_counter() - start
+        plan = database.execute('EXPLAIN QUERY PLAN ' + QUERY,
+                                (company,)).fetchall()
+        database.close()
+
+        assert sorted(href for href, _ in rows) == \
+            sorted(expected.href), (len(rows), len(expected))
+        print("  {} funds: sqlite {:.2f} ms, pickle + pandas {:.1f} ms"
+              .format(len(rows), query_time * 1000, pickle_time * 1000))
+        print("  plan: " + plan[0][-1])
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:3]])
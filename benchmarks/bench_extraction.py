@@ -0,0 +1,83 @@
+"""
+Micro-benchmark comparing field extraction by repeated soup.find() calls
+against the id index built by FundProfileScraper, over the saved pages in
+benchmarks/fixtures.
+
+Usage: python benchmarks/bench_extraction.py [repeat]
+"""
+import glob
+import os
+import sys
+import timeit
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+# pylint: disable=wrong-import-position
+from fundatascraper import fund_page, parsers
+from fundatascraper.fund_page import FundProfileScraper
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+SINGLE_VALUE_FIELDS = fund_page.SINGLE_VALUE_FIELDS
+MAP_IDS = (fund_page.ASSET_ALLOCATION_MAP, fund_page.SECTOR_ALLOCATION_MAP,
+           fund_page.GEO_ALLOCATION_MAP)
+
+
+def extract_with_find(soup):
+    """Extract every field the way the scraper did before the id index."""
+    values = {name: soup.find("span", {"id": element_id}).text
+              for name, element_id in SINGLE_VALUE_FIELDS}
+    maps = [[x["title"] for x in soup.find("map", {"id": map_id})
+             .find_all("area")] for map_id in MAP_IDS]
+    rows = [[td.text for td in tr.find_all('td')] for tr in
+            soup.find("table", {"id": fund_page.TOP10_HOLDINGS_TABLE})
+            .find_all("tr")]
+    return values, maps, rows
+
+
+def extract_with_index(scraper):
+    """Build the scraper's id index and extract every field through it."""
+    document = scraper.document
+    document.elements = parsers.index_elements(document.soup)
+    values = scraper.scrape_all_single_value()
+    maps = [scraper.scrape_map_titles(map_id) for map_id in MAP_IDS]
+    rows = document.table_rows(fund_page.TOP10_HOLDINGS_TABLE)
+    return values, maps, rows
+
+
+def bench(label, func, repeat):
+    """Time `func` and print the best per-call time in milliseconds."""
+    best = min(timeit.repeat(func, number=1, repeat=repeat))
+    print("  {:<28} {:8.2f} ms".format(label, best * 1000))
+    return best
+
+
+def main(repeat=20):
+    """Run the benchmark over every fixture page."""
+    for path in sorted(glob.glob(os.path.join(FIXTURE_DIR, '*.html'))):
+        with open(path, 'rb') as fixture:
+            html = fixture.read()
+        print(os.path.basename(path))
+
+        soup = BeautifulSoup(html, 'html.parser')
+        scraper = FundProfileScraper(path, html=html)
+        # The default document only holds the elements the scraper reads;
+        # index the same full tree soup.find() walks.
+        scraper.document.close()
+        scraper.document = parsers.parse_document(html, 'html.parser', ())
+        assert extract_with_find(soup) == extract_with_index(scraper)
+
+        parse = bench("parse", lambda: BeautifulSoup(html, 'html.parser'),
+                      repeat)
+        find = bench("extract (soup.find)",
+                     lambda: extract_with_find(soup), repeat)
+        index = bench("index + extract",
+                      lambda: extract_with_index(scraper), repeat)
+        print("  {:<28} {:8.1f}x".format("extract speedup", find / index))
+        print("  {:<28} {:8.1f}x".format("parse + extract speedup",
+                                        (parse + find) / (parse + index)))
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:2]])
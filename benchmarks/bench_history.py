@@ -0,0 +1,106 @@
+"""
+Benchmark of the snapshot history: store size and the time to load one
+fund's NAVPS history and a cross section, against keeping a full pickle of
+single_values for every day and unpickling them all.
+
+Each day a fraction of the funds change their NAVPS; the rest are copied
+from the fixture pages unchanged.
+
+Usage: python benchmarks/bench_history.py [funds] [days] [changed]
+"""
+import glob
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+# pylint: disable=wrong-import-position
+import pandas as pd
+from fundatascraper.fund_page import FundProfileScraper
+from fundatascraper.history import SnapshotStore
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+def directory_size(directory):
+    """Return the total size in bytes of the files under `directory`."""
+    return sum(os.path.getsize(os.path.join(root, name))
+               for root, _, names in os.walk(directory) for name in names)
+
+
+def fixture_records():
+    """Return the records of every fixture page."""
+    records = []
+    for path in sorted(glob.glob(os.path.join(FIXTURE_DIR, '*.html'))):
+        with open(path, 'rb') as fixture:
+            records.append(FundProfileScraper('replay', html=fixture.read())
+                           .scrape_records('/fund'))
+    return records
+
+
+def day_funds(records, num_funds, day, changed):
+    """Return the (href, records) of every fund on day number `day`."""
+    funds = []
+    for fund_id in range(num_funds):
+        href = '/fund?id={}'.format(fund_id)
+        fund_records = {
+            table: [dict(row, href=href) for row in rows]
+            for table, rows in records[fund_id % len(records)].items()}
+        if fund_id < num_funds * changed:
+            fund_records['single_values'][0]['navps'] = \
+                '{:.4f}'.format(10 + day + fund_id / 1000.0)
+        funds.append((href, fund_records))
+    return funds
+
+
+def main(num_funds=2000, days=10, changed=0.1):
+    """Append `days` days to a store and to daily pickles, then read both."""
+    records = fixture_records()
+    directory = tempfile.mkdtemp()
+    store_dir = os.path.join(directory, 'history')
+    pickle_dir = os.path.join(directory, 'pickles')
+    os.makedirs(pickle_dir)
+    try:
+        dates = ['2024-01-{:02d}'.format(day + 1) for day in range(days)]
+        start = time.perf_counter()
+        with SnapshotStore(store_dir) as store:
+            for day, date in enumerate(dates):
+                funds = day_funds(records, num_funds, day, float(changed))
+                store.append(date, funds)
+                pd.DataFrame([fund_records['single_values'][0]
+                              for _, fund_records in funds]).to_pickle(
+                                  os.path.join(pickle_dir, date + '.pkl'))
+            print("{} funds, {} days, {:.0%} changed daily: {:.1f} s to"
+                  " write".format(num_funds, days, float(changed),
+                                  time.perf_counter() - start))
+            print("  size: history {:.1f} MB, daily pickles {:.1f} MB".format(
+                directory_size(store_dir) / 1e6,
+                directory_size(pickle_dir) / 1e6))
+
+            start = time.perf_counter()
+            history = store.history('/fund?id=0', ['navps'])
+            history_time = time.perf_counter() - start
+            start = time.perf_counter()
+            section = store.cross_section(dates[days // 2], ['navps'])
+            section_time = time.perf_counter() - start
+        start = time.perf_counter()
+        frames = [pd.read_pickle(os.path.join(pickle_dir, date + '.pkl'))
+                  for date in dates]
+        pickled = [frame[frame.href == '/fund?id=0'].navps
+                   for frame in frames]
+        pickle_time = time.perf_counter() - start
+        assert len(history) == days == len(pickled), len(history)
+        assert len(section) == num_funds, len(section)
+        print("  fund history: {:.1f} ms, unpickling every day: {:.1f} ms"
+              .format(history_time * 1000, pickle_time * 1000))
+        print("  cross section: {:.1f} ms".format(section_time * 1000))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main(*[float(arg) if '.' in arg else int(arg)
+           for arg in sys.argv[1:4]])
@@ -0,0 +1,122 @@
+"""
+Memory benchmark: parses the recorded corpus over and over as a crawl of
+`funds` funds would, and streams the records into the output sinks, while
+sampling the resident set size. Each size runs in its own process so the
+peaks do not carry over. With --tracemalloc the peak of Python allocations
+is reported as well, at several times the run time.
+
+Memory stays flat when the last samples are no higher than the first ones
+after warm up.
+
+Usage: python benchmarks/bench_memory.py [--sizes 1000,10000]
+           [--parser html.parser] [--output-format parquet] [--tracemalloc]
+"""
+import argparse
+import gc
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+# pylint: disable=wrong-import-position
+from fundatascraper import writers
+from fundatascraper.parsers import BACKENDS
+from fundatascraper.pipeline import parse_page
+from replay import load_corpus
+
+SAMPLES = 10
+
+
+def rss_megabytes():
+    """Return the current resident set size of this process in MB."""
+    try:
+        with open('/proc/self/statm') as statm:
+            pages = int(statm.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / 1e6
+    except (OSError, ValueError):
+        # Without /proc only the peak is available.
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3
+
+
+def measure(num_funds, parser, output_format, trace):
+    """
+    Parse and write `num_funds` funds in this process.
+    returns: dict of the RSS samples, peak RSS and tracemalloc peak in MB.
+    """
+    pages = load_corpus()
+    if trace:
+        tracemalloc.start()
+    samples = []
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory() as directory:
+        sinks = writers.open_sinks(output_format, directory)
+        for fund_id in range(num_funds):
+            href = '/fund?id={}'.format(fund_id)
+            records, _ = parse_page('replay', href,
+                                    pages[fund_id % len(pages)], parser)
+            for table, rows in records.items():
+                sinks[table].write_many(rows)
+            if (fund_id + 1) % max(num_funds // SAMPLES, 1) == 0:
+                samples.append(round(rss_megabytes(), 1))
+        writers.close_sinks(sinks)
+    result = {
+        'funds': num_funds,
+        'seconds': time.perf_counter() - start,
+        'rss_samples_mb': samples,
+        'peak_rss_mb': resource.getrusage(
+            resource.RUSAGE_SELF).ru_maxrss / 1e3,
+        'gc_collections': sum(stats['collections']
+                              for stats in gc.get_stats()),
+    }
+    if trace:
+        result['tracemalloc_peak_mb'] = \
+            tracemalloc.get_traced_memory()[1] / 1e6
+        tracemalloc.stop()
+    return result
+
+
+def main(argv=None):
+    """Measure each size in a child process and print the results."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', default='1000,10000',
+                        help='comma separated numbers of funds')
+    parser.add_argument('--parser', choices=BACKENDS, default='html.parser')
+    parser.add_argument('--output-format', choices=writers.FORMATS,
+                        default='parquet')
+    parser.add_argument('--tracemalloc', action='store_true')
+    parser.add_argument('--child', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child is not None:
+        print(json.dumps(measure(args.child, args.parser,
+                                 args.output_format, args.tracemalloc)))
+        return
+
+    for size in args.sizes.split(','):
+        command = [sys.executable, os.path.abspath(__file__), '--child', size,
+                   '--parser', args.parser,
+                   '--output-format', args.output_format]
+        if args.tracemalloc:
+            command.append('--tracemalloc')
+        result = json.loads(subprocess.run(
+            command, check=True, stdout=subprocess.PIPE,
+            universal_newlines=True).stdout)
+        line = ('{funds:6} funds  {seconds:6.1f} s  peak RSS'
+                ' {peak_rss_mb:6.1f} MB  {gc_collections} gc runs'
+                .format(**result))
+        if 'tracemalloc_peak_mb' in result:
+            line += '  tracemalloc peak {:6.1f} MB'.format(
+                result['tracemalloc_peak_mb'])
+        print(line)
+        print('        RSS samples (MB): ' + ' '.join(
+            str(sample) for sample in result['rss_samples_mb']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""
+Conformance check and benchmark for the parser backends in
+fundatascraper.parsers over the saved pages in benchmarks/fixtures.
+
+Every backend must produce exactly the same scrape_* results as the
+html.parser backend; the script stops with an AssertionError otherwise.
+
+Usage: python benchmarks/bench_parsers.py [repeat]
+"""
+import glob
+import io
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+# pylint: disable=wrong-import-position
+from fundatascraper.fund_page import FundProfileScraper
+from fundatascraper.parsers import BACKENDS
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+def scrape_everything(scraper):
+    """Return the output of every scrape_* method of `scraper`."""
+    return (scraper.scrape_all_single_value(),
+            scraper.scrape_asset_allocation(),
+            scraper.scrape_sector_allocation(),
+            scraper.scrape_geo_allocation(),
+            scraper.scrape_top10_holdings().values.tolist())
+
+
+def check_conformance(path, html):
+    """Assert every backend scrapes the same values from str, bytes and
+    file-like input."""
+    expected = scrape_everything(FundProfileScraper(path, html=html))
+    for backend in BACKENDS:
+        for source in (html, html.decode('utf-8'), io.BytesIO(html)):
+            scraper = FundProfileScraper(path, html=source, parser=backend)
+            assert scrape_everything(scraper) == expected, \
+                "{} differs on {}".format(backend, path)
+
+
+def main(repeat=20):
+    """Run the conformance check and benchmark over every fixture page."""
+    for path in sorted(glob.glob(os.path.join(FIXTURE_DIR, '*.html'))):
+        with open(path, 'rb') as fixture:
+            html = fixture.read()
+        print(os.path.basename(path))
+        check_conformance(path, html)
+
+        baseline = None
+        for backend in BACKENDS:
+            best = min(timeit.repeat(
+                lambda backend=backend: scrape_everything(
+                    FundProfileScraper(path, html=html, parser=backend)),
+                number=1, repeat=repeat))
+            baseline = baseline or best
+            print("  {:<14} {:8.2f} ms {:6.1f}x".format(
+                backend, best * 1000, baseline / best))
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:2]])
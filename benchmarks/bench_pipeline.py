@@ -0,0 +1,64 @@
+"""
+Benchmark of parse throughput of fundatascraper.pipeline.CrawlPipeline
+with an increasing number of parser processes. Pages are replayed from the
+saved fixtures in benchmarks/fixtures, so no requests are made.
+
+Usage: python benchmarks/bench_pipeline.py [pages] [parser]
+"""
+import glob
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+# pylint: disable=wrong-import-position
+from fundatascraper.pipeline import CrawlPipeline
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+BASE_URL = 'http://replay'
+
+
+class ReplayFetcher:
+    """Stands in for ConcurrentFetcher, returning fixture pages instantly."""
+    def __init__(self, pages):
+        self.pages = pages
+
+    def fetch_all(self, urls, return_exceptions=False):
+        # pylint: disable=unused-argument
+        """Yield (url, body) for each url from the fixture pages."""
+        for index, url in enumerate(urls):
+            yield url, self.pages[index % len(self.pages)]
+
+
+def main(num_pages=400, parser="html.parser"):
+    """Time the pipeline over `num_pages` pages for 0..cpu_count workers."""
+    pages = []
+    for path in sorted(glob.glob(os.path.join(FIXTURE_DIR, '*.html'))):
+        with open(path, 'rb') as fixture:
+            pages.append(fixture.read())
+    hrefs = ['/fund/{}'.format(index) for index in range(num_pages)]
+
+    workers = [0, 1]
+    while workers[-1] * 2 <= os.cpu_count():
+        workers.append(workers[-1] * 2)
+
+    baseline = None
+    print("{} pages, {} parser".format(num_pages, parser))
+    for parse_workers in workers:
+        pipeline = CrawlPipeline(ReplayFetcher(pages), BASE_URL,
+                                 parse_workers=parse_workers, parser=parser)
+        start = time.perf_counter()
+        results = list(pipeline.run(hrefs))
+        elapsed = time.perf_counter() - start
+        assert len(results) == num_pages
+        assert not any(isinstance(records, Exception)
+                       for _, records in results)
+        rate = num_pages / elapsed
+        baseline = baseline or rate
+        print("  {:>2} workers {:8.1f} pages/s {:6.2f}x".format(
+            parse_workers, rate, rate / baseline))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 400, *sys.argv[2:3])
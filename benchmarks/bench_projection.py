@@ -0,0 +1,58 @@
+"""
+Benchmark of field projection: parse time and record size per page with
+every field and table, against only a few single valued fields.
+
+Usage: python benchmarks/bench_projection.py [fields] [repeat]
+
+where fields is comma separated (default: navps,fund_1year_return).
+"""
+import glob
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+# pylint: disable=wrong-import-position
+from fundatascraper.fund_page import FundProfileScraper
+from fundatascraper.parsers import BACKENDS
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+def scrape(html, backend, fields=None, tables=None):
+    """Parse one page and return its records."""
+    return FundProfileScraper('replay', html=html, parser=backend,
+                              fields=fields, tables=tables)\
+        .scrape_records('/fund')
+
+
+def main(fields="navps,fund_1year_return", repeat=20):
+    """Time each backend with and without projection."""
+    fields = fields.split(',')
+    tables = ['single_values']
+    for path in sorted(glob.glob(os.path.join(FIXTURE_DIR, '*.html'))):
+        with open(path, 'rb') as fixture:
+            html = fixture.read()
+        print("{}: all fields vs {}".format(os.path.basename(path),
+                                            ", ".join(fields)))
+        for backend in BACKENDS:
+            try:
+                full = scrape(html, backend)
+            except ImportError:
+                continue
+            projected = scrape(html, backend, fields, tables)
+            times = [min(timeit.repeat(
+                lambda args=args: scrape(html, backend, *args),
+                number=1, repeat=int(repeat)))
+                     for args in ((None, None), (fields, tables))]
+            sizes = [len(json.dumps(records))
+                     for records in (full, projected)]
+            print("  {:<12} {:7.2f} -> {:6.2f} ms   {:6} -> {:4} bytes"
+                  .format(backend, times[0] * 1000, times[1] * 1000,
+                          sizes[0], sizes[1]))
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:3])
@@ -0,0 +1,101 @@
+"""
+Benchmark of fundatascraper.session.HttpSession against one urlopen() call
+per page. The fixture page is served from a local HTTP/1.1 server that
+supports keep-alive and gzip, and waits `handshake` milliseconds on every
+new connection to stand in for the TCP/TLS setup cost of a remote host.
+
+Usage: python benchmarks/bench_session.py [pages] [handshake_ms]
+"""
+import gzip
+import os
+import sys
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+# pylint: disable=wrong-import-position
+from fundatascraper.session import HttpSession
+
+FIXTURE = os.path.join(os.path.dirname(__file__), 'fixtures',
+                       'fund_page.html')
+
+
+def make_handler(page, handshake):
+    """Return a request handler class serving `page` at every path."""
+    compressed = gzip.compress(page)
+
+    class Handler(BaseHTTPRequestHandler):
+        """Serves the fixture, gzipped if the client accepts it."""
+        protocol_version = "HTTP/1.1"
+        # Headers and body are written separately, which with Nagle's
+        # algorithm stalls every keep-alive response on a delayed ACK.
+        disable_nagle_algorithm = True
+
+        def setup(self):
+            time.sleep(handshake)
+            super().setup()
+
+        def do_GET(self):  # pylint: disable=invalid-name
+            """Send the page."""
+            body = page
+            self.send_response(200)
+            if "gzip" in self.headers.get("Accept-Encoding", ""):
+                body = compressed
+                self.send_header("Content-Encoding", "gzip")
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):  # pylint: disable=arguments-differ
+            pass
+
+    return Handler
+
+
+def bench_urlopen(url, num_pages):
+    """Fetch `num_pages` pages with a new urlopen() call for each."""
+    received = 0
+    for _ in range(num_pages):
+        with urllib.request.urlopen(url) as response:
+            received += len(response.read())
+    return received, num_pages
+
+
+def bench_session(url, num_pages):
+    """Fetch `num_pages` pages over one HttpSession."""
+    session = HttpSession()
+    for _ in range(num_pages):
+        session.get(url)
+    session.close()
+    return session.bytes_received, session.transport.connections_opened
+
+
+def main(num_pages=200, handshake_ms=20):
+    """Print bytes received and latency per page for both clients."""
+    with open(FIXTURE, 'rb') as fixture:
+        page = fixture.read()
+    server = ThreadingHTTPServer(
+        ('127.0.0.1', 0), make_handler(page, handshake_ms / 1000.0))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = 'http://127.0.0.1:{}/fund'.format(server.server_address[1])
+
+    print("{} pages of {} bytes, {} ms per new connection".format(
+        num_pages, len(page), handshake_ms))
+    for name, bench in (("urlopen", bench_urlopen),
+                        ("HttpSession", bench_session)):
+        start = time.perf_counter()
+        received, connections = bench(url, num_pages)
+        elapsed = time.perf_counter() - start
+        print("{:12} {:8.1f} KB received  {:4} connections"
+              "  {:7.2f} ms/page".format(name, received / 1024.0, connections,
+                                         1000 * elapsed / num_pages))
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:3]])
@@ -0,0 +1,87 @@
+"""
+Check and benchmark of the sharded crawl: a coordinator with local worker
+processes crawls the replay server, while one extra worker is killed part
+way through its shard to show the shard being handed to another worker
+once its lease runs out. The merged output must hold every fund once.
+
+Usage: python benchmarks/bench_sharded.py [funds] [local_workers]
+"""
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+# pylint: disable=wrong-import-position
+import pandas as pd
+from fundatascraper.shards import ShardQueue
+from replay import ReplayServer
+
+SCRIPT = os.path.join(os.path.dirname(__file__), os.pardir,
+                      'scrape_fund_details.py')
+
+
+def wait_for_lease(queue_dir, pid):
+    """Wait until the worker process `pid` holds a shard lease."""
+    queue = ShardQueue(queue_dir)
+    try:
+        while not queue.db.execute(
+                "SELECT 1 FROM shards WHERE status = 'leased'"
+                " AND worker LIKE ?", ('%-{}'.format(pid),)).fetchone():
+            time.sleep(0.05)
+    finally:
+        queue.close()
+
+
+def main(num_funds=200, local_workers=2):
+    """Run the sharded crawl and check the merged output."""
+    directory = tempfile.mkdtemp()
+    queue_dir = os.path.join(directory, 'queue')
+    output_dir = os.path.join(directory, 'out')
+    try:
+        with ReplayServer(num_funds) as server:
+            options = ['--base-url', server.base_url,
+                       '--search-url', server.search_url,
+                       '--rate', '1e9', '--burst', '4', '--lease', '3',
+                       '--progress-interval', '0', '--output-format',
+                       'pickle', '--output-dir', output_dir]
+            start = time.perf_counter()
+            coordinator = subprocess.Popen(
+                [sys.executable, SCRIPT, '--coordinator', queue_dir,
+                 '--shard-size', str(max(num_funds // 10, 1)),
+                 '--local-workers', str(local_workers)] + options,
+                stdout=subprocess.DEVNULL)
+            while not os.path.exists(os.path.join(queue_dir,
+                                                  'queue.sqlite')):
+                time.sleep(0.1)
+            doomed = subprocess.Popen(
+                [sys.executable, SCRIPT, '--worker', queue_dir] + options,
+                stdout=subprocess.DEVNULL)
+            wait_for_lease(queue_dir, doomed.pid)
+            doomed.send_signal(signal.SIGKILL)
+            doomed.wait()
+            coordinator.wait()
+            elapsed = time.perf_counter() - start
+
+        frame = pd.read_pickle(os.path.join(output_dir,
+                                            'single_values.pkl'))
+        queue = ShardQueue(queue_dir)
+        attempts = [int(os.path.basename(path).split('.')[1])
+                    for path in queue.completed_journals()]
+        queue.close()
+        assert coordinator.returncode == 0, coordinator.returncode
+        assert len(frame) == num_funds == frame.href.nunique(), len(frame)
+        print("{} funds, {} shards ({} reassigned) with {} local workers:"
+              " {:.1f} s".format(num_funds, len(attempts),
+                                 sum(attempt > 1 for attempt in attempts),
+                                 local_workers, elapsed))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:3]])
@@ -0,0 +1,261 @@
+"""
+Local replay of the fundata.com pages the scraper reads, for benchmarks.
+
+ReplayServer serves a search listing of any number of funds, paged through
+ASP.NET style __doPostBack links like Search.aspx, and a fund profile page
+for every fund in it. Fund pages are taken in turn from a corpus directory
+of recorded pages; by default the saved pages in benchmarks/fixtures. The
+server speaks HTTP/1.1 with keep-alive and gzip, so it exercises the same
+code paths as the live site without making any requests to it.
+
+A corpus can be recorded from the page cache of a real crawl:
+
+    python scrape_fund_details.py --cache-dir cache ...
+    python benchmarks/replay.py record cache benchmarks/corpus
+
+and the server can be run on its own to point the scraper at:
+
+    python benchmarks/replay.py serve [num_funds] [port]
+"""
+import glob
+import gzip
+import html
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+# pylint: disable=wrong-import-position
+from fundatascraper.fundlist import FUND_LINK_TITLE
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+CORPUS_DIR = os.path.join(os.path.dirname(__file__), 'corpus')
+
+SEARCH_PATH = '/mutualfunds/Search.aspx'
+FUND_PATH = '/mutualfunds/FundProfile.aspx'
+GRID_TARGET = 'ctl00$MainContent$gvFunds'
+
+# Pager links shown around the current page, as in the ASP.NET GridView.
+PAGER_BLOCK = 10
+
+
+def load_corpus(directory=None):
+    """
+    Return the bodies of the recorded fund pages in `directory` (default:
+    benchmarks/corpus if it exists, otherwise benchmarks/fixtures).
+    """
+    if directory is None:
+        directory = CORPUS_DIR if os.path.isdir(CORPUS_DIR) else FIXTURE_DIR
+    pages = []
+    for path in sorted(glob.glob(os.path.join(directory, '*.html'))):
+        with open(path, 'rb') as page:
+            pages.append(page.read())
+    if not pages:
+        raise ValueError("No .html pages in {}".format(directory))
+    return pages
+
+
+def pager_links(page, num_pages):
+    """Return the (argument, label) pairs of the pager shown on `page`."""
+    first = (page - 1) // PAGER_BLOCK * PAGER_BLOCK + 1
+    last = min(first + PAGER_BLOCK - 1, num_pages)
+    links = []
+    if first > 1:
+        links.append(("Page$" + str(first - 1), "..."))
+    for number in range(first, last + 1):
+        links.append(("Page$" + str(number), str(number)))
+    if last < num_pages:
+        links.append(("Page$" + str(last + 1), "..."))
+    return links
+
+
+def render_search_page(page, num_funds, funds_per_page):
+    """Render page number `page` of a search listing of `num_funds`."""
+    num_pages = max(1, -(-num_funds // funds_per_page))
+    first_fund = (page - 1) * funds_per_page
+    rows = []
+    for fund_id in range(first_fund,
+                         min(first_fund + funds_per_page, num_funds)):
+        rows.append(
+            '<tr><td><a title="{}" href="{}?id={}">Replay Fund {}</a></td>'
+            '<td>Replay Management Co</td></tr>'.format(
+                html.escape(FUND_LINK_TITLE), FUND_PATH, fund_id, fund_id))
+    pager = []
+    for argument, label in pager_links(page, num_pages):
+        if argument == "Page$" + str(page):
+            pager.append('<td><span>{}</span></td>'.format(label))
+        else:
+            pager.append(
+                '<td><a href="javascript:__doPostBack(\'{}\',\'{}\')">{}</a>'
+                '</td>'.format(GRID_TARGET, argument, label))
+    return (
+        '<html><body><form method="post" action="./Search.aspx" id="form1">'
+        '<input type="hidden" name="__EVENTTARGET" value="" />'
+        '<input type="hidden" name="__EVENTARGUMENT" value="" />'
+        '<input type="hidden" name="__VIEWSTATE" value="page{page}{pad}" />'
+        '<input type="hidden" name="__EVENTVALIDATION" value="{page}" />'
+        '<input type="text" name="ctl00$MainContent$txtName" value="" />'
+        '<table id="ctl00_MainContent_gvFunds">{rows}'
+        '<tr><td colspan="2"><table><tr>{pager}</tr></table></td></tr>'
+        '</table></form></body></html>'
+    ).format(page=page, pad="x" * 2000, rows="".join(rows),
+             pager="".join(pager)).encode("utf-8")
+
+
+def make_handler(pages, num_funds, funds_per_page, delay=0.0):
+    """
+    Return a request handler class replaying `pages`, waiting `delay`
+    seconds before each response.
+    """
+    compressed = [gzip.compress(page) for page in pages]
+
+    class Handler(BaseHTTPRequestHandler):
+        """Serves the search listing and fund pages."""
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def send_body(self, body, zipped=None):
+            """Send a 200 response, gzipped if the client accepts it."""
+            if delay:
+                time.sleep(delay)
+            self.send_response(200)
+            if "gzip" in self.headers.get("Accept-Encoding", ""):
+                body = zipped if zipped is not None else gzip.compress(body)
+                self.send_header("Content-Encoding", "gzip")
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):  # pylint: disable=invalid-name
+            """Send the first search page or a fund page."""
+            parts = urlsplit(self.path)
+            if parts.path == SEARCH_PATH:
+                self.send_body(render_search_page(1, num_funds,
+                                                  funds_per_page))
+                return
+            fund_id = parse_qs(parts.query).get("id", [""])[0]
+            if parts.path != FUND_PATH or not fund_id.isdigit() or \
+                    int(fund_id) >= num_funds:
+                self.send_error(404)
+                return
+            index = int(fund_id) % len(pages)
+            self.send_body(pages[index], compressed[index])
+
+        def do_POST(self):  # pylint: disable=invalid-name
+            """Answer a pager postback with the requested search page."""
+            length = int(self.headers.get("Content-Length", 0))
+            form = parse_qs(self.rfile.read(length).decode("utf-8"))
+            argument = form.get("__EVENTARGUMENT", ["Page$1"])[0]
+            page = int(argument.partition("$")[2] or 1)
+            self.send_body(render_search_page(page, num_funds,
+                                              funds_per_page))
+
+        def log_message(self, *args):  # pylint: disable=arguments-differ
+            pass
+
+    return Handler
+
+
+class QuietServer(ThreadingHTTPServer):
+    """HTTP server that ignores clients dropping their connections."""
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class ReplayServer:
+    """
+    Replays a listing of `num_funds` funds, `funds_per_page` per search page,
+    on 127.0.0.1 from a background thread, answering each request after
+    `delay` seconds to stand in for the latency of the real site. Use as a
+    context manager.
+    """
+    def __init__(self, num_funds, pages=None, funds_per_page=25, port=0,
+                 delay=0.0):
+        self.num_funds = num_funds
+        self.pages = pages if pages is not None else load_corpus()
+        self.server = QuietServer(
+            ('127.0.0.1', port),
+            make_handler(self.pages, num_funds, funds_per_page, delay))
+        self.thread = None
+
+    @property
+    def base_url(self):
+        """Url the fund page hrefs are relative to."""
+        return 'http://127.0.0.1:{}'.format(self.server.server_address[1])
+
+    @property
+    def search_url(self):
+        """Url of the first search page."""
+        return self.base_url + SEARCH_PATH
+
+    def start(self):
+        """Start serving in a daemon thread."""
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                                       daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving."""
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def record_corpus(cache_dir, corpus_dir=CORPUS_DIR):
+    """
+    Copy the fund pages in the page cache `cache_dir` into `corpus_dir`.
+    returns: number of pages written.
+    """
+    # pylint: disable=import-outside-toplevel
+    from fundatascraper.cache import PageCache
+    os.makedirs(corpus_dir, exist_ok=True)
+    cache = PageCache(cache_dir)
+    count = 0
+    try:
+        for url in cache.urls():
+            if FUND_PATH not in url:
+                continue
+            page = cache.get(url)
+            path = os.path.join(corpus_dir, page.digest + '.html')
+            with open(path, 'wb') as corpus_page:
+                corpus_page.write(page.body)
+            count += 1
+    finally:
+        cache.close()
+    return count
+
+
+def main(argv):
+    """Record a corpus or run the replay server until interrupted."""
+    if argv[:1] == ['record'] and len(argv) in (2, 3):
+        print("Recorded {} pages".format(record_corpus(*argv[1:])))
+    elif argv[:1] == ['serve']:
+        num_funds = int(argv[1]) if len(argv) > 1 else 1000
+        port = int(argv[2]) if len(argv) > 2 else 8000
+        server = ReplayServer(num_funds, port=port)
+        print("Serving {} funds: --base-url {} --search-url {}".format(
+            num_funds, server.base_url, server.search_url))
+        try:
+            server.server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+    else:
+        print(__doc__)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,239 @@
+"""
+Offline benchmark suite. Everything runs against benchmarks/replay.py, so no
+requests are made to fundata.com. For each corpus size it times:
+
+    crawl_<n>     scrape_fund_details.py end to end, list paging included
+    first_record_<n>  time until that crawl wrote its first fund
+    list_<n>      paging through the search listing alone
+    write_<n>_<format>  writing the records of n funds in each output format
+
+and once, over the recorded fund pages:
+
+    parse_<backend>   parsing one page into records
+    extract_<x>       each FundProfileScraper.scrape_<x> method
+
+Results are saved to benchmarks/results/<commit>.json, together with the
+machine they were measured on, and can be compared with an earlier run:
+
+    python benchmarks/run_benchmarks.py --sizes 100,1000 --compare 1a2b3c4
+
+Only compare results measured on the same machine.
+"""
+import argparse
+import importlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+# pylint: disable=wrong-import-position
+import scrape_fund_details
+from fundatascraper import fundlist, writers
+from fundatascraper.parsers import BACKENDS
+from fundatascraper.pipeline import parse_page
+from fundatascraper.session import HttpSession
+from replay import ReplayServer, load_corpus
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'results')
+REPO_DIR = os.path.join(os.path.dirname(__file__), os.pardir)
+
+
+def git_commit():
+    """Return (short commit hash, whether the tree has local changes)."""
+    def git(*args):
+        return subprocess.run(('git',) + args, cwd=REPO_DIR, check=True,
+                              stdout=subprocess.PIPE,
+                              universal_newlines=True).stdout.strip()
+    try:
+        return git('rev-parse', '--short', 'HEAD'), bool(
+            git('status', '--porcelain', '--untracked-files=no'))
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown', True
+
+
+def timed(function, *args, **kwargs):
+    """Call `function`; return elapsed seconds."""
+    start = time.perf_counter()
+    function(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def bench_crawl(server, workers, parse_workers):
+    """
+    Time a full scrape_fund_details.py run against `server`.
+    returns: (seconds, seconds until the first fund was written).
+    """
+    with tempfile.TemporaryDirectory() as output_dir:
+        seconds = timed(scrape_fund_details.main, [
+            '--base-url', server.base_url, '--search-url', server.search_url,
+            '--output-dir', output_dir, '--workers', str(workers),
+            '--rate', '1e9', '--burst', str(workers),
+            '--parse-workers', str(parse_workers),
+            '--progress-interval', '0',
+        ])
+        with open(os.path.join(output_dir, 'run_summary.json')) as summary:
+            first_record = json.load(summary)['timings']['first_record']
+    return seconds, first_record['total_seconds']
+
+
+def bench_list(server):
+    """Time paging through the search listing of `server`."""
+    session = HttpSession()
+    seconds = timed(fundlist.get_fund_list_http, server.search_url, 1e9,
+                    session)
+    session.close()
+    return seconds
+
+
+def fund_records(pages, num_funds):
+    """Return the records of `num_funds` funds, reusing the parsed pages."""
+    parsed = [parse_page('replay', '', page)[0] for page in pages]
+    for index in range(num_funds):
+        href = '/fund/{}'.format(index)
+        records = parsed[index % len(parsed)]
+        yield {table: [dict(record, href=href) for record in rows]
+               for table, rows in records.items()}
+
+
+def bench_write(pages, num_funds, output_format):
+    """Time writing the records of `num_funds` funds in `output_format`."""
+    funds = list(fund_records(pages, num_funds))
+    with tempfile.TemporaryDirectory() as output_dir:
+        start = time.perf_counter()
+        sinks = writers.open_sinks(output_format, output_dir)
+        for records in funds:
+            for table, rows in records.items():
+                sinks[table].write_many(rows)
+        writers.close_sinks(sinks)
+        return time.perf_counter() - start
+
+
+def bench_parse(pages, repeat):
+    """
+    Return the mean seconds per page of each parser backend, and of each
+    scrape_* method with the default backend.
+    """
+    results = {}
+    for backend in BACKENDS:
+        try:
+            parse_page('replay', '', pages[0], backend)
+        except ImportError:
+            continue
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for page in pages:
+                _, timings = parse_page('replay', '', page, backend)
+                if backend == BACKENDS[0]:
+                    for name, seconds in timings.items():
+                        if name.startswith('parse_'):
+                            key = 'extract_' + name[len('parse_'):]
+                            results[key] = results.get(key, 0.0) + seconds
+        results['parse_' + backend] = \
+            (time.perf_counter() - start) / (repeat * len(pages))
+    for key in results:
+        if key.startswith('extract_'):
+            results[key] /= repeat * len(pages)
+    return results
+
+
+def output_formats():
+    """Return the output formats whose dependencies are installed."""
+    # Modules each format needs besides pandas.
+    requirements = {'parquet': 'pyarrow', 'arrow': 'pyarrow',
+                    'duckdb': 'duckdb'}
+    formats = []
+    for output_format in writers.FORMATS:
+        try:
+            if output_format in requirements:
+                importlib.import_module(requirements[output_format])
+        except ImportError:
+            continue
+        formats.append(output_format)
+    return formats
+
+
+def run(sizes, repeat, workers, parse_workers):
+    """Run every benchmark; return a dict of result name to seconds."""
+    pages = load_corpus()
+    results = bench_parse(pages, repeat)
+    for size in sizes:
+        with ReplayServer(size, pages) as server:
+            results['list_{}'.format(size)] = bench_list(server)
+            results['crawl_{}'.format(size)], \
+                results['first_record_{}'.format(size)] = bench_crawl(
+                    server, workers, parse_workers)
+        for output_format in output_formats():
+            results['write_{}_{}'.format(size, output_format)] = \
+                bench_write(pages, size, output_format)
+        print("{} funds done".format(size), file=sys.stderr)
+    return results
+
+
+def load_results(name):
+    """Load saved results by path or commit hash."""
+    path = name if os.path.exists(name) else \
+        os.path.join(RESULTS_DIR, name + '.json')
+    with open(path) as results_file:
+        return json.load(results_file)
+
+
+def print_results(results, baseline=None):
+    """Print results, with the ratio to `baseline` if given."""
+    for name, seconds in sorted(results.items()):
+        line = '{:32} {:10.4f} s'.format(name, seconds)
+        if baseline and name in baseline and baseline[name]:
+            line += '  {:10.4f} s  {:6.2f}x'.format(
+                baseline[name], seconds / baseline[name])
+        print(line)
+
+
+def main(argv=None):
+    """Run the suite, save the results and compare with a baseline."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', default='100,1000,10000',
+                        help='comma separated numbers of funds to crawl')
+    parser.add_argument('--repeat', type=int, default=20,
+                        help='times each page is parsed')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--parse-workers', type=int, default=0)
+    parser.add_argument('--compare', metavar='COMMIT_OR_PATH',
+                        help='earlier results to compare with')
+    parser.add_argument('--no-save', action='store_true',
+                        help='do not save the results')
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+    results = run(sizes, args.repeat, args.workers, args.parse_workers)
+
+    commit, dirty = git_commit()
+    document = {
+        'commit': commit,
+        'dirty': dirty,
+        'timestamp': time.time(),
+        'python': platform.python_version(),
+        'machine': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'options': vars(args),
+        'results': results,
+    }
+    if not args.no_save:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        name = commit + ('-dirty' if dirty else '')
+        with open(os.path.join(RESULTS_DIR, name + '.json'), 'w') as saved:
+            json.dump(document, saved, indent=2)
+
+    baseline = None
+    if args.compare:
+        baseline = load_results(args.compare)['results']
+        print('{:32} {:>12}  {:>12}  {:>7}'.format(
+            'benchmark', 'this run', args.compare, 'ratio'))
+    print_results(results, baseline)
+
+
+if __name__ == '__main__':
+    main()
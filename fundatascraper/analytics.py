@@ -0,0 +1,230 @@
+"""
+Module containing cross-fund analytics over the scraped output tables.
+
+The top10_holdings and allocations tables (as written by the sinks, or read
+back with pd.read_parquet etc.) are turned into sparse fund x item weight
+matrices, where the items are securities or allocation categories encoded
+as integer ids. Overlap between every pair of funds and exposures summed
+over groups of funds, such as management companies, are then sparse matrix
+products instead of loops over funds:
+
+    holdings = holdings_matrix(pd.read_parquet("top10_holdings.parquet"))
+    overlap_pairs(holdings, "weight", minimum=20)
+    sectors = allocation_matrix(pd.read_parquet("allocations.parquet"),
+                                "sector")
+    group_exposure(sectors, single_values.set_index("href").management_co)
+
+Sparse matrices need scipy.
+"""
+import numpy as np
+import pandas as pd
+
+MEASURES = ("common", "weight", "cosine")
+
+# Rows of the self join behind the "weight" overlap materialized at once.
+MAX_BLOCK_PAIRS = 1000000
+
+
+def clean_labels(values):
+    """Strip and collapse the whitespace of item labels such as names."""
+    return values.astype(str).str.strip().str.replace(r"\s+", " ",
+                                                     regex=True)
+
+
+class FundMatrix:
+    """
+    Sparse matrix of weights with one row per fund and one column per item.
+    matrix: scipy.sparse CSR matrix of weights in percent.
+    funds: pd.Index of the hrefs of the rows.
+    items: pd.Index of the item labels; an item's integer id is its column.
+    """
+    def __init__(self, matrix, funds, items):
+        self.matrix = matrix
+        self.funds = funds
+        self.items = items
+
+    @classmethod
+    def from_records(cls, frame, item_column, fund_column="href",
+                     weight_column="weight"):
+        """
+        Build the matrix from a frame with one row per (fund, item, weight).
+        Rows without an item are skipped, missing weights count as 0 and
+        repeated (fund, item) pairs are summed.
+        """
+        from scipy import sparse  # pylint: disable=import-outside-toplevel
+        frame = frame[frame[item_column].notna()]
+        fund_ids, funds = pd.factorize(frame[fund_column], sort=True)
+        item_ids, items = pd.factorize(clean_labels(frame[item_column]),
+                                       sort=True)
+        weights = pd.to_numeric(frame[weight_column], errors="coerce")\
+            .fillna(0.0).to_numpy(dtype=np.float64)
+        matrix = sparse.coo_matrix(
+            (weights, (fund_ids, item_ids)),
+            shape=(len(funds), len(items))).tocsr()
+        matrix.sum_duplicates()
+        return cls(matrix, pd.Index(funds, name=fund_column),
+                   pd.Index(items, name=item_column))
+
+    def item_ids(self, labels):
+        """Return the integer ids of item `labels` (-1 if unknown)."""
+        return self.items.get_indexer(clean_labels(pd.Series(labels)))
+
+    def weights(self, href):
+        """Return the non-zero weights of one fund as a Series by item."""
+        row = self.matrix.getrow(self.funds.get_loc(href))
+        return pd.Series(row.data, index=self.items[row.indices])\
+            .sort_values(ascending=False)
+
+    def to_frame(self):
+        """Return the matrix as a dense DataFrame; only for small matrices."""
+        return pd.DataFrame(self.matrix.toarray(), index=self.funds,
+                            columns=self.items)
+
+
+def holdings_matrix(top10_holdings):
+    """Return the fund x security FundMatrix of a top10_holdings table."""
+    return FundMatrix.from_records(top10_holdings, "security")
+
+
+def allocation_matrix(allocations, allocation_type):
+    """
+    Return the fund x category FundMatrix of one allocation_type ("asset",
+    "sector" or "geo") of an allocations table.
+    """
+    return FundMatrix.from_records(
+        allocations[allocations["allocation_type"] == allocation_type],
+        "category")
+
+
+def overlap(fund_matrix, measure="weight"):
+    """
+    Return the fund x fund overlap of every pair of funds as a sparse CSR
+    matrix, in the order of fund_matrix.funds. Pairs without a common item
+    are not stored. The diagonal compares each fund with itself.
+    measure:
+        "common"  number of items both funds hold
+        "weight"  sum over common items of the smaller of the two weights,
+                  i.e. the percentage of the portfolio the funds share
+        "cosine"  cosine similarity of the weight vectors
+    """
+    # pylint: disable=import-outside-toplevel
+    from scipy import sparse
+    matrix = fund_matrix.matrix
+    if measure == "common":
+        held = matrix.copy()
+        held.data = np.ones_like(held.data)
+        return (held @ held.T).tocsr()
+    if measure == "cosine":
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)))
+        norms[norms == 0] = 1.0
+        scaled = sparse.diags(1.0 / norms.ravel()) @ matrix
+        return (scaled @ scaled.T).tocsr()
+    if measure != "weight":
+        raise ValueError("Unknown overlap measure: {}".format(measure))
+    blocks = [block for _, block in weight_overlap_blocks(matrix)]
+    if not blocks:
+        return sparse.csr_matrix((matrix.shape[0], matrix.shape[0]))
+    return sparse.vstack(blocks).tocsr()
+
+
+def weight_overlap_blocks(matrix, upper=False):
+    """
+    Yield the "weight" overlap of the CSR weight matrix `matrix` in blocks
+    of funds, as (first fund, CSR matrix of the block's rows against every
+    fund). With `upper` set, funds before the block are left out of its
+    rows, which is all an upper triangle needs.
+    min(a, b) is not a product, so each fund's holdings are joined on the
+    item id with every fund holding the same items and summed per pair. A
+    block's join has at most MAX_BLOCK_PAIRS rows (or one fund), so memory
+    does not grow with the square of the holders of popular securities.
+    """
+    from scipy import sparse  # pylint: disable=import-outside-toplevel
+    num_funds = matrix.shape[0]
+    entries = matrix.tocoo()
+    held = pd.DataFrame({"fund": entries.row, "item": entries.col,
+                         "weight": entries.data})
+    # Rows of the join contributed by each fund.
+    holders = matrix.getnnz(axis=0)
+    pairs_done = np.concatenate([[0], np.cumsum(np.bincount(
+        entries.row, weights=holders[entries.col], minlength=num_funds))])
+    first = 0
+    while first < num_funds:
+        last = int(np.searchsorted(pairs_done,
+                                   pairs_done[first] + MAX_BLOCK_PAIRS,
+                                   side="right")) - 1
+        last = min(max(last, first + 1), num_funds)
+        block = held.iloc[matrix.indptr[first]:matrix.indptr[last]]
+        others = held.iloc[matrix.indptr[first]:] if upper else held
+        pairs = block.merge(others, on="item", suffixes=("_a", "_b"))
+        shared = np.minimum(pairs["weight_a"].to_numpy(),
+                            pairs["weight_b"].to_numpy())
+        result = sparse.coo_matrix(
+            (shared, (pairs["fund_a"].to_numpy() - first,
+                      pairs["fund_b"].to_numpy())),
+            shape=(last - first, num_funds)).tocsr()
+        result.sum_duplicates()
+        yield first, result
+        first = last
+
+
+def overlap_pairs(fund_matrix, measure="weight", minimum=0.0):
+    """
+    Return the overlap of each pair of distinct funds above `minimum` as a
+    DataFrame with the columns href_a, href_b and overlap, each pair once,
+    largest overlap first. The "weight" overlap is filtered block by block,
+    so only the pairs kept are held in memory.
+    """
+    if measure == "weight":
+        blocks = weight_overlap_blocks(fund_matrix.matrix, upper=True)
+    else:
+        blocks = [(0, overlap(fund_matrix, measure))]
+    rows, columns, values = [], [], []
+    for first, block in blocks:
+        block = block.tocoo()
+        # Keep each unordered pair once, without the diagonal.
+        keep = (block.col > block.row + first) & (block.data > minimum)
+        rows.append(block.row[keep] + first)
+        columns.append(block.col[keep])
+        values.append(block.data[keep])
+    funds = fund_matrix.funds
+    return pd.DataFrame({
+        "href_a": funds[np.concatenate(rows or [[]]).astype(int)],
+        "href_b": funds[np.concatenate(columns or [[]]).astype(int)],
+        "overlap": np.concatenate(values or [[]]),
+    }).sort_values("overlap", ascending=False, kind="stable")\
+        .reset_index(drop=True)
+
+
+def group_exposure(fund_matrix, groups, fund_weights=None):
+    """
+    Return the average weight of each item over the funds of each group as
+    a DataFrame with one row per group and one column per item.
+    groups: Series mapping each href to its group, such as management_co.
+    fund_weights: optional Series mapping each href to its weight in the
+    average, such as assets; by default every fund counts equally.
+    Funds with no weights in `fund_matrix`, or no group, are left out.
+    """
+    from scipy import sparse  # pylint: disable=import-outside-toplevel
+    matrix = fund_matrix.matrix
+    groups = groups[~groups.index.duplicated()].reindex(fund_matrix.funds)
+    if fund_weights is None:
+        scale = np.ones(len(fund_matrix.funds))
+    else:
+        scale = pd.to_numeric(
+            fund_weights[~fund_weights.index.duplicated()]
+            .reindex(fund_matrix.funds), errors="coerce"
+        ).fillna(0.0).to_numpy(dtype=np.float64)
+    # Funds without any weight would pull their group's averages to zero.
+    scale = scale * (matrix.getnnz(axis=1) > 0)
+    group_ids, labels = pd.factorize(groups, sort=True)
+    known = group_ids >= 0
+    # Sparse group x fund matrix of each fund's weight in its group.
+    membership = sparse.coo_matrix(
+        (scale[known], (group_ids[known], np.flatnonzero(known))),
+        shape=(len(labels), matrix.shape[0])).tocsr()
+    totals = (membership @ matrix).toarray()
+    denominators = np.asarray(membership.sum(axis=1)).ravel()
+    with np.errstate(invalid="ignore", divide="ignore"):
+        exposure = totals / denominators[:, np.newaxis]
+    return pd.DataFrame(exposure, index=pd.Index(labels, name=groups.name),
+                        columns=fund_matrix.items)
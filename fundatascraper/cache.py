@@ -0,0 +1,192 @@
+"""
+Module containing a local cache of raw fund page bodies.
+
+Bodies are stored gzip-compressed under the SHA-256 of their contents, so
+pages with identical bodies are stored once. An SQLite index maps each url
+to its body along with the ETag and Last-Modified headers needed to
+revalidate it with a conditional request. Entries are revalidated before
+every use unless `ttl` is set, in which case entries fetched or revalidated
+within the last `ttl` seconds are trusted without a request. The least
+recently used entries are evicted once the stored bodies exceed
+`max_bytes`. Reads record their access time in memory and write it to the
+index in batches, so a read does not cost a commit.
+"""
+import collections
+import gzip
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+CachedPage = collections.namedtuple(
+    "CachedPage", ["url", "digest", "etag", "last_modified", "fetched_at",
+                   "body"]
+)
+
+# Access times held in memory before they are written to the index.
+MAX_PENDING_ACCESSES = 1000
+
+
+class CacheMiss(LookupError):
+    """Raised when an offline fetch asks for a url that is not cached."""
+
+
+class PageCache:
+    """Content-addressed store of page bodies keyed by url."""
+    def __init__(self, directory, ttl=None, max_bytes=None):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.lock = threading.RLock()
+        # url -> last access time not yet written to the index.
+        self.accessed = {}
+        os.makedirs(os.path.join(directory, "objects"), exist_ok=True)
+        self.db = sqlite3.connect(os.path.join(directory, "index.sqlite"),
+                                  check_same_thread=False)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            " url TEXT PRIMARY KEY,"
+            " digest TEXT NOT NULL,"
+            " etag TEXT,"
+            " last_modified TEXT,"
+            " fetched_at REAL NOT NULL,"
+            " accessed_at REAL NOT NULL)"
+        )
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS objects ("
+            " digest TEXT PRIMARY KEY,"
+            " size INTEGER NOT NULL)"
+        )
+        self.db.commit()
+
+    def object_path(self, digest):
+        """Return the path of the compressed body with the given digest."""
+        return os.path.join(self.directory, "objects", digest[:2], digest)
+
+    def get(self, url):
+        """Return the CachedPage for `url`, or None if it is not cached."""
+        with self.lock:
+            row = self.db.execute(
+                "SELECT digest, etag, last_modified, fetched_at FROM pages"
+                " WHERE url = ?", (url,)
+            ).fetchone()
+            if row is None:
+                return None
+            try:
+                with open(self.object_path(row[0]), "rb") as stored:
+                    body = gzip.decompress(stored.read())
+            except (OSError, EOFError):
+                self.db.execute("DELETE FROM pages WHERE url = ?", (url,))
+                self.db.commit()
+                return None
+            self.accessed[url] = time.time()
+            if len(self.accessed) >= MAX_PENDING_ACCESSES:
+                self.flush_accesses()
+                self.db.commit()
+        return CachedPage(url, *row, body=body)
+
+    def flush_accesses(self):
+        """Write the access times recorded by get() to the index."""
+        with self.lock:
+            if self.accessed:
+                self.db.executemany(
+                    "UPDATE pages SET accessed_at = ? WHERE url = ?",
+                    [(accessed_at, url)
+                     for url, accessed_at in self.accessed.items()])
+                self.accessed.clear()
+
+    def is_fresh(self, page):
+        """
+        True if `page` was fetched or revalidated within the TTL. Without a
+        TTL no page is fresh, so every use is revalidated.
+        """
+        return self.ttl is not None and \
+            time.time() - page.fetched_at < self.ttl
+
+    def put(self, url, body, etag=None, last_modified=None):
+        """Store `body` as the current contents of `url`."""
+        digest = hashlib.sha256(body).hexdigest()
+        path = self.object_path(digest)
+        with self.lock:
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                partial = path + ".tmp%d" % threading.get_ident()
+                with open(partial, "wb") as stored:
+                    stored.write(gzip.compress(body))
+                os.replace(partial, path)
+            self.db.execute(
+                "INSERT OR IGNORE INTO objects (digest, size) VALUES (?, ?)",
+                (digest, os.path.getsize(path))
+            )
+            now = time.time()
+            self.accessed.pop(url, None)
+            old = self.db.execute("SELECT digest FROM pages WHERE url = ?",
+                                  (url,)).fetchone()
+            self.db.execute(
+                "INSERT OR REPLACE INTO pages (url, digest, etag,"
+                " last_modified, fetched_at, accessed_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (url, digest, etag, last_modified, now, now)
+            )
+            if old is not None and old[0] != digest:
+                self.drop_unreferenced(old[0])
+            self.evict()
+            self.db.commit()
+        return digest
+
+    def touch(self, url):
+        """Mark `url` as revalidated, e.g. after a 304 Not Modified."""
+        with self.lock:
+            now = time.time()
+            self.accessed.pop(url, None)
+            self.db.execute(
+                "UPDATE pages SET fetched_at = ?, accessed_at = ?"
+                " WHERE url = ?", (now, now, url)
+            )
+            self.db.commit()
+
+    def urls(self):
+        """Return every cached url."""
+        with self.lock:
+            return [row[0] for row in
+                    self.db.execute("SELECT url FROM pages ORDER BY url")]
+
+    def size(self):
+        """Return the total size in bytes of the stored compressed bodies."""
+        with self.lock:
+            return self.db.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM objects"
+            ).fetchone()[0]
+
+    def drop_unreferenced(self, digest):
+        """Delete the body `digest` if no url refers to it any more."""
+        if self.db.execute("SELECT 1 FROM pages WHERE digest = ? LIMIT 1",
+                           (digest,)).fetchone():
+            return
+        self.db.execute("DELETE FROM objects WHERE digest = ?", (digest,))
+        try:
+            os.remove(self.object_path(digest))
+        except FileNotFoundError:
+            pass
+
+    def evict(self):
+        """Drop least recently used pages until the cache fits max_bytes."""
+        if self.max_bytes is None:
+            return
+        self.flush_accesses()
+        while self.size() > self.max_bytes:
+            row = self.db.execute(
+                "SELECT url, digest FROM pages ORDER BY accessed_at LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return
+            self.db.execute("DELETE FROM pages WHERE url = ?", (row[0],))
+            self.drop_unreferenced(row[1])
+
+    def close(self):
+        """Write the pending access times and close the index database."""
+        with self.lock:
+            self.flush_accesses()
+            self.db.commit()
+            self.db.close()
@@ -0,0 +1,43 @@
+"""
+Module containing the exceptions raised while scraping fund pages.
+"""
+
+
+class ScrapeError(Exception):
+    """Base class for errors scraping a single fund."""
+
+
+class PageFetchError(ScrapeError):
+    """A fund page could not be downloaded, even after retrying."""
+    def __init__(self, url, attempts, cause):
+        super().__init__(url, attempts, cause)
+        self.url = url
+        self.attempts = attempts
+        self.cause = cause
+
+    def __str__(self):
+        return "{} failed after {} attempt(s): {!r}".format(
+            self.url, self.attempts, self.cause)
+
+
+class FieldNotFoundError(ScrapeError):
+    """An element holding a field is missing from a fund page."""
+    def __init__(self, field, element_id):
+        super().__init__(field, element_id)
+        self.field = field
+        self.element_id = element_id
+
+    def __str__(self):
+        return "{} not found (no element with id {})".format(
+            self.field, self.element_id)
+
+
+class PageParseError(ScrapeError):
+    """A page has none of the fields of a fund page."""
+    def __init__(self, url, reason):
+        super().__init__(url, reason)
+        self.url = url
+        self.reason = reason
+
+    def __str__(self):
+        return "{}: {}".format(self.url, self.reason)
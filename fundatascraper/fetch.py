@@ -0,0 +1,199 @@
+"""
+Module for downloading fund pages from fundata.com concurrently while
+keeping the request rate against each host within a politeness budget.
+"""
+import http.client
+import random
+import threading
+import time
+from urllib.error import HTTPError, URLError
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from urllib.parse import urlsplit
+from fundatascraper.cache import CacheMiss
+from fundatascraper.errors import PageFetchError
+from fundatascraper.metrics import Metrics
+from fundatascraper.session import HttpSession
+
+# HTTP statuses worth retrying; any other HTTP error fails straight away.
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+def is_transient(error):
+    """True if a failed request may succeed when retried."""
+    if isinstance(error, HTTPError):
+        return error.code in RETRY_STATUSES
+    return isinstance(error, (URLError, TimeoutError, ConnectionError,
+                              http.client.HTTPException))
+
+
+def backoff_delay(attempt, base, cap):
+    """
+    Return the delay before retry number `attempt` (starting at 1): a random
+    time up to base * 2 ** (attempt - 1) seconds, capped at `cap`.
+    """
+    return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+
+
+class TokenBucket:
+    """
+    Token bucket rate limiter. Tokens are added at `rate` per second up to
+    `capacity`; each request consumes one token and blocks until one is
+    available.
+    """
+    def __init__(self, rate, capacity=1):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = float(rate)
+        self.capacity = max(float(capacity), 1.0)
+        self.tokens = self.capacity
+        self.last_refill = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available and consume it."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity,
+                    self.tokens + (now - self.last_refill) * self.rate
+                )
+                self.last_refill = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+
+
+class ConcurrentFetcher:
+    """
+    Downloads pages with up to `max_workers` requests in flight. Requests to
+    the same host share a token bucket allowing `rate` requests per second
+    with bursts of up to `burst` requests.
+
+    If a PageCache is given, cached pages are revalidated with
+    If-None-Match/If-Modified-Since, so a 304 Not Modified reuses the cached
+    body and only changed pages are transferred; pages within the cache's
+    TTL, if it has one, are returned without a request. Downloaded pages are
+    stored. With `offline` set only the cache is
+    read and uncached urls fail with CacheMiss.
+
+    Transient failures (connection errors, timeouts, HTTP 429 and 5xx) are
+    retried up to `retries` times with capped exponential backoff and full
+    jitter. A page that still fails raises PageFetchError.
+
+    Requests go through `session`, by default an HttpSession keeping one
+    persistent connection per worker with a read timeout of `timeout`.
+    Download times, bytes, cache hits and retries are recorded in `metrics`.
+    """
+    def __init__(self, max_workers=4, rate=1.0, burst=1, timeout=30,
+                 cache=None, offline=False, retries=3, backoff=1.0,
+                 backoff_cap=60.0, session=None, metrics=None):
+        # pylint: disable=too-many-arguments
+        self.max_workers = max_workers
+        self.rate = rate
+        self.burst = burst
+        if session is None:
+            session = HttpSession(read_timeout=timeout,
+                                  max_per_host=max_workers)
+        self.session = session
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.cache = cache
+        self.offline = offline
+        self.retries = retries
+        self.backoff = backoff
+        self.backoff_cap = backoff_cap
+        self.buckets = {}
+        self.buckets_lock = threading.Lock()
+
+    def bucket_for(self, url):
+        """Return the token bucket shared by all requests to url's host."""
+        host = urlsplit(url).netloc
+        with self.buckets_lock:
+            if host not in self.buckets:
+                self.buckets[host] = TokenBucket(self.rate, self.burst)
+            return self.buckets[host]
+
+    def fetch(self, url):
+        """
+        Download a single page, retrying transient failures.
+        raises: PageFetchError once the page has failed for good.
+        """
+        attempt = 1
+        while True:
+            try:
+                return self.fetch_once(url)
+            except Exception as error:  # pylint: disable=broad-except
+                if attempt > self.retries or not is_transient(error):
+                    self.metrics.increment("fetch_failures")
+                    raise PageFetchError(url, attempt, error) from error
+            self.metrics.increment("retries")
+            time.sleep(backoff_delay(attempt, self.backoff, self.backoff_cap))
+            attempt += 1
+
+    def fetch_once(self, url):
+        """Download a single page once the host's rate budget allows it."""
+        cached = self.cache.get(url) if self.cache is not None else None
+        if cached is not None and (self.offline or
+                                   self.cache.is_fresh(cached)):
+            self.metrics.increment("cache_hits")
+            return cached.body
+        if self.offline:
+            raise CacheMiss(url)
+
+        headers = {}
+        if cached is not None:
+            if cached.etag:
+                headers["If-None-Match"] = cached.etag
+            if cached.last_modified:
+                headers["If-Modified-Since"] = cached.last_modified
+
+        self.bucket_for(url).acquire()
+        with self.metrics.timer("fetch"):
+            response = self.session.get(url, headers)
+        if response.status == 304:
+            if cached is None:
+                raise HTTPError(url, 304, response.reason, response.headers,
+                                None)
+            self.metrics.increment("not_modified")
+            self.cache.touch(url)
+            return cached.body
+
+        self.metrics.increment("pages_downloaded")
+        self.metrics.increment("page_bytes", len(response.body))
+        if self.cache is not None:
+            self.cache.put(url, response.body, response.headers.get("ETag"),
+                           response.headers.get("Last-Modified"))
+        return response.body
+
+    def fetch_all(self, urls, return_exceptions=False):
+        """
+        Download every url in `urls`, yielding (url, body) tuples in the order
+        the downloads complete. At most `max_workers` downloads are pending at
+        any time, so `urls` may be a lazy iterable. If `return_exceptions` is
+        true a failed download yields (url, exception) instead of raising.
+        """
+        urls = iter(urls)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            pending = {}
+
+            def submit_next():
+                for url in urls:
+                    pending[executor.submit(self.fetch, url)] = url
+                    return True
+                return False
+
+            while len(pending) < self.max_workers and submit_next():
+                pass
+
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    url = pending.pop(future)
+                    submit_next()
+                    error = future.exception()
+                    if error is not None and return_exceptions:
+                        yield url, error
+                    else:
+                        yield url, future.result()
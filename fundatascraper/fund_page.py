@@ -2,434 +2,343 @@
 Module containing class for scraping a single mutual fund profile on
 fundata.com
 """
-import urllib.request as urllib2
-from bs4 import BeautifulSoup
+import functools
+import re
+import time
 import pandas as pd
+from fundatascraper.errors import FieldNotFoundError, PageParseError
+from fundatascraper.parsers import parse_document
+from fundatascraper.schema import compile_plan
+from fundatascraper.session import default_session
+
+
+# Extraction plan of every single valued field in fundatascraper.schema.
+PLAN = compile_plan()
+
+# (name, element id) pairs of the fields returned by scrape_nums_top().
+NUMS_TOP_FIELDS = PLAN.groups["nums_top"]
+
+ASSET_ALLOCATION_MAP = "ctl00$MainContent$chrtAssetAllocationImageMap"
+SECTOR_ALLOCATION_MAP = "ctl00$MainContent$chrtSectorAllocationImageMap"
+GEO_ALLOCATION_MAP = "ctl00$MainContent$chrtGeoAllocationImageMap"
+TOP10_HOLDINGS_TABLE = "ctl00_MainContent_gvTopTenHoldings"
+
+# Allocation type written to the long-format allocations table for each map.
+ALLOCATION_MAPS = (
+    ("asset", ASSET_ALLOCATION_MAP),
+    ("sector", SECTOR_ALLOCATION_MAP),
+    ("geo", GEO_ALLOCATION_MAP),
+)
+
+# Output tables of scrape_records(), with the element ids each one needs
+# besides those of the single valued fields.
+TABLE_TARGETS = {
+    "single_values": (),
+    "allocations": (ASSET_ALLOCATION_MAP, SECTOR_ALLOCATION_MAP,
+                    GEO_ALLOCATION_MAP),
+    "top10_holdings": (TOP10_HOLDINGS_TABLE,),
+    "errors": (),
+}
+
+_WEIGHT_RE = re.compile(r"^\s*(-?[\d,]*\.?\d+)\s*%?\s*$")
+_ALLOCATION_RE = re.compile(r"^(.*?)\s*:?\s*(-?[\d,]*\.?\d+)\s*%\s*$")
+
+
+SINGLE_VALUE_FIELDS = tuple((field.name, field.element_id)
+                            for field in PLAN.fields)
+
+
+def parse_weight(text):
+    """Convert a weight such as "5.12%" to a float, or None if it is not
+    a number."""
+    match = _WEIGHT_RE.match(text or "")
+    if match is None:
+        return None
+    return float(match.group(1).replace(",", ""))
+
+
+def parse_allocation_title(title):
+    """
+    Split an allocation image map title such as "Canadian Equity: 45.2%"
+    into (category, weight). The weight is None if the title has none.
+    """
+    match = _ALLOCATION_RE.match(title or "")
+    if match is None:
+        return (title or "").strip(), None
+    return match.group(1).strip(), float(match.group(2).replace(",", ""))
+
+
+def timed(method):
+    """
+    Decorator adding the time spent in a scraper method to the scraper's
+    `timings` under the method's name.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            self.timings[method.__name__] = self.timings.get(
+                method.__name__, 0.0) + time.perf_counter() - start
+    return wrapper
 
 
 class FundProfileScraper:
     """
     Class for scraping details from a specific mutual fund page on fundata.com
     """
-    def __init__(self, url):
-        self.soup = BeautifulSoup(urllib2.urlopen(url), 'html.parser')
+    def __init__(self, url, html=None, parser="html.parser", cache=None,
+                 strict=False, session=None, fields=None, tables=None):
+        # pylint: disable=too-many-arguments
+        """
+        Parse the fund page at `url`. If the page body has already been
+        downloaded it can be passed as `html` to skip the request, or read
+        from a fundatascraper.cache.PageCache given as `cache`. Otherwise it
+        is downloaded with `session` (default: the shared HttpSession).
+        `parser` names the backend from fundatascraper.parsers used to read
+        the page.
+
+        Fields missing from the page are returned as None (or an empty list)
+        and recorded in `errors` as FieldNotFoundError, unless `strict` is
+        set, in which case the error is raised.
+
+        Only the single valued fields named in `fields` and the output
+        tables named in `tables` (default: all of them) are extracted. The
+        streaming parser stops reading the page as soon as it has seen the
+        elements these need.
+
+        Seconds spent reading the page and in each scrape_* method are kept
+        in `timings`, keyed by "document" and the method name.
+
+        Call close(), or use the scraper as a context manager, to free the
+        parsed page as soon as the values have been extracted.
+        """
+        if html is None and cache is not None:
+            page = cache.get(url)
+            if page is not None:
+                html = page.body
+        if html is None:
+            html = (session or default_session()).get(url).body
+        self.url = url
+        self.strict = strict
+        self.errors = []
+        self.plan = PLAN if fields is None else compile_plan(tuple(fields))
+        self.tables = frozenset(TABLE_TARGETS if tables is None else tables)
+        unknown = self.tables.difference(TABLE_TARGETS)
+        if unknown:
+            raise ValueError("Unknown tables: {}".format(
+                ", ".join(sorted(unknown))))
+        targets = set()
+        if "single_values" in self.tables:
+            targets.update(self.plan.element_ids)
+        for table in self.tables:
+            targets.update(TABLE_TARGETS[table])
+        start = time.perf_counter()
+        self.document = parse_document(html, parser, targets)
+        self.timings = {"document": time.perf_counter() - start}
+
+    def close(self):
+        """
+        Free the parsed page. The scrape_* methods cannot be called after
+        this, but values already extracted are kept.
+        """
+        if self.document is not None:
+            self.document.close()
+            self.document = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def missing(self, field, element_id):
+        """Raise or record that the element of `field` is not on the page."""
+        error = FieldNotFoundError(field, element_id)
+        if self.strict:
+            raise error
+        self.errors.append(error)
+
+    def scrape_group(self, group):
+        """
+        Extract the fields of `group` in the extraction plan into a dict
+        keyed by name.
+        """
+        return self.plan.extract(self.document.text, group, self.missing)
 
     def scrape_all_single_value(self):
         """
         Scrapes all values from the fund page that represent a single valued
         metric i.e. not part of a list or table of values.
         """
-        top_fund_nums = self.scrape_nums_top()
-        info_table = self.scrape_info_table()
-        info_panel = self.scrape_info_panel()
-        return_table = self.scrape_return_table()
-        calendar_returns = self.scrape_calendar_return()
-
-        concatenated_dict = {**top_fund_nums, **info_table, **info_panel,
-                             **return_table, **calendar_returns}
+        concatenated_dict = {}
+        for group, scrape in (("nums_top", self.scrape_nums_top),
+                              ("info_table", self.scrape_info_table),
+                              ("info_panel", self.scrape_info_panel),
+                              ("return_table", self.scrape_return_table),
+                              ("calendar_return",
+                               self.scrape_calendar_return)):
+            # Groups without any of the requested fields are skipped.
+            if self.plan.groups[group]:
+                concatenated_dict.update(scrape())
 
         return concatenated_dict
 
 
+    @timed
     def scrape_nums_top(self):
         """
         Extract values for inception return, ytd_return, navps, and change
         located underneath the title heading at the top of the page.
         """
-        inception_return = (
-            self.soup
-            .find("span", {"id": "ctl00_MainContent_txtInceptionReturn"})
-            .text
-        )
-
-        ytd_return = (
-            self.soup
-            .find("span", {"id": "ctl00_MainContent_txtYTDReturn"}).text
-        )
-
-        navps = (
-            self.soup
-            .find("span", {"id": "ctl00_MainContent_txtNavps"})
-            .text
-        )
-
-        change = (
-            self.soup
-            .find("span", {"id": "ctl00_MainContent_txtNavpsChange"})
-            .text
-        )
-
-        return {"inception_return": inception_return,
-                "ytd_return": ytd_return,
-                "navps": navps,
-                "change": change}
+        return self.scrape_group("nums_top")
 
 
+    @timed
     def scrape_info_table(self):
         """
         Extract vales in the table to the right of the growth chart on the
         page.
         """
-        mer = self.soup.find("span", {"id": "ctl00_MainContent_txtMER"}).text
-
-        assets = (
-            self.soup.find("span", {"id": "ctl00_MainContent_txtAssets"}).text
-        )
-
-        rank = (
-            self.soup.find("span", {"id": "ctl00_MainContent_txtRank"}).text
-        )
-
-        std_dev = (
-            self.soup.find("span", {"id": "ctl00_MainContent_txtStdDev"}).text
-        )
-
-        vol_rank = (
-            self.soup
-            .find("span", {"id": "ctl00_MainContent_txtVolatilityRank"})
-            .text
-        )
-
-        load = self.soup.find("span", {"id": "ctl00_MainContent_txtLoad"}).text
-
-        max_front_end = (
-            self.soup
-            .find("span", {"id": "ctl00_MainContent_txtFeesFront"})
-            .text
-        )
-
-        max_back_end = (
-            self.soup
-            .find("span", {"id": "ctl00_MainContent_txtFeesBack"})
-            .text
-        )
-
-        sales_status = (
-            self.soup
-            .find("span", {"id": "ctl00_MainContent_txtSalesStatus"})
-            .text
-        )
-
-        return {"mer": mer,
-                "assets": assets,
-                "rank": rank,
-                "std_dev": std_dev,
-                "volatility_rank": vol_rank,
-                "load": load,
-                "max_front_end": max_front_end,
-                "max_back_end": max_back_end,
-                "sales_status": sales_status}
+        return self.scrape_group("info_table")
 
 
+    @timed
     def scrape_info_panel(self):
         """
         Extract info on objective, manageent co, and fund managers from the
         panel immediately below the growth chart.
         """
-        objective = (
-            self.soup.find("span", {"id": "ctl00_MainContent_txtObjective"}).text
-        )
+        return self.scrape_group("info_panel")
 
-        management_co = (
-            self.soup.find("span", {"id": "ctl00_MainContent_txtManagementCo"}).text
-        )
 
-        fund_managers = (
-            self.soup.find("span", {"id": "ctl00_MainContent_txtManagers"}).text
-        )
+    def scrape_map_titles(self, map_id, field=None):
+        """
+        Extract the titles of every area in the image map `map_id`. `field`
+        names the map in errors if it is missing.
+        """
+        try:
+            return self.document.area_titles(map_id)
+        except KeyError:
+            self.missing(field or map_id, map_id)
+            return []
 
-        return {"objective_description": objective,
-                "management_co": management_co,
-                "fund_managers": fund_managers}
+    def scrape_table_rows(self, table_id, field=None):
+        """
+        Extract the td texts of every row of the table `table_id`. `field`
+        names the table in errors if it is missing.
+        """
+        try:
+            return self.document.table_rows(table_id)
+        except KeyError:
+            self.missing(field or table_id, table_id)
+            return []
 
 
+    @timed
     def scrape_asset_allocation(self):
         """Extract asset allocation info."""
-        asset_map = (
-            self.soup
-            .find("map", {"id": "ctl00$MainContent$chrtAssetAllocationImageMap"})
-            .findAll("area")
-        )
-
-        return [x["title"] for x in asset_map]
+        return self.scrape_map_titles(ASSET_ALLOCATION_MAP, "asset_allocation")
 
 
+    @timed
     def scrape_sector_allocation(self):
         """Extract sector allocation info."""
-        sector_map = (
-            self.soup
-            .find("map", {"id": "ctl00$MainContent$chrtSectorAllocationImageMap"})
-            .findAll("area")
-        )
-
-        return [x["title"] for x in sector_map]
+        return self.scrape_map_titles(SECTOR_ALLOCATION_MAP,
+                                      "sector_allocation")
 
 
+    @timed
     def scrape_geo_allocation(self):
         """Extract geo allocation info."""
-        geo_map = (
-            self.soup
-            .find("map", {"id": "ctl00$MainContent$chrtGeoAllocationImageMap"})
-            .findAll("area")
-        )
-
-        return [x["title"] for x in geo_map]
+        return self.scrape_map_titles(GEO_ALLOCATION_MAP, "geo_allocation")
 
 
+    @timed
     def scrape_top10_holdings(self):
         """Extract details of top 10 holdings."""
-        table_rows = (
-            self.soup
-            .find("table", {"id": "ctl00_MainContent_gvTopTenHoldings"})
-            .findAll("tr")
-        )
-
-        holding_list = []
-        for html_tr in table_rows:
-            html_td = html_tr.find_all('td')
-            row = [tr.text for tr in html_td]
-            holding_list.append(row)
+        holding_list = self.scrape_table_rows(TOP10_HOLDINGS_TABLE,
+                                              "top10_holdings")
 
         return pd.DataFrame(holding_list)
 
+    def scrape_records(self, href):
+        """
+        Scrape the page into flat records for the output tables in
+        fundatascraper.writers.TABLES selected by `tables`, each tagged with
+        `href`. Missing fields are null and listed in the errors table.
+        Raises PageParseError if none of the requested single valued fields
+        are on the page.
+        returns: dict mapping table name to a list of record dicts.
+        """
+        self.errors = []
+        records = {}
+        if "single_values" in self.tables:
+            single_values = {"href": href}
+            single_values.update(self.scrape_all_single_value())
+            if self.plan.fields and \
+                    len(self.errors) == len(self.plan.fields):
+                raise PageParseError(self.url,
+                                     "no fund fields found on page")
+            records["single_values"] = [single_values]
+        if "allocations" in self.tables:
+            records["allocations"] = self.scrape_allocation_records(href)
+        if "top10_holdings" in self.tables:
+            records["top10_holdings"] = \
+                self.scrape_top10_holding_records(href)
+        if "errors" in self.tables:
+            records["errors"] = [
+                {"href": href, "field": error.field,
+                 "element_id": error.element_id}
+                for error in self.errors
+            ]
+        return records
+
+    @timed
+    def scrape_allocation_records(self, href):
+        """
+        Extract the asset, sector and geo allocations as typed records with
+        the keys href, allocation_type, category and weight.
+        """
+        records = []
+        for allocation_type, map_id in ALLOCATION_MAPS:
+            for title in self.scrape_map_titles(
+                    map_id, allocation_type + "_allocation"):
+                category, weight = parse_allocation_title(title)
+                records.append({"href": href,
+                                "allocation_type": allocation_type,
+                                "category": category,
+                                "weight": weight})
+        return records
+
+    @timed
+    def scrape_top10_holding_records(self, href):
+        """
+        Extract the top 10 holdings as typed records with the keys href,
+        rank, security and weight. Rows without cells, such as the header,
+        are skipped.
+        """
+        rows = self.scrape_table_rows(TOP10_HOLDINGS_TABLE, "top10_holdings")
+        rows = [row for row in rows if row]
+        return [{"href": href,
+                 "rank": rank,
+                 "security": row[0].strip(),
+                 "weight": parse_weight(row[1]) if len(row) > 1 else None}
+                for rank, row in enumerate(rows, 1)]
+
+    @timed
     def scrape_return_table(self):
-        #pylint: disable-msg=too-many-locals
         """
         Extract returns data from performance section at bottom of page.
         """
-        # Fund
-        fs1mthrtn = (self.soup
-                     .find("span", {"id": "ctl00_MainContent_txtFS1mthRtn"})
-                     .text)
-        fs3mthrtn = (self.soup
-                     .find("span", {"id": "ctl00_MainContent_txtFS3mthRtn"})
-                     .text)
-        fs6mthrtn = (self.soup
-                     .find("span", {"id": "ctl00_MainContent_txtFS6mthRtn"})
-                     .text)
-        fsytdrtn = (self.soup
-                    .find("span", {"id": "ctl00_MainContent_txtFSytdRtn"})
-                    .text)
-        fc1yrrtn = (self.soup
-                    .find("span", {"id": "ctl00_MainContent_txtFC1yrRtn"})
-                    .text)
-        fc3yrrtn = (self.soup
-                    .find("span", {"id": "ctl00_MainContent_txtFC3yrRtn"})
-                    .text)
-        fc5yrrtn = (self.soup
-                    .find("span", {"id": "ctl00_MainContent_txtFC5yrRtn"})
-                    .text)
-        fc10yrrtn = (self.soup
-                     .find("span", {"id": "ctl00_MainContent_txtFC10yrRtn"})
-                     .text)
-
-        # Benchmark
-        is1mthrtn = (self.soup
-                     .find("span", {"id": "ctl00_MainContent_txtIS1mthRtn"})
-                     .text)
-        is3mthrtn = (self.soup
-                     .find("span", {"id": "ctl00_MainContent_txtIS3mthRtn"})
-                     .text)
-        is6mthrtn = (self.soup
-                     .find("span", {"id": "ctl00_MainContent_txtIS6mthRtn"})
-                     .text)
-        isytdrtn = (self.soup
-                    .find("span", {"id": "ctl00_MainContent_txtISytdRtn"})
-                    .text)
-        ic1yrrtn = (self.soup
-                    .find("span", {"id": "ctl00_MainContent_txtIC1yrRtn"})
-                    .text)
-        ic3yrrtn = (self.soup
-                    .find("span", {"id": "ctl00_MainContent_txtIC3yrRtn"})
-                    .text)
-        ic5yrrtn = (self.soup
-                    .find("span", {"id": "ctl00_MainContent_txtIC5yrRtn"})
-                    .text)
-        ic10yrrtn = (self.soup
-                     .find("span", {"id": "ctl00_MainContent_txtIC10yrRtn"})
-                     .text)
-
-        # Quartiile ranking
-        s1mthqrank = (self.soup
-                      .find("span", {"id": "ctl00_MainContent_txtS1mthqrank"})
-                      .text)
-        s3mthqrank = (self.soup
-                      .find("span", {"id": "ctl00_MainContent_txtS3mthqrank"})
-                      .text)
-        s6mthqrank = (self.soup
-                      .find("span", {"id": "ctl00_MainContent_txtS6mthqrank"})
-                      .text)
-        sytdrank = (self.soup
-                    .find("span", {"id": "ctl00_MainContent_txtSytdrank"})
-                    .text)
-        c1yrqrank = (self.soup
-                     .find("span", {"id": "ctl00_MainContent_txtC1yrqrank"})
-                     .text)
-        c3yrqrank = (self.soup
-                     .find("span", {"id": "ctl00_MainContent_txtC3yrqrank"})
-                     .text)
-        c5yrqrank = (self.soup
-                     .find("span", {"id": "ctl00_MainContent_txtC5yrqrank"})
-                     .text)
-        c10yrqrank = (self.soup
-                      .find("span", {"id": "ctl00_MainContent_txtC10yrqrank"})
-                      .text)
-
-        return {"fund_1month_return": fs1mthrtn,
-                "fund_3month_return": fs3mthrtn,
-                "fund_6month_return": fs6mthrtn,
-                "fund_ytd_return": fsytdrtn,
-                "fund_1year_return": fc1yrrtn,
-                "fund_3year_return": fc3yrrtn,
-                "fund_5year_return": fc5yrrtn,
-                "fund_10year_return": fc10yrrtn,
-                "benchmark_1month_return": is1mthrtn,
-                "benchmark_3month_return": is3mthrtn,
-                "benchmark_6month_return": is6mthrtn,
-                "benchmark_ytd_return": isytdrtn,
-                "benchmark_1year_return": ic1yrrtn,
-                "benchmark_3year_return": ic3yrrtn,
-                "benchmark_5year_return": ic5yrrtn,
-                "benchmark_10year_return": ic10yrrtn,
-                "quartile_rank__1month_return": s1mthqrank,
-                "quartile_rank__3month_return": s3mthqrank,
-                "quartile_rank__6month_return": s6mthqrank,
-                "quartile_rank__ytd_return": sytdrank,
-                "quartile_rank__1year_return": c1yrqrank,
-                "quartile_rank__3year_return": c3yrqrank,
-                "quartile_rank__5year_return": c5yrqrank,
-                "quartile_rank__10year_return": c10yrqrank}
+        return self.scrape_group("return_table")
 
 
+    @timed
     def scrape_calendar_return(self):
-        #pylint: disable-msg=too-many-locals
         """
         Extract calendar returns data from performance section at bottom of
         page.
         """
-        # Fund
-        calrtnyr1 = (self.soup
-                     .find("span", {"id": "ctl00_MainContent_txtCalRtnyr1"})
-                     .text)
-        calrtnyr2 = (self.soup
-                     .find("span", {"id": "ctl00_MainContent_txtCalRtnyr2"})
-                     .text)
-        calrtnyr3 = (self.soup
-                     .find("span", {"id": "ctl00_MainContent_txtCalRtnyr3"})
-                     .text)
-        calrtnyr4 = (self.soup
-                     .find("span", {"id": "ctl00_MainContent_txtCalRtnyr4"})
-                     .text)
-        calrtnyr5 = (self.soup
-                     .find("span", {"id": "ctl00_MainContent_txtCalRtnyr5"})
-                     .text)
-        calrtnyr6 = (self.soup
-                     .find("span", {"id": "ctl00_MainContent_txtCalRtnyr6"})
-                     .text)
-        calrtnyr7 = (self.soup
-                     .find("span", {"id": "ctl00_MainContent_txtCalRtnyr7"})
-                     .text)
-        calrtnyr8 = (self.soup
-                     .find("span", {"id": "ctl00_MainContent_txtCalRtnyr8"})
-                     .text)
-        calrtnyr9 = (self.soup
-                     .find("span", {"id": "ctl00_MainContent_txtCalRtnyr9"})
-                     .text)
-        calrtnyr10 = (self.soup
-                      .find("span", {"id": "ctl00_MainContent_txtCalRtnyr10"})
-                      .text)
-
-        # Benchmark
-        bcalrtnyr1 = (self.soup
-                      .find("span", {"id": "ctl00_MainContent_txtBCalRtnyr1"})
-                      .text)
-        bcalrtnyr2 = (self.soup
-                      .find("span", {"id": "ctl00_MainContent_txtBCalRtnyr2"})
-                      .text)
-        bcalrtnyr3 = (self.soup
-                      .find("span", {"id": "ctl00_MainContent_txtBCalRtnyr3"})
-                      .text)
-        bcalrtnyr4 = (self.soup
-                      .find("span", {"id": "ctl00_MainContent_txtBCalRtnyr4"})
-                      .text)
-        bcalrtnyr5 = (self.soup
-                      .find("span", {"id": "ctl00_MainContent_txtBCalRtnyr5"})
-                      .text)
-        bcalrtnyr6 = (self.soup
-                      .find("span", {"id": "ctl00_MainContent_txtBCalRtnyr6"})
-                      .text)
-        bcalrtnyr7 = (self.soup
-                      .find("span", {"id": "ctl00_MainContent_txtBCalRtnyr7"})
-                      .text)
-        bcalrtnyr8 = (self.soup
-                      .find("span", {"id": "ctl00_MainContent_txtBCalRtnyr8"})
-                      .text)
-        bcalrtnyr9 = (self.soup
-                      .find("span", {"id": "ctl00_MainContent_txtBCalRtnyr9"})
-                      .text)
-        bcalrtnyr10 = (self.soup
-                       .find("span", {"id": "ctl00_MainContent_txtBCalRtnyr10"})
-                       .text)
-
-        # Quartile ranking
-        qcalrtnyr1 = (self.soup
-                      .find("span", {"id": "ctl00_MainContent_txtQCalrtnyr1"})
-                      .text)
-        qcalrtnyr2 = (self.soup
-                      .find("span", {"id": "ctl00_MainContent_txtQCalrtnyr2"})
-                      .text)
-        qcalrtnyr3 = (self.soup
-                      .find("span", {"id": "ctl00_MainContent_txtQCalrtnyr3"})
-                      .text)
-        qcalrtnyr4 = (self.soup
-                      .find("span", {"id": "ctl00_MainContent_txtQCalrtnyr4"})
-                      .text)
-        qcalrtnyr5 = (self.soup
-                      .find("span", {"id": "ctl00_MainContent_txtQCalrtnyr5"})
-                      .text)
-        qcalrtnyr6 = (self.soup
-                      .find("span", {"id": "ctl00_MainContent_txtQCalrtnyr6"})
-                      .text)
-        qcalrtnyr7 = (self.soup
-                      .find("span", {"id": "ctl00_MainContent_txtQCalrtnyr7"})
-                      .text)
-        qcalrtnyr8 = (self.soup
-                      .find("span", {"id": "ctl00_MainContent_txtQCalrtnyr8"})
-                      .text)
-        qcalrtnyr9 = (self.soup
-                      .find("span", {"id": "ctl00_MainContent_txtQCalrtnyr9"})
-                      .text)
-        qcalrtnyr10 = (self.soup
-                       .find("span", {"id": "ctl00_MainContent_txtQCalrtnyr10"})
-                       .text)
-
-        return {"fund_calendar_return_year_1": calrtnyr1,
-                "fund_calendar_return_year_2": calrtnyr2,
-                "fund_calendar_return_year_3": calrtnyr3,
-                "fund_calendar_return_year_4": calrtnyr4,
-                "fund_calendar_return_year_5": calrtnyr5,
-                "fund_calendar_return_year_6": calrtnyr6,
-                "fund_calendar_return_year_7": calrtnyr7,
-                "fund_calendar_return_year_8": calrtnyr8,
-                "fund_calendar_return_year_9": calrtnyr9,
-                "fund_calendar_return_year_10": calrtnyr10,
-                "benchmark_calendar_return_year_1": bcalrtnyr1,
-                "benchmark_calendar_return_year_2": bcalrtnyr2,
-                "benchmark_calendar_return_year_3": bcalrtnyr3,
-                "benchmark_calendar_return_year_4": bcalrtnyr4,
-                "benchmark_calendar_return_year_5": bcalrtnyr5,
-                "benchmark_calendar_return_year_6": bcalrtnyr6,
-                "benchmark_calendar_return_year_7": bcalrtnyr7,
-                "benchmark_calendar_return_year_8": bcalrtnyr8,
-                "benchmark_calendar_return_year_9": bcalrtnyr9,
-                "benchmark_calendar_return_year_10": bcalrtnyr10,
-                "quartile_rank_calendar_return_year_1": qcalrtnyr1,
-                "quartile_rank_calendar_return_year_2": qcalrtnyr2,
-                "quartile_rank_calendar_return_year_3": qcalrtnyr3,
-                "quartile_rank_calendar_return_year_4": qcalrtnyr4,
-                "quartile_rank_calendar_return_year_5": qcalrtnyr5,
-                "quartile_rank_calendar_return_year_6": qcalrtnyr6,
-                "quartile_rank_calendar_return_year_7": qcalrtnyr7,
-                "quartile_rank_calendar_return_year_8": qcalrtnyr8,
-                "quartile_rank_calendar_return_year_9": qcalrtnyr9,
-                "quartile_rank_calendar_return_year_10": qcalrtnyr10}
+        return self.scrape_group("calendar_return")
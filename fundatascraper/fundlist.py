@@ -1,53 +1,264 @@
 """
 Module to scrape list of mutual funds on fundata.ca along with urls
 where details of funds can be found.
+
+The list is paged through ASP.NET postbacks. By default the postbacks are
+replayed directly over HTTP, carrying the hidden form state such as
+__VIEWSTATE and __EVENTVALIDATION from one page to the next. The original
+Selenium/Firefox crawl is kept as a fallback.
+
+iter_fund_list() yields the hrefs of each page as soon as it arrives, so
+fund pages can be scraped while the rest of the list is still being paged.
+Given a fundatascraper.metrics.Metrics, it counts the pages and funds
+listed so far (list_pages, funds_listed) and times each search page request
+(list_page).
 """
+import re
 import time
+from concurrent import futures
 from random import randint
+from urllib.parse import urlencode, urljoin
 from bs4 import BeautifulSoup
-from selenium import webdriver
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.common.exceptions import NoSuchElementException
-from selenium.webdriver.firefox.options import Options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support import expected_conditions as EC
+from fundatascraper.fetch import TokenBucket
+from fundatascraper.session import HttpSession
+
+SEARCH_URL = 'http://idata.fundata.com/mutualfunds/Search.aspx'
+
+FUND_LINK_TITLE = ("Click here to view summary information about this"
+                   " mutual fund")
 
-def get_fund_list():
+_POSTBACK_RE = re.compile(r"__doPostBack\('([^']*)','([^']*)'\)")
+
+
+def parse_search_page(html, page_url):
+    """
+    Parse one page of search results.
+    returns: (hrefs, form_action, form_fields, postbacks) where form_fields
+    holds the values the form would submit and postbacks maps each pager
+    argument such as 'Page$2' to its event target.
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+
+    hrefs = []
+    for link in soup.findAll("a", {"title": FUND_LINK_TITLE}):
+        hrefs.append(link['href'])
+
+    form = soup.find("form") or soup
+    form_action = urljoin(page_url, form.get("action") or page_url)
+
+    form_fields = {}
+    for field in form.findAll("input"):
+        name = field.get("name")
+        if not name or field.get("type", "text").lower() in (
+                "submit", "image", "button", "reset", "file"):
+            continue
+        if field.get("type", "").lower() in ("checkbox", "radio") and \
+                not field.has_attr("checked"):
+            continue
+        form_fields[name] = field.get("value", "")
+    for select in form.findAll("select"):
+        option = select.find("option", selected=True) or select.find("option")
+        if select.get("name") and option is not None:
+            form_fields[select["name"]] = option.get("value", option.text)
+
+    postbacks = {}
+    for link in soup.findAll("a", href=_POSTBACK_RE):
+        target, argument = _POSTBACK_RE.search(link['href']).groups()
+        postbacks.setdefault(argument, target)
+
+    return hrefs, form_action, form_fields, postbacks
+
+
+def get_fund_list(mode="http", search_url=SEARCH_URL, rate=0.5,
+                  session=None, page_workers=1):
     """
     Method to get list of funds.
-    returns:
+    mode: "http" to replay the pager postbacks directly, or "selenium" to
+    click through the pages in a headless Firefox.
+    rate: maximum number of page requests per second in http mode.
+    session: HttpSession used in http mode (default: a new session).
+    page_workers: search pages requested at once in http mode.
+    returns: list of hrefs of the fund profile pages.
+    """
+    return list(iter_fund_list(mode, search_url, rate, session,
+                               page_workers))
+
+
+def iter_fund_list(mode="http", search_url=SEARCH_URL, rate=0.5,
+                   session=None, page_workers=1, bucket=None, metrics=None):
+    """
+    Yield the hrefs of the fund profile pages as each search page arrives.
+    Takes the arguments of get_fund_list(), `bucket`, a TokenBucket to
+    share the request rate with other requests to the site in http mode,
+    and `metrics`, a Metrics recording the listing's progress.
+    """
+    # pylint: disable=too-many-arguments
+    if mode == "http":
+        return iter_fund_list_http(search_url, rate, session, page_workers,
+                                   bucket, metrics)
+    if mode == "selenium":
+        return iter_fund_list_selenium(search_url, metrics)
+    raise ValueError("Unknown fund list mode: {}".format(mode))
+
+
+def get_fund_list_http(search_url=SEARCH_URL, rate=0.5, session=None,
+                       page_workers=1):
+    """
+    Get list of funds by posting the ASP.NET pager postback for each page.
+    returns: list of hrefs of the fund profile pages.
+    """
+    return list(iter_fund_list_http(search_url, rate, session,
+                                    page_workers))
+
+
+def page_number(argument):
+    """Return the page number of a pager argument such as 'Page$2'."""
+    prefix, _, number = argument.partition("$")
+    if prefix == "Page" and number.isdigit():
+        return int(number)
+    return None
+
+
+def count_page(metrics, hrefs):
+    """Record one search page of `hrefs` in `metrics`, if any."""
+    if metrics is not None:
+        metrics.increment("list_pages")
+        metrics.increment("funds_listed", len(hrefs))
+
+
+def iter_fund_list_http(search_url=SEARCH_URL, rate=0.5, session=None,
+                        page_workers=1, bucket=None, metrics=None):
+    """
+    Yield the hrefs of each search page, paging with the ASP.NET pager
+    postbacks. With `page_workers` above 1, every page offered by the pager
+    of a page that has arrived is requested at once, with that page's form
+    state, up to `page_workers` at a time; hrefs are then yielded in the
+    order the pages arrive.
     """
+    # pylint: disable=too-many-arguments,too-many-locals
+    if session is None:
+        session = HttpSession()
+    if bucket is None:
+        bucket = TokenBucket(rate)
+
+    def request(method, *args):
+        bucket.acquire()
+        start = time.perf_counter()
+        response = method(*args)
+        if metrics is not None:
+            metrics.observe("list_page", time.perf_counter() - start)
+        return response.url, response.body
+
+    page_url, html = request(session.get, search_url)
+
+    if page_workers <= 1:
+        current_page = 1
+        while True:
+            hrefs, form_action, form_fields, postbacks = \
+                parse_search_page(html, page_url)
+            count_page(metrics, hrefs)
+            yield from hrefs
+
+            current_page += 1
+            argument = "Page$" + str(current_page)
+            if argument not in postbacks:
+                break
+
+            form_fields["__EVENTTARGET"] = postbacks[argument]
+            form_fields["__EVENTARGUMENT"] = argument
+            page_url, html = request(session.post, form_action,
+                                     urlencode(form_fields).encode())
+        return
+
+    def post_page(form_action, form_fields, target, argument):
+        fields = dict(form_fields, __EVENTTARGET=target,
+                      __EVENTARGUMENT=argument)
+        return request(session.post, form_action,
+                       urlencode(fields).encode())
+
+    requested = {1}
+    # Pages offered by a pager that arrived, with the form state to request
+    # them with, waiting for a free worker.
+    waiting = []
+    pending = set()
+    with futures.ThreadPoolExecutor(max_workers=page_workers) as executor:
+        try:
+            while True:
+                hrefs, form_action, form_fields, postbacks = \
+                    parse_search_page(html, page_url)
+                count_page(metrics, hrefs)
+                yield from hrefs
+                for argument, target in postbacks.items():
+                    number = page_number(argument)
+                    if number is not None and number not in requested:
+                        requested.add(number)
+                        waiting.append((form_action, form_fields, target,
+                                        argument))
+                while waiting and len(pending) < page_workers:
+                    pending.add(executor.submit(post_page, *waiting.pop(0)))
+                if not pending:
+                    return
+                done, _ = futures.wait(pending,
+                                       return_when=futures.FIRST_COMPLETED)
+                future = done.pop()
+                pending.remove(future)
+                page_url, html = future.result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def get_fund_list_selenium(search_url=SEARCH_URL):
+    """
+    Get list of funds by clicking through the pages in a headless Firefox.
+    returns: list of hrefs of the fund profile pages.
+    """
+    return list(iter_fund_list_selenium(search_url))
+
+
+def iter_fund_list_selenium(search_url=SEARCH_URL, metrics=None):
+    """
+    Yield the hrefs of each search page, clicking through the pages in a
+    headless Firefox.
+    """
+    # Selenium is only needed for this fallback, so import it here.
+    # pylint: disable=import-outside-toplevel
+    from selenium import webdriver
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.common.exceptions import NoSuchElementException
+    from selenium.webdriver.firefox.options import Options
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
+
     options = Options()
     options.add_argument("--headless")
     driver = webdriver.Firefox(options=options)
-    driver.get('http://idata.fundata.com/mutualfunds/Search.aspx')
-    current_page = 1
+    # The browser is shut down even if the caller stops iterating early.
+    try:
+        driver.get(search_url)
+        current_page = 1
 
-    href_list = []
+        while True:
+            soup = BeautifulSoup(driver.page_source)
 
-    while True:
-        soup = BeautifulSoup(driver.page_source)
+            hrefs = [link['href']
+                     for link in soup.findAll("a", {"title": FUND_LINK_TITLE})]
+            count_page(metrics, hrefs)
+            yield from hrefs
 
-        fund_links = soup.findAll("a", {"title": "Click here to view summary" \
-                " information about this mutual fund"})
-        for link in fund_links:
-            print(link.text)
-            href_list.append(link['href'])
+            current_page += 1
 
-        current_page += 1
-        print("############ Page "  + str(current_page) + "##############")
+            time.sleep(randint(1, 5))
+            try:
+                driver.find_element_by_link_text(str(current_page)).click()
+            except NoSuchElementException:
+                break
 
-        time.sleep(randint(1, 5))
-        try:
-            driver.find_element_by_link_text(str(current_page)).click()
-        except NoSuchElementException:
-            break
-
-        wait = WebDriverWait(driver, 30)
-        wait.until(
-            EC.presence_of_element_located(
-                (By.XPATH, "//span[text()='" + str(current_page) + "']")
+            wait = WebDriverWait(driver, 30)
+            wait.until(
+                EC.presence_of_element_located(
+                    (By.XPATH, "//span[text()='" + str(current_page) + "']")
+                )
             )
-        )
-
-    return href_list
+    finally:
+        driver.quit()
@@ -0,0 +1,302 @@
+"""
+Module containing the append-only history of scraped fund data.
+
+Each run appends the records of every fund to Parquet files partitioned by
+scrape date and management company:
+
+    <directory>/<table>/scrape_date=2024-01-31/management_co=<name>/
+        part-<batch>-<n>.parquet
+    <directory>/versions.sqlite
+
+Files are never rewritten. A fund's rows are only written when they differ
+from the last version stored for it, so a fund whose values did not change
+since the previous run costs nothing. A fund that drops out of the list, or
+whose rows in a table are gone, gets a version without a file.
+versions.sqlite indexes every stored version by fund, date and file, so
+history() and cross_section() read only the files that hold the rows they
+return, filtered to those funds.
+
+Single values are stored with the typed columns of fundatascraper.normalize
+(NAVPS and returns as float32, etc.); pass normalized=False to keep the raw
+strings. Parquet output needs pyarrow.
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import time
+import pandas as pd
+from fundatascraper import writers
+
+# Digest of the version recorded when a fund is no longer listed; it is
+# left out of later cross sections.
+DELETED = None
+
+# Changed rows buffered across all partitions before the largest partition
+# is written out early.
+MAX_BUFFERED_ROWS = 100000
+
+
+def partition_name(value):
+    """Return a file system safe partition value for `value`."""
+    return re.sub(r"[^A-Za-z0-9]+", "_", value or "").strip("_") or "unknown"
+
+
+def digest(rows):
+    """Return a digest of a fund's rows in one table, ignoring the href."""
+    rows = [{key: value for key, value in row.items() if key != "href"}
+            for row in rows]
+    return hashlib.sha1(
+        json.dumps(rows, sort_keys=True, default=str).encode()
+    ).hexdigest()
+
+
+class SnapshotStore:
+    """Append-only, partitioned store of fund records over time."""
+    def __init__(self, directory, normalized=True, by_company=True,
+                 row_group_size=writers.DEFAULT_ROW_GROUP_SIZE):
+        self.directory = directory
+        self.normalized = normalized
+        self.by_company = by_company
+        self.row_group_size = row_group_size
+        os.makedirs(directory, exist_ok=True)
+        self.db = sqlite3.connect(os.path.join(directory, "versions.sqlite"))
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS versions ("
+            " version_id INTEGER PRIMARY KEY,"
+            " table_name TEXT NOT NULL,"
+            " href TEXT NOT NULL,"
+            " scrape_date TEXT NOT NULL,"
+            " management_co TEXT,"
+            " digest TEXT,"
+            " path TEXT)"
+        )
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS runs ("
+            " scrape_date TEXT NOT NULL,"
+            " written INTEGER NOT NULL,"
+            " unchanged INTEGER NOT NULL,"
+            " deleted INTEGER NOT NULL)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS versions_href"
+                        " ON versions (table_name, href)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS versions_date"
+                        " ON versions (table_name, scrape_date)")
+        self.db.commit()
+
+    def latest_digests(self, table):
+        """Return the digest of the latest version of each fund in `table`."""
+        return dict(self.db.execute(
+            "SELECT href, digest FROM versions WHERE version_id IN"
+            " (SELECT MAX(version_id) FROM versions WHERE table_name = ?"
+            "  GROUP BY href)", (table,)
+        ))
+
+    def partition_path(self, table, scrape_date, management_co, batch):
+        """Return the path, relative to the store, of a partition file."""
+        parts = [table, "scrape_date=" + scrape_date]
+        if self.by_company:
+            parts.append("management_co=" + partition_name(management_co))
+        parts.append("part-{}.parquet".format(batch))
+        return os.path.join(*parts)
+
+    def open_sink(self, table, path):
+        """Open a ParquetSink for a new partition file of `table`."""
+        schema = [("scrape_date", "string")] + writers.TABLES[table]
+        transform = None
+        if self.normalized and table in writers.NORMALIZERS:
+            convert_schema, transform = writers.NORMALIZERS[table]
+            schema = convert_schema(schema)
+        full_path = os.path.join(self.directory, path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        return writers.ParquetSink(full_path, schema, self.row_group_size,
+                                   transform)
+
+    def write_partition(self, table, partition, name, versions):
+        """
+        Write the buffered rows of one partition to a new file called
+        `name` and move their pending versions, now pointing at that file,
+        to `versions`.
+        returns: the number of rows written.
+        """
+        rows, pending = partition
+        scrape_date, management_co = pending[0][2], pending[0][3]
+        path = self.partition_path(table, scrape_date, management_co, name)
+        sink = self.open_sink(table, path)
+        try:
+            sink.write_many(rows)
+        finally:
+            sink.close()
+        versions.extend(version + (path,) for version in pending)
+        count = len(rows)
+        del rows[:], pending[:]
+        return count
+
+    def append(self, scrape_date, funds, href_list=None):
+        """
+        Append the funds scraped on `scrape_date` (a "YYYY-MM-DD" string).
+        funds: iterable of (href, records) as stored in a CrawlJournal.
+        href_list: the full fund list of the run, if known; funds stored
+        before but missing from it are recorded as deleted.
+        returns: dict counting the fund tables written, unchanged and
+        deleted.
+        """
+        batch = "{}-{}".format(int(time.time() * 1000), os.getpid())
+        latest = {table: self.latest_digests(table)
+                  for table in writers.TABLES}
+        # Changed rows are buffered per partition and each file is written
+        # in one go, so only one file is open at a time however many
+        # companies there are.
+        partitions = {}
+        files = {}
+        buffered = 0
+        versions = []
+        counts = {"written": 0, "unchanged": 0, "deleted": 0}
+        seen = set()
+        for href, fund_records in funds:
+            seen.add(href)
+            single_values = fund_records.get("single_values") or [{}]
+            management_co = single_values[0].get("management_co")
+            for table, rows in fund_records.items():
+                if table not in writers.TABLES:
+                    continue
+                row_digest = digest(rows)
+                previous = latest[table].get(href)
+                if previous == row_digest or \
+                        (not rows and previous is DELETED):
+                    counts["unchanged"] += 1
+                    continue
+                counts["written"] += 1
+                if not rows:
+                    # The fund no longer has rows in this table; the version
+                    # has no file.
+                    versions.append((table, href, scrape_date,
+                                     management_co, row_digest, None))
+                    continue
+                key = (table, management_co if self.by_company else None)
+                partition = partitions.setdefault(key, ([], []))
+                partition[0].extend(dict(row, scrape_date=scrape_date)
+                                    for row in rows)
+                partition[1].append((table, href, scrape_date,
+                                     management_co, row_digest))
+                buffered += len(rows)
+                if len(partition[0]) < self.row_group_size and \
+                        buffered < MAX_BUFFERED_ROWS:
+                    continue
+                if len(partition[0]) < self.row_group_size:
+                    # Over the memory budget: write the largest partition.
+                    key = max(partitions,
+                              key=lambda key: len(partitions[key][0]))
+                files[key] = files.get(key, 0) + 1
+                buffered -= self.write_partition(
+                    key[0], partitions[key],
+                    "{}-{}".format(batch, files[key]), versions)
+        for key, partition in sorted(partitions.items(),
+                                     key=lambda item: str(item[0])):
+            if partition[0]:
+                files[key] = files.get(key, 0) + 1
+                self.write_partition(key[0], partition,
+                                     "{}-{}".format(batch, files[key]),
+                                     versions)
+        if href_list is not None:
+            listed = set(href_list)
+            for table, digests in latest.items():
+                for href, row_digest in digests.items():
+                    if href not in listed and href not in seen and \
+                            row_digest is not DELETED:
+                        versions.append((table, href, scrape_date, None,
+                                         DELETED, None))
+                        counts["deleted"] += 1
+        # The index is only updated once every file is complete, so readers
+        # never see versions whose rows are missing.
+        with self.db:
+            self.db.executemany(
+                "INSERT INTO versions (table_name, href, scrape_date,"
+                " management_co, digest, path) VALUES (?, ?, ?, ?, ?, ?)",
+                versions)
+            self.db.execute(
+                "INSERT INTO runs (scrape_date, written, unchanged, deleted)"
+                " VALUES (:date, :written, :unchanged, :deleted)",
+                dict(counts, date=scrape_date))
+        return counts
+
+    def read_versions(self, table, rows, columns):
+        """
+        Read the stored rows of the (href, path) pairs in `rows` from the
+        files that hold them.
+        """
+        # pylint: disable=import-outside-toplevel
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        by_path = {}
+        for href, path in rows:
+            by_path.setdefault(path, set()).add(href)
+        if columns is not None:
+            columns = ["href", "scrape_date"] + [
+                column for column in columns
+                if column not in ("href", "scrape_date")]
+        if not by_path:
+            schema = [("scrape_date", "string")] + writers.TABLES[table]
+            return pd.DataFrame(columns=columns or [name for name, _ in
+                                                    schema])
+        # Each file is filtered to the funds whose requested version it
+        # holds; it may also hold older versions of other funds.
+        return pa.concat_tables(
+            pq.read_table(os.path.join(self.directory, path),
+                          columns=columns,
+                          filters=[("href", "in", sorted(hrefs))])
+            for path, hrefs in sorted(by_path.items())
+        ).to_pandas()
+
+    def history(self, href, columns=None, table="single_values",
+                start=None, end=None):
+        """
+        Return every stored version of one fund's rows in `table` between
+        the scrape dates `start` and `end` (inclusive, default: all), oldest
+        first. A version is kept until the fund changes, so each row holds
+        from its scrape_date to the next one.
+        """
+        rows = self.db.execute(
+            "SELECT href, path FROM versions WHERE table_name = ?"
+            " AND href = ? AND scrape_date >= ? AND scrape_date <= ?"
+            " AND path IS NOT NULL",
+            (table, href, start or "", end or "9999-99-99")
+        ).fetchall()
+        frame = self.read_versions(table, rows, columns)
+        return frame.sort_values("scrape_date", kind="stable")\
+            .reset_index(drop=True)
+
+    def cross_section(self, as_of, columns=None, table="single_values",
+                      management_co=None):
+        """
+        Return the rows of `table` for every fund as they stood on the
+        scrape date `as_of`, optionally only for one management company.
+        """
+        sql = ("SELECT v.href, v.path FROM versions v JOIN"
+               " (SELECT MAX(version_id) AS version_id FROM versions"
+               "  WHERE table_name = ? AND scrape_date <= ? GROUP BY href)"
+               " latest ON v.version_id = latest.version_id"
+               " WHERE v.path IS NOT NULL")
+        parameters = [table, as_of]
+        if management_co is not None:
+            sql += " AND v.management_co = ?"
+            parameters.append(management_co)
+        rows = self.db.execute(sql, parameters).fetchall()
+        return self.read_versions(table, rows, columns)\
+            .sort_values("href", kind="stable").reset_index(drop=True)
+
+    def dates(self):
+        """Return the date of every run appended, oldest first."""
+        return [row[0] for row in self.db.execute(
+            "SELECT DISTINCT scrape_date FROM runs ORDER BY scrape_date")]
+
+    def close(self):
+        """Close the version index."""
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
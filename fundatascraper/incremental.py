@@ -0,0 +1,193 @@
+"""
+Module for refreshing a previous crawl incrementally.
+
+The fund list is compared with the snapshot saved by the previous refresh.
+New funds are scraped in full and removed funds are deleted. Funds seen
+before only have their volatile fields (VOLATILE_FIELDS) re-read, unless a
+full re-scrape of the fund is due, which happens every `full_every` seconds.
+A fund whose page fails to download or parse is listed in
+<state_dir>/dead_letter.jsonl and keeps its snapshot, including when its
+last full scrape was, so it is tried again by the next refresh.
+
+Each refresh writes a change set of JSON lines to
+<state_dir>/changes/<timestamp>-<n>.jsonl, where n numbers the refreshes
+started within the same second, so the file names sort in refresh order:
+
+    {"op": "insert", "href": ..., "values": {...}, "tables": {...}}
+    {"op": "update", "href": ..., "values": {changed fields},
+     "tables": {replaced tables}}
+    {"op": "delete", "href": ...}
+"""
+import json
+import os
+import time
+from fundatascraper.fund_page import FundProfileScraper, NUMS_TOP_FIELDS
+from fundatascraper.journal import write_dead_letter
+from fundatascraper.parsers import parse_document
+
+# Fields that change from day to day; everything else is only re-read on a
+# full re-scrape.
+VOLATILE_FIELDS = NUMS_TOP_FIELDS
+
+DEFAULT_FULL_EVERY = 7 * 24 * 60 * 60
+
+
+class Snapshot:
+    """
+    The state of every fund as of the last refresh, saved as JSON in
+    <state_dir>/snapshot.json.
+    full_scrape_at: dict mapping each href to the time of its last full
+    scrape.
+    """
+    def __init__(self, state_dir):
+        self.path = os.path.join(state_dir, "snapshot.json")
+        self.full_scrape_at = {}
+        self.funds = {}
+        if os.path.exists(self.path):
+            with open(self.path) as snapshot:
+                state = json.load(snapshot)
+            self.funds = state["funds"]
+            self.full_scrape_at = state["full_scrape_at"]
+            if not isinstance(self.full_scrape_at, dict):
+                # Snapshots used to keep one time for every fund.
+                self.full_scrape_at = {
+                    href: self.full_scrape_at for href in self.funds
+                } if self.full_scrape_at is not None else {}
+
+    def full_scrape_due(self, href, now, full_every):
+        """True if the fund `href` was not scraped in full recently."""
+        scraped_at = self.full_scrape_at.get(href)
+        return scraped_at is None or now - scraped_at >= full_every
+
+    def save(self):
+        """Atomically replace the saved snapshot."""
+        partial = self.path + ".tmp"
+        with open(partial, "w") as snapshot:
+            json.dump({"full_scrape_at": self.full_scrape_at,
+                       "funds": self.funds}, snapshot)
+            snapshot.flush()
+            os.fsync(snapshot.fileno())
+        os.replace(partial, self.path)
+
+
+def split_records(fund_records):
+    """
+    Split the output of FundProfileScraper.scrape_records() into the single
+    values (without href) and the per-table records.
+    """
+    values = dict(fund_records["single_values"][0])
+    del values["href"]
+    tables = {table: records for table, records in fund_records.items()
+              if table != "single_values"}
+    return {"values": values, "tables": tables}
+
+
+def scrape_volatile(html, parser="html.parser"):
+    """
+    Read only VOLATILE_FIELDS from a fund page. With the streaming parser
+    the rest of the page is not parsed at all.
+    """
+    document = parse_document(
+        html, parser, [element_id for _, element_id in VOLATILE_FIELDS]
+    )
+    try:
+        return {name: document.text(element_id)
+                for name, element_id in VOLATILE_FIELDS}
+    finally:
+        document.close()
+
+
+def diff_fund(old, new):
+    """Return the update entry turning `old` into `new`, or None."""
+    values = {name: value for name, value in new["values"].items()
+              if old["values"].get(name) != value}
+    tables = {table: records for table, records in new.get("tables", {})
+              .items() if old["tables"].get(table) != records}
+    if not values and not tables:
+        return None
+    return {"values": values, "tables": tables}
+
+
+def open_change_set(state_dir, now):
+    """
+    Create a new change set file for a refresh started at `now`, never
+    overwriting the change set of an earlier refresh in the same second.
+    returns: (path, open file).
+    """
+    stamp = time.strftime("%Y%m%dT%H%M%S", time.gmtime(now))
+    number = 0
+    while True:
+        path = os.path.join(state_dir, "changes",
+                            "{}-{:03d}.jsonl".format(stamp, number))
+        try:
+            return path, open(path, "x")
+        except FileExistsError:
+            number += 1
+
+
+def refresh(href_list, fetcher, state_dir, base_url, parser="html.parser",
+            full_every=DEFAULT_FULL_EVERY, now=None):
+    #pylint: disable-msg=too-many-locals
+    """
+    Refresh the snapshot in `state_dir` against the current `href_list`,
+    fetching pages with `fetcher` (a ConcurrentFetcher).
+    returns: (path of the change set, dict of counts per operation and of
+    failed fetches). The failed hrefs are written to
+    <state_dir>/dead_letter.jsonl.
+    """
+    now = time.time() if now is None else now
+    os.makedirs(os.path.join(state_dir, "changes"), exist_ok=True)
+    snapshot = Snapshot(state_dir)
+
+    current = list(dict.fromkeys(href_list))
+    listed = set(current)
+    removed = [href for href in snapshot.funds if href not in listed]
+    counts = {"insert": 0, "update": 0, "delete": 0, "failed": 0}
+    failures = []
+
+    path, changes = open_change_set(state_dir, now)
+    with changes:
+        def emit(entry):
+            changes.write(json.dumps(entry) + "\n")
+            counts[entry["op"]] += 1
+
+        urls = [base_url + href for href in current]
+        for url, html in fetcher.fetch_all(urls, return_exceptions=True):
+            href = url[len(base_url):]
+            old = snapshot.funds.get(href)
+            full = old is None or snapshot.full_scrape_due(href, now,
+                                                           full_every)
+            try:
+                if isinstance(html, Exception):
+                    raise html
+                if full:
+                    new = split_records(FundProfileScraper(
+                        url, html=html, parser=parser).scrape_records(href))
+                else:
+                    new = {"values": scrape_volatile(html, parser)}
+            except Exception as error:  # pylint: disable=broad-except
+                counts["failed"] += 1
+                failures.append((href, error))
+                continue
+            if full:
+                snapshot.full_scrape_at[href] = now
+
+            if old is None:
+                snapshot.funds[href] = new
+                emit({"op": "insert", "href": href, **new})
+                continue
+            update = diff_fund(old, new)
+            if update is not None:
+                old["values"].update(update["values"])
+                old["tables"].update(update["tables"])
+                emit({"op": "update", "href": href, **update})
+
+        for href in removed:
+            del snapshot.funds[href]
+            snapshot.full_scrape_at.pop(href, None)
+            emit({"op": "delete", "href": href})
+
+    snapshot.save()
+    write_dead_letter(os.path.join(state_dir, "dead_letter.jsonl"),
+                      failures)
+    return path, counts
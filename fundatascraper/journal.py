@@ -0,0 +1,179 @@
+"""
+Module containing the append-only journal that lets an interrupted crawl
+resume where it stopped.
+
+The first line records the scrape date of the run the journal belongs to,
+if it has one, and each following line is a JSON object for one fund:
+
+    {"scrape_date": "2024-01-31"}
+    {"href": ..., "status": "done", "records": {table: [record, ...]}}
+    {"href": ..., "status": "failed", "error_type": "...", "error": "..."}
+
+Entries are flushed and fsynced as they are written. If the process is
+killed part way through a write, only the final line can be incomplete;
+it is ignored when the journal is read and cut off before new entries are
+appended, so earlier entries are never affected.
+"""
+import json
+import os
+import time
+
+DONE = "done"
+FAILED = "failed"
+
+
+def journal_scrape_date(path):
+    """
+    Return the scrape date recorded in the journal at `path`, or None if
+    there is no journal or it does not record one.
+    """
+    try:
+        with open(path, "rb") as journal:
+            line = journal.readline()
+    except FileNotFoundError:
+        return None
+    try:
+        return json.loads(line).get("scrape_date")
+    except (ValueError, AttributeError):
+        return None
+
+
+class CrawlJournal:
+    """
+    Append-only journal of crawl progress keyed by fund href. A new journal
+    records `scrape_date`, if given. An existing journal that records a
+    different scrape date belongs to another run, and is started over.
+    """
+    def __init__(self, path, scrape_date=None):
+        self.path = path
+        self.statuses = {}
+        self.scrape_date = scrape_date
+        if os.path.exists(path):
+            recorded = journal_scrape_date(path)
+            if scrape_date is not None and recorded is not None and \
+                    recorded != scrape_date:
+                os.remove(path)
+            else:
+                self.scrape_date = recorded
+                self.repair()
+                for entry in self.entries():
+                    self.statuses[entry["href"]] = entry["status"]
+        self.file = open(path, "ab")
+        if self.file.tell() == 0 and self.scrape_date is not None:
+            self.write({"scrape_date": self.scrape_date})
+
+    def repair(self):
+        """Cut off an incomplete final line left by an interrupted write."""
+        with open(self.path, "rb+") as journal:
+            end = journal.seek(0, os.SEEK_END)
+            while end > 0:
+                start = max(end - 4096, 0)
+                journal.seek(start)
+                newline = journal.read(end - start).rfind(b"\n")
+                if newline != -1:
+                    end = start + newline + 1
+                    break
+                end = start
+            journal.truncate(end)
+
+    def entries(self):
+        """Yield every complete fund entry in the journal, oldest first."""
+        with open(self.path, "rb") as journal:
+            for line in journal:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if "href" in entry:
+                    yield entry
+
+    def completed(self):
+        """Return the set of hrefs whose latest entry is done."""
+        return {href for href, status in self.statuses.items()
+                if status == DONE}
+
+    def pending(self, href_list):
+        """
+        Return an iterator over the hrefs in `href_list` that are not done
+        yet. `href_list` is consumed lazily, so it may be a generator.
+        """
+        completed = self.completed()
+        return (href for href in href_list if href not in completed)
+
+    def completed_records(self):
+        """
+        Yield (href, records) for each completed fund, reading the journal
+        from disk so the records are never all held in memory.
+        """
+        completed = self.completed()
+        seen = set()
+        for entry in self.entries():
+            href = entry["href"]
+            if entry["status"] == DONE and href in completed and \
+                    href not in seen:
+                seen.add(href)
+                yield href, entry["records"]
+
+    def failed_entries(self):
+        """
+        Return the latest entry of each fund whose latest status is failed.
+        """
+        failed = {href for href, status in self.statuses.items()
+                  if status == FAILED}
+        entries = {}
+        for entry in self.entries():
+            if entry["href"] in failed and entry["status"] == FAILED:
+                entries[entry["href"]] = entry
+        return list(entries.values())
+
+    def write(self, entry):
+        """Durably write a line to the journal."""
+        self.file.write(json.dumps(entry).encode() + b"\n")
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def append(self, entry):
+        """Durably append a fund entry to the journal."""
+        entry["time"] = time.time()
+        self.write(entry)
+        self.statuses[entry["href"]] = entry["status"]
+
+    def record_done(self, href, records):
+        """Record that `href` was scraped into `records`."""
+        self.append({"href": href, "status": DONE, "records": records})
+
+    def record_failed(self, href, error):
+        """Record that scraping `href` failed with `error`."""
+        self.append({"href": href, "status": FAILED,
+                     "error_type": type(error).__name__, "error": str(error)})
+
+    def close(self):
+        """Close the journal file."""
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def write_dead_letter(path, failures):
+    """
+    Write the hrefs that failed in a run, with their errors, as JSON lines.
+    failures: list of (href, exception) pairs, or of failed journal entries.
+    """
+    with open(path, "w") as dead_letter:
+        for failure in failures:
+            if isinstance(failure, dict):
+                href, error_type, error = (failure["href"],
+                                           failure["error_type"],
+                                           failure["error"])
+            else:
+                href, error = failure
+                error_type, error = type(error).__name__, str(error)
+            dead_letter.write(json.dumps({
+                "href": href, "error_type": error_type, "error": error
+            }) + "\n")
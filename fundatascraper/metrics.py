@@ -0,0 +1,228 @@
+"""
+Module containing the counters and timings recorded during a crawl.
+
+A Metrics object is shared by the fetcher, the pipeline and the writing
+loop of scrape_fund_details.py. It records, among others:
+
+    fetch                    seconds per page download
+    parse                    seconds per page in the parser, split into
+    parse_document           reading the page and
+    parse_<x>                each FundProfileScraper.scrape_<x> method
+    write                    seconds spent handing a fund's records to sinks
+    page_bytes               bytes of page bodies downloaded
+    retries, fetch_failures  retried and abandoned downloads
+    funds_scraped, funds_failed
+    list_page                seconds per search page request
+    list_pages, funds_listed search pages and funds listed so far
+
+The same numbers can be shown as a progress line, written in the
+Prometheus text format (e.g. for the node_exporter textfile collector) or
+dumped as a JSON summary at the end of a run, which shows whether the
+network, parsing or writing is the bottleneck.
+"""
+import collections
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+
+METRIC_PREFIX = "fundatascraper_"
+
+
+class Timing:
+    """Count, total and maximum of the durations observed for one stage."""
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        """Add one duration."""
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    @property
+    def mean(self):
+        """Mean duration in seconds, or 0 before any observation."""
+        return self.total / self.count if self.count else 0.0
+
+
+class Metrics:
+    """Thread safe counters and stage timings of one crawl."""
+    def __init__(self):
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.counters = collections.Counter()
+        self.timings = collections.defaultdict(Timing)
+        self.lock = threading.Lock()
+
+    def increment(self, name, value=1):
+        """Add `value` to the counter `name`."""
+        with self.lock:
+            self.counters[name] += value
+
+    def observe(self, name, seconds):
+        """Record a duration of the stage `name`."""
+        with self.lock:
+            self.timings[name].observe(seconds)
+
+    def observe_all(self, timings):
+        """Record every (stage, seconds) pair of the dict `timings`."""
+        with self.lock:
+            for name, seconds in timings.items():
+                self.timings[name].observe(seconds)
+
+    @contextlib.contextmanager
+    def timer(self, name):
+        """Context manager recording the time spent in its block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def elapsed(self):
+        """Seconds since the metrics were created."""
+        return time.perf_counter() - self.start
+
+    def summary(self):
+        """Return the counters and timings as a JSON serializable dict."""
+        with self.lock:
+            counters = dict(self.counters)
+            timings = {name: {"count": timing.count,
+                              "total_seconds": timing.total,
+                              "mean_seconds": timing.mean,
+                              "max_seconds": timing.max}
+                       for name, timing in sorted(self.timings.items())}
+        elapsed = self.elapsed()
+        return {
+            "started_at": self.started_at,
+            "elapsed_seconds": elapsed,
+            "funds_per_second":
+                counters.get("funds_scraped", 0) / elapsed if elapsed else 0.0,
+            "counters": counters,
+            "timings": timings,
+        }
+
+    def progress_line(self, total=None):
+        """Return a one line summary of the crawl so far."""
+        with self.lock:
+            done = self.counters["funds_scraped"]
+            failed = self.counters["funds_failed"]
+            resumed = self.counters["funds_resumed"]
+            retries = self.counters["retries"]
+            listed = self.counters["funds_listed"]
+            list_pages = self.counters["list_pages"]
+            megabytes = self.counters["page_bytes"] / (1024.0 * 1024.0)
+            means = [(name, self.timings[name].mean * 1000)
+                     for name in ("fetch", "parse", "write")
+                     if name in self.timings]
+        elapsed = self.elapsed()
+        rate = done / elapsed if elapsed else 0.0
+        line = "{}{} funds  {:.2f}/s".format(
+            done, "/{}".format(total) if total is not None else "", rate)
+        if total is None and list_pages:
+            # The fund list is still being paged.
+            line += "  {} listed in {} pages".format(listed, list_pages)
+        if total is not None and rate:
+            remaining = max(total - resumed - done - failed, 0) / rate
+            line += "  eta {}".format(time.strftime(
+                "%H:%M:%S", time.gmtime(remaining)))
+        line += "".join("  {} {:.0f}ms".format(name, mean)
+                        for name, mean in means)
+        line += "  {:.1f}MB  {} retries  {} failed".format(
+            megabytes, retries, failed)
+        return line
+
+    def prometheus_text(self):
+        """Return the metrics in the Prometheus text exposition format."""
+        summary = self.summary()
+        lines = []
+        for name, value in sorted(summary["counters"].items()):
+            metric = METRIC_PREFIX + name + "_total"
+            lines.append("# TYPE {} counter".format(metric))
+            lines.append("{} {}".format(metric, value))
+        for name, timing in summary["timings"].items():
+            metric = METRIC_PREFIX + name + "_seconds"
+            lines.append("# TYPE {} summary".format(metric))
+            lines.append("{}_count {}".format(metric, timing["count"]))
+            lines.append("{}_sum {:.6f}".format(metric,
+                                                timing["total_seconds"]))
+        for name in ("elapsed_seconds", "funds_per_second"):
+            lines.append("# TYPE {}{} gauge".format(METRIC_PREFIX, name))
+            lines.append("{}{} {:.6f}".format(METRIC_PREFIX, name,
+                                              summary[name]))
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """Atomically replace `path` with prometheus_text()."""
+        write_atomic(path, self.prometheus_text())
+
+    def write_summary(self, path):
+        """Atomically replace `path` with the JSON summary()."""
+        write_atomic(path, json.dumps(self.summary(), indent=2) + "\n")
+
+
+def write_atomic(path, text):
+    """Write `text` to `path` through a temporary file and a rename."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temp_path = path + ".tmp"
+    with open(temp_path, "w") as temp_file:
+        temp_file.write(text)
+    os.replace(temp_path, path)
+
+
+class ProgressReporter:
+    """
+    Background thread that prints the progress line of `metrics` to `stream`
+    (default: stderr) and rewrites the Prometheus file `prometheus_path`, if
+    given, every `interval` seconds. An `interval` of 0 disables the
+    progress line; the Prometheus file is then rewritten once a minute.
+    """
+    def __init__(self, metrics, total=None, interval=5.0, stream=None,
+                 prometheus_path=None):
+        # pylint: disable=too-many-arguments
+        self.metrics = metrics
+        self.total = total
+        self.interval = interval
+        self.stream = stream or sys.stderr
+        self.prometheus_path = prometheus_path
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def report(self):
+        """Print the progress line and write the Prometheus file."""
+        if self.interval:
+            self.stream.write(self.metrics.progress_line(self.total) + "\n")
+            self.stream.flush()
+        if self.prometheus_path:
+            self.metrics.write_prometheus(self.prometheus_path)
+
+    def run(self):
+        """Report every `interval` seconds until stopped."""
+        while not self.stopped.wait(self.interval or 60):
+            self.report()
+
+    def start(self):
+        """Start reporting in a daemon thread."""
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """Stop the thread and report one last time."""
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.report()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -0,0 +1,94 @@
+"""
+Module for converting the raw strings scraped from fund pages into typed
+columns.
+
+Conversions work on whole pandas columns with vectorized string methods
+rather than per record. The conversion of each column follows the kind of
+its field in fundatascraper.schema:
+
+    percent (returns, MER, fees)  "2.35%"      -> 2.35 (float32, in percent)
+    number (navps, change)        "$27.7827"   -> 27.7827 (float32)
+    assets                        "$1,234.5M"  -> 1234.5 (float32, $ millions)
+    quartile (rank, quartiles)    "2"          -> 2 (Int8)
+    category (load, sales_status) "Optional"   -> category
+
+Anything that does not parse, such as "-" or "N/A", becomes NA.
+"""
+import pandas as pd
+from fundatascraper.schema import FIELDS, column_types
+
+# Type alias of every normalized column, as used in the writers' schemas.
+COLUMN_TYPES = {name: alias for name, alias in column_types().items()
+                if alias != "string"}
+
+# Multipliers converting an assets figure with the given suffix to millions
+# of dollars. Figures without a suffix are taken to be in dollars.
+ASSETS_MULTIPLIERS = {"": 1e-6, "K": 1e-3, "M": 1.0, "B": 1e3}
+
+
+def clean_numbers(series):
+    """
+    Strip currency signs, thousands separators, percent signs and
+    whitespace, and turn accounting style "(1.23)" into "-1.23".
+    """
+    return (series.astype("string")
+            .str.replace(r"[\s$,%]", "", regex=True)
+            .str.replace(r"^\((.*)\)$", r"-\1", regex=True))
+
+
+def to_float32(series):
+    """Convert strings such as "2.35%" or "$27.78" to float32."""
+    return pd.to_numeric(clean_numbers(series), errors="coerce")\
+        .astype("float32")
+
+
+def to_assets(series):
+    """Convert strings such as "$1,234.5M" to float32 millions of dollars."""
+    parts = clean_numbers(series).str.upper()\
+        .str.extract(r"^(-?[\d.]+)([KMB]?)$")
+    amount = pd.to_numeric(parts[0], errors="coerce")
+    multiplier = parts[1].map(ASSETS_MULTIPLIERS).astype("float64")
+    return (amount * multiplier).astype("float32")
+
+
+def to_quartile(series):
+    """Convert quartile ranks such as "2" to Int8."""
+    digits = series.astype("string").str.extract(r"(\d+)", expand=False)
+    return pd.to_numeric(digits, errors="coerce").astype("Int8")
+
+
+def to_category(series):
+    """Convert labels to a category column, with blanks and "-" as NA."""
+    labels = series.astype("string").str.strip()
+    return labels.mask(labels.isin(["", "-", "N/A"])).astype("category")
+
+
+# Converter applied to the columns of each field kind in
+# fundatascraper.schema.KINDS; text columns are left alone.
+CONVERTERS = {
+    "percent": to_float32,
+    "number": to_float32,
+    "assets": to_assets,
+    "quartile": to_quartile,
+    "category": to_category,
+}
+
+COLUMN_CONVERTERS = {field.name: CONVERTERS[field.kind] for field in FIELDS
+                     if field.kind in CONVERTERS}
+
+
+def normalize_single_values(frame):
+    """
+    Return a copy of a single_values frame with every column listed in
+    COLUMN_TYPES converted to its typed form. Other columns are unchanged.
+    """
+    frame = frame.copy()
+    for name in frame.columns:
+        if name in COLUMN_CONVERTERS:
+            frame[name] = COLUMN_CONVERTERS[name](frame[name])
+    return frame
+
+
+def normalized_schema(schema):
+    """Return `schema` with the types of the normalized columns applied."""
+    return [(name, COLUMN_TYPES.get(name, alias)) for name, alias in schema]
@@ -0,0 +1,340 @@
+"""
+Module containing the parser backends used to read fund pages.
+
+Every backend produces a document exposing the three lookups the scraper
+needs, so the scrape_* methods return identical values whichever backend
+parsed the page:
+
+    text(element_id)       text of the element, including descendants
+    area_titles(map_id)    title of every <area> in an image map
+    table_rows(table_id)   text of the <td> cells of every <tr> in a table
+
+and close(), which frees the parsed page once the values are extracted.
+
+Backends:
+
+    html.parser   BeautifulSoup with the pure Python tree builder, building
+                  only the target elements when targets are given
+    lxml          lxml.html, C-backed (requires lxml), keeping only copies of
+                  the target elements when targets are given
+    streaming     event parser that keeps only the target elements and stops
+                  reading the page once all of them have been captured
+"""
+import codecs
+import copy
+import re
+from html.parser import HTMLParser
+from bs4 import BeautifulSoup, SoupStrainer
+
+CHUNK_SIZE = 16 * 1024
+
+_CHARSET_RE = re.compile(rb'charset=["\']?([\w-]+)', re.IGNORECASE)
+
+
+def index_elements(soup):
+    """
+    Index every element carrying an id in a single walk of the tree so each
+    field is a dict lookup instead of another full-tree search. The first
+    element wins on duplicate ids, matching soup.find().
+    """
+    elements = {}
+    for element in soup.find_all(id=True):
+        elements.setdefault(element["id"], element)
+    return elements
+
+
+def read_all(html):
+    """Return the full contents of `html` if it is a file-like object."""
+    if hasattr(html, "read"):
+        return html.read()
+    return html
+
+
+class SoupDocument:
+    """
+    Fund page parsed into a BeautifulSoup tree. If `targets` is given only
+    the elements with those ids, and their descendants, are kept.
+    """
+    def __init__(self, html, features='html.parser', targets=None):
+        parse_only = SoupStrainer(id=list(targets)) if targets else None
+        self.soup = BeautifulSoup(html, features, parse_only=parse_only)
+        self.elements = index_elements(self.soup)
+
+    def text(self, element_id):
+        """Return the text of the element with id `element_id`."""
+        return self.elements[element_id].text
+
+    def area_titles(self, map_id):
+        """Return the title of every area in the image map `map_id`."""
+        return [x["title"] for x in self.elements[map_id].findAll("area")]
+
+    def table_rows(self, table_id):
+        """Return the td texts of every row in the table `table_id`."""
+        return [[self.cell_text(td) for td in tr.find_all('td')
+                 if td.find_parent("tr") is tr]
+                for tr in self.elements[table_id].findAll("tr")]
+
+    @staticmethod
+    def cell_text(td):
+        """
+        Return the text of the cell `td`. html.parser does not close a <td>
+        or <tr> whose end tag is left out, so the cells and rows after it
+        end up inside it; their text is left out.
+        """
+        return "".join(string for string in td.strings
+                       if string.find_parent(["td", "tr"]) is td)
+
+    def close(self):
+        """
+        Free the tree now. Its elements refer to each other, so without
+        this it would wait for the cyclic garbage collector.
+        """
+        self.elements = {}
+        self.soup.decompose()
+
+
+class LxmlDocument:
+    """
+    Fund page parsed with lxml.html. If `targets` is given only copies of
+    the elements with those ids, and their descendants, are kept, so the
+    rest of the tree is freed as soon as the page is parsed.
+    """
+    def __init__(self, html, targets=None):
+        # Imported here so lxml is only needed when this backend is used.
+        import lxml.html  # pylint: disable=import-outside-toplevel
+
+        html = read_all(html)
+        if not html:
+            html = b"<html></html>"
+        root = lxml.html.document_fromstring(html)
+        self.elements = {}
+        # The id lookup runs in libxml2 rather than walking every element
+        # here.
+        for element in root.xpath("//*[@id]"):
+            element_id = element.get("id")
+            if targets and element_id not in targets:
+                continue
+            self.elements.setdefault(element_id, element)
+        if targets:
+            self.elements = {element_id: copy.deepcopy(element)
+                             for element_id, element in self.elements.items()}
+
+    def text(self, element_id):
+        """Return the text of the element with id `element_id`."""
+        return self.elements[element_id].text_content()
+
+    def area_titles(self, map_id):
+        """Return the title of every area in the image map `map_id`."""
+        return [x.attrib["title"] for x in self.elements[map_id].iter("area")]
+
+    def table_rows(self, table_id):
+        """Return the td texts of every row in the table `table_id`."""
+        return [[self.cell_text(td) for td in tr.xpath("./td")]
+                for tr in self.elements[table_id].iter("tr")]
+
+    @staticmethod
+    def cell_text(td):
+        """
+        Return the text of the cell `td`, leaving out the text of the cells
+        of any table nested in it, as SoupDocument.cell_text does.
+        """
+        depth = td.xpath("count(ancestor-or-self::td|ancestor-or-self::tr)")
+        return "".join(td.xpath(
+            ".//text()[count(ancestor::td|ancestor::tr) = $depth]",
+            depth=depth))
+
+    def close(self):
+        """Drop the references keeping the tree alive."""
+        self.elements = {}
+
+
+class _TargetCapture:
+    """State for one target element while the streaming parser is in it."""
+    def __init__(self, tag, element_id):
+        self.tag = tag
+        self.element_id = element_id
+        self.depth = 1
+        self.text = []
+        self.titles = []
+        self.rows = []
+        # [current row, open cells] of each table open in the element,
+        # innermost last, so a nested table's cells stay out of the cell
+        # holding it.
+        self.tables = [[None, []]]
+
+
+class _StreamingParser(HTMLParser):
+    """
+    HTMLParser that records the text, area titles and table cells of the
+    elements whose ids are in `targets` without building a tree.
+    """
+    def __init__(self, targets):
+        super().__init__(convert_charrefs=True)
+        self.remaining = set(targets)
+        self.open = []
+        self.texts = {}
+        self.titles = {}
+        self.rows = {}
+
+    def handle_starttag(self, tag, attrs):
+        for capture in self.open:
+            if tag == capture.tag:
+                capture.depth += 1
+            table = capture.tables[-1]
+            if tag == "area":
+                capture.titles.append(dict(attrs).get("title"))
+            elif tag == "table":
+                capture.tables.append([None, []])
+            elif tag == "tr":
+                # A new row implicitly closes the cells of the last one.
+                del table[1][:]
+                table[0] = []
+                capture.rows.append(table[0])
+            elif tag == "td" and table[0] is not None:
+                # As does a new cell when </td> was left out.
+                del table[1][:]
+                cell = []
+                table[0].append(cell)
+                table[1].append(cell)
+
+        element_id = dict(attrs).get("id")
+        if element_id in self.remaining:
+            self.remaining.discard(element_id)
+            self.open.append(_TargetCapture(tag, element_id))
+
+    def handle_startendtag(self, tag, attrs):
+        for capture in self.open:
+            if tag == "area":
+                capture.titles.append(dict(attrs).get("title"))
+
+    def handle_endtag(self, tag):
+        for capture in list(self.open):
+            cells = capture.tables[-1][1]
+            if tag == "td" and cells:
+                cells.pop()
+            elif tag == "tr":
+                del cells[:]
+            elif tag == "table" and len(capture.tables) > 1:
+                capture.tables.pop()
+            if tag != capture.tag:
+                continue
+            capture.depth -= 1
+            if capture.depth == 0:
+                self.record(capture)
+
+    def handle_data(self, data):
+        for capture in self.open:
+            capture.text.append(data)
+            for cell in capture.tables[-1][1]:
+                cell.append(data)
+
+    def record(self, capture):
+        """Store the values of a target element that has been closed."""
+        self.open.remove(capture)
+        self.texts[capture.element_id] = "".join(capture.text)
+        self.titles[capture.element_id] = capture.titles
+        self.rows[capture.element_id] = [
+            ["".join(cell) for cell in row] for row in capture.rows
+        ]
+
+    def close(self):
+        """
+        Read the rest of the buffered page and record the target elements
+        still open at its end, which the tree builders close there too.
+        """
+        super().close()
+        for capture in list(self.open):
+            self.record(capture)
+
+    @property
+    def done(self):
+        """True once every target element has been closed."""
+        return not self.remaining and not self.open
+
+
+class StreamingDocument:
+    """
+    Fund page read incrementally, keeping only the elements whose ids are in
+    `targets`. Reading stops as soon as all of them have been captured, so
+    when `html` is a response object the rest of the body is never read.
+    """
+    def __init__(self, html, targets):
+        parser = _StreamingParser(targets)
+        decoder = None
+        for chunk in self.chunks(html):
+            if isinstance(chunk, bytes):
+                if decoder is None:
+                    decoder = codecs.getincrementaldecoder(
+                        self.sniff_encoding(chunk))(errors="replace")
+                chunk = decoder.decode(chunk)
+            parser.feed(chunk)
+            if parser.done:
+                break
+        else:
+            parser.close()
+
+        self.texts = parser.texts
+        self.titles = parser.titles
+        self.rows = parser.rows
+
+    @staticmethod
+    def chunks(html):
+        """Yield `html` in pieces of at most CHUNK_SIZE."""
+        if hasattr(html, "read"):
+            while True:
+                chunk = html.read(CHUNK_SIZE)
+                if not chunk:
+                    return
+                yield chunk
+        else:
+            for start in range(0, len(html), CHUNK_SIZE):
+                yield html[start:start + CHUNK_SIZE]
+
+    @staticmethod
+    def sniff_encoding(chunk):
+        """Guess the encoding of a page from a meta charset declaration."""
+        match = _CHARSET_RE.search(chunk[:4096])
+        if match:
+            try:
+                return codecs.lookup(match.group(1).decode("ascii")).name
+            except LookupError:
+                pass
+        return "utf-8"
+
+    def text(self, element_id):
+        """Return the text of the element with id `element_id`."""
+        return self.texts[element_id]
+
+    def area_titles(self, map_id):
+        """Return the title of every area in the image map `map_id`."""
+        return self.titles[map_id]
+
+    def table_rows(self, table_id):
+        """Return the td texts of every row in the table `table_id`."""
+        return self.rows[table_id]
+
+    def close(self):
+        """Drop the captured elements."""
+        self.texts = {}
+        self.titles = {}
+        self.rows = {}
+
+
+BACKENDS = ("html.parser", "lxml", "streaming")
+
+
+def parse_document(html, backend="html.parser", targets=()):
+    """
+    Parse `html` (str, bytes or a file-like object) with the named backend.
+    `targets` lists the element ids the document has to hold; the streaming
+    backend stops reading once it has them, html.parser skips building the
+    rest of the tree and lxml frees it. An empty `targets` keeps every
+    element.
+    """
+    if backend == "html.parser":
+        return SoupDocument(html, 'html.parser', targets)
+    if backend == "lxml":
+        return LxmlDocument(html, targets)
+    if backend == "streaming":
+        return StreamingDocument(html, targets)
+    raise ValueError("Unknown parser backend: {}".format(backend))
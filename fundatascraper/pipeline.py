@@ -0,0 +1,176 @@
+"""
+Module containing the crawl pipeline that decouples downloading fund pages
+from parsing them.
+
+A fetch thread drives a ConcurrentFetcher and puts the raw page bodies into
+a bounded queue. The calling thread takes pages off the queue and hands
+them to a pool of parser processes, so parsing is not limited to the one
+core holding the GIL. Only the extracted records come back from the
+workers. When the parsers fall behind, the queue fills up and the fetch
+thread blocks, which stops new downloads from being started.
+
+The parser processes are started by a fork server (or spawned where there
+is none) rather than forked from this process, whose fetch threads may be
+holding locks, such as the session's connection pool lock, at the moment a
+worker is forked.
+"""
+import multiprocessing
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from fundatascraper.fund_page import FundProfileScraper
+from fundatascraper.metrics import Metrics
+
+_END = object()
+
+
+def pool_context():
+    """Return the multiprocessing context used to start parser processes."""
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("forkserver")
+    return multiprocessing.get_context("spawn")
+
+
+def parse_page(url, href, html, parser="html.parser", fields=None,
+               tables=None):
+    """
+    Parse one fund page into the records of FundProfileScraper.
+    scrape_records(), projected to `fields` and `tables` if given. Runs in a
+    worker process.
+    returns: (records, timings) where timings maps "parse", "parse_document"
+    and "parse_<x>" for each scrape_<x> method to seconds.
+    """
+    start = time.perf_counter()
+    # The page is freed as soon as its records are extracted, rather than
+    # whenever the garbage collector next runs.
+    with FundProfileScraper(url, html=html, parser=parser, fields=fields,
+                            tables=tables) as scraper:
+        records = scraper.scrape_records(href)
+    timings = {"parse_" + name.replace("scrape_", "", 1): seconds
+               for name, seconds in scraper.timings.items()}
+    timings["parse"] = time.perf_counter() - start
+    return records, timings
+
+
+class CrawlPipeline:
+    """
+    Fetches the fund pages of `hrefs` with `fetcher` and parses them with
+    `parse_workers` processes. With `parse_workers` set to 0 pages are parsed
+    in the calling thread. At most `queue_size` downloaded pages wait to be
+    parsed at any time. Parse timings are recorded in `metrics`. Only the
+    single valued `fields` and output `tables` given are extracted.
+    """
+    def __init__(self, fetcher, base_url, parse_workers=0,
+                 parser="html.parser", queue_size=None, metrics=None,
+                 fields=None, tables=None):
+        # pylint: disable=too-many-arguments
+        self.fetcher = fetcher
+        self.fields = tuple(fields) if fields is not None else None
+        self.tables = tuple(tables) if tables is not None else None
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.base_url = base_url
+        self.parse_workers = parse_workers
+        self.parser = parser
+        self.queue_size = queue_size or max(parse_workers, 1) * 4
+
+    def fetch_stage(self, urls, pages, stop):
+        """Put each downloaded (url, body) on `pages` until `stop` is set."""
+        def put(item):
+            while not stop.is_set():
+                try:
+                    pages.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    continue
+
+        try:
+            for item in self.fetcher.fetch_all(urls, return_exceptions=True):
+                put(item)
+                if stop.is_set():
+                    return
+        except Exception as error:  # pylint: disable=broad-except
+            put((None, error))
+        finally:
+            put(_END)
+
+    def fetched_pages(self, hrefs):
+        """Yield (url, body) from a fetch thread through a bounded queue."""
+        pages = queue.Queue(maxsize=self.queue_size)
+        stop = threading.Event()
+        urls = (self.base_url + href for href in hrefs)
+        thread = threading.Thread(target=self.fetch_stage,
+                                  args=(urls, pages, stop), daemon=True)
+        thread.start()
+        try:
+            while True:
+                item = pages.get()
+                if item is _END:
+                    return
+                yield item
+        finally:
+            stop.set()
+
+    def run(self, hrefs):
+        """
+        Yield (href, records) for each fund in `hrefs` in the order parsing
+        finishes, where records is the dict returned by scrape_records(), or
+        the exception raised while fetching or parsing the page. `hrefs` may
+        be a lazy iterable, such as the fund list while it is being paged.
+        """
+        if self.parse_workers == 0:
+            for url, html in self.fetched_pages(hrefs):
+                href = self.href_for(url)
+                if isinstance(html, Exception):
+                    yield href, html
+                    continue
+                try:
+                    records, timings = parse_page(url, href, html,
+                                                  self.parser, self.fields,
+                                                  self.tables)
+                except Exception as error:  # pylint: disable=broad-except
+                    yield href, error
+                    continue
+                self.metrics.observe_all(timings)
+                yield href, records
+            return
+
+        in_flight = {}
+        limit = self.parse_workers * 2
+        # Created before the fetch thread starts. Its processes are started
+        # lazily, while fetch threads run, which pool_context() makes safe.
+        with ProcessPoolExecutor(self.parse_workers,
+                                 mp_context=pool_context()) as pool:
+            for url, html in self.fetched_pages(hrefs):
+                href = self.href_for(url)
+                if isinstance(html, Exception):
+                    yield href, html
+                    continue
+                in_flight[pool.submit(parse_page, url, href, html,
+                                      self.parser, self.fields,
+                                      self.tables)] = href
+
+                finished = [future for future in in_flight if future.done()]
+                if len(in_flight) >= limit and not finished:
+                    finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                yield from self.collect(finished, in_flight)
+
+            yield from self.collect(list(in_flight), in_flight)
+
+    def href_for(self, url):
+        """Return the href of a fund page url."""
+        if url is None:
+            return None
+        return url[len(self.base_url):]
+
+    def collect(self, futures, in_flight):
+        """Yield (href, records or exception) for each finished future."""
+        for future in futures:
+            href = in_flight.pop(future)
+            try:
+                records, timings = future.result()
+            except Exception as error:  # pylint: disable=broad-except
+                yield href, error
+                continue
+            self.metrics.observe_all(timings)
+            yield href, records
@@ -0,0 +1,177 @@
+"""
+Module containing the schema of the single valued fields on a fund page.
+
+Every field is declared once, as a Field of
+
+    name        output column name
+    element_id  id of the element holding the field's text
+    kind        how the text is typed when normalized; see KINDS
+    group       the FundProfileScraper.scrape_<group> method returning it
+
+The scraper, the output writers and fundatascraper.normalize are all driven
+by FIELDS, so adding a field to the output is a matter of adding one line
+here. compile_plan() turns FIELDS, or a subset of it, into the
+ExtractionPlan the scraper runs against each page.
+"""
+import collections
+import functools
+
+Field = collections.namedtuple("Field",
+                               ["name", "element_id", "kind", "group"])
+
+# Type alias of the normalized column of each kind. Text is kept as is;
+# every other kind has a converter in fundatascraper.normalize.CONVERTERS.
+KINDS = {
+    "text": "string",
+    "percent": "float32",    # "2.35%" -> 2.35
+    "number": "float32",     # "$27.7827" -> 27.7827
+    "assets": "float32",     # "$1,234.5M" -> 1234.5 ($ millions)
+    "quartile": "int8",      # "2" -> 2
+    "category": "category",  # "Optional"
+}
+
+GROUPS = ("nums_top", "info_table", "info_panel", "return_table",
+          "calendar_return")
+
+FIELDS = (
+    # Underneath the title heading at the top of the page.
+    Field("inception_return", "ctl00_MainContent_txtInceptionReturn",
+          "percent", "nums_top"),
+    Field("ytd_return", "ctl00_MainContent_txtYTDReturn", "percent",
+          "nums_top"),
+    Field("navps", "ctl00_MainContent_txtNavps", "number", "nums_top"),
+    Field("change", "ctl00_MainContent_txtNavpsChange", "number",
+          "nums_top"),
+    # Table to the right of the growth chart.
+    Field("mer", "ctl00_MainContent_txtMER", "percent", "info_table"),
+    Field("assets", "ctl00_MainContent_txtAssets", "assets", "info_table"),
+    Field("rank", "ctl00_MainContent_txtRank", "quartile", "info_table"),
+    Field("std_dev", "ctl00_MainContent_txtStdDev", "number", "info_table"),
+    Field("volatility_rank", "ctl00_MainContent_txtVolatilityRank",
+          "category", "info_table"),
+    Field("load", "ctl00_MainContent_txtLoad", "category", "info_table"),
+    Field("max_front_end", "ctl00_MainContent_txtFeesFront", "percent",
+          "info_table"),
+    Field("max_back_end", "ctl00_MainContent_txtFeesBack", "percent",
+          "info_table"),
+    Field("sales_status", "ctl00_MainContent_txtSalesStatus", "category",
+          "info_table"),
+    # Panel below the growth chart.
+    Field("objective_description", "ctl00_MainContent_txtObjective", "text",
+          "info_panel"),
+    Field("management_co", "ctl00_MainContent_txtManagementCo", "text",
+          "info_panel"),
+    Field("fund_managers", "ctl00_MainContent_txtManagers", "text",
+          "info_panel"),
+) + tuple(
+    # Returns table in the performance section at the bottom of the page.
+    Field(name, element_id, kind, "return_table")
+    for name, element_id, kind in (
+        ("fund_1month_return", "ctl00_MainContent_txtFS1mthRtn", "percent"),
+        ("fund_3month_return", "ctl00_MainContent_txtFS3mthRtn", "percent"),
+        ("fund_6month_return", "ctl00_MainContent_txtFS6mthRtn", "percent"),
+        ("fund_ytd_return", "ctl00_MainContent_txtFSytdRtn", "percent"),
+        ("fund_1year_return", "ctl00_MainContent_txtFC1yrRtn", "percent"),
+        ("fund_3year_return", "ctl00_MainContent_txtFC3yrRtn", "percent"),
+        ("fund_5year_return", "ctl00_MainContent_txtFC5yrRtn", "percent"),
+        ("fund_10year_return", "ctl00_MainContent_txtFC10yrRtn", "percent"),
+        ("benchmark_1month_return", "ctl00_MainContent_txtIS1mthRtn",
+         "percent"),
+        ("benchmark_3month_return", "ctl00_MainContent_txtIS3mthRtn",
+         "percent"),
+        ("benchmark_6month_return", "ctl00_MainContent_txtIS6mthRtn",
+         "percent"),
+        ("benchmark_ytd_return", "ctl00_MainContent_txtISytdRtn", "percent"),
+        ("benchmark_1year_return", "ctl00_MainContent_txtIC1yrRtn",
+         "percent"),
+        ("benchmark_3year_return", "ctl00_MainContent_txtIC3yrRtn",
+         "percent"),
+        ("benchmark_5year_return", "ctl00_MainContent_txtIC5yrRtn",
+         "percent"),
+        ("benchmark_10year_return", "ctl00_MainContent_txtIC10yrRtn",
+         "percent"),
+        ("quartile_rank__1month_return", "ctl00_MainContent_txtS1mthqrank",
+         "quartile"),
+        ("quartile_rank__3month_return", "ctl00_MainContent_txtS3mthqrank",
+         "quartile"),
+        ("quartile_rank__6month_return", "ctl00_MainContent_txtS6mthqrank",
+         "quartile"),
+        ("quartile_rank__ytd_return", "ctl00_MainContent_txtSytdrank",
+         "quartile"),
+        ("quartile_rank__1year_return", "ctl00_MainContent_txtC1yrqrank",
+         "quartile"),
+        ("quartile_rank__3year_return", "ctl00_MainContent_txtC3yrqrank",
+         "quartile"),
+        ("quartile_rank__5year_return", "ctl00_MainContent_txtC5yrqrank",
+         "quartile"),
+        ("quartile_rank__10year_return", "ctl00_MainContent_txtC10yrqrank",
+         "quartile"),
+    )
+) + tuple(
+    # Calendar year returns, years 1 to 10.
+    Field(name % year, element_id % year, kind, "calendar_return")
+    for name, element_id, kind in (
+        ("fund_calendar_return_year_%d",
+         "ctl00_MainContent_txtCalRtnyr%d", "percent"),
+        ("benchmark_calendar_return_year_%d",
+         "ctl00_MainContent_txtBCalRtnyr%d", "percent"),
+        ("quartile_rank_calendar_return_year_%d",
+         "ctl00_MainContent_txtQCalrtnyr%d", "quartile"),
+    )
+    for year in range(1, 11)
+)
+
+FIELDS_BY_NAME = {field.name: field for field in FIELDS}
+
+
+def column_types(fields=FIELDS):
+    """Return the normalized type alias of every field, keyed by name."""
+    return {field.name: KINDS[field.kind] for field in fields}
+
+
+class ExtractionPlan:
+    """
+    A list of fields compiled for extraction: the (name, element id) pairs
+    of each group in page order and the set of element ids to look for.
+    """
+    def __init__(self, fields):
+        self.fields = tuple(fields)
+        self.names = tuple(field.name for field in self.fields)
+        self.groups = {group: tuple((field.name, field.element_id)
+                                    for field in self.fields
+                                    if field.group == group)
+                       for group in GROUPS}
+        self.element_ids = frozenset(field.element_id
+                                     for field in self.fields)
+
+    def extract(self, text, group, missing):
+        """
+        Look up every field of `group` with `text`, which maps an element
+        id to its text and raises KeyError for missing elements. Missing
+        fields are passed to `missing(name, element_id)` and set to None.
+        returns: dict of field name to text.
+        """
+        values = {}
+        for name, element_id in self.groups[group]:
+            try:
+                values[name] = text(element_id)
+            except KeyError:
+                missing(name, element_id)
+                values[name] = None
+        return values
+
+
+@functools.lru_cache(maxsize=None)
+def compile_plan(names=None):
+    """
+    Return the ExtractionPlan of the fields called `names`, a tuple, or of
+    every field. Plans are cached, so each one is only compiled once.
+    raises: ValueError for names not in FIELDS.
+    """
+    if names is None:
+        return ExtractionPlan(FIELDS)
+    unknown = [name for name in names if name not in FIELDS_BY_NAME]
+    if unknown:
+        raise ValueError("Unknown fields: {}".format(", ".join(unknown)))
+    wanted = frozenset(names)
+    return ExtractionPlan(field for field in FIELDS if field.name in wanted)
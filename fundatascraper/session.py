@@ -0,0 +1,256 @@
+"""
+Module containing the HTTP session shared by the fund list and fund page
+scrapers.
+
+HttpSession keeps persistent connections to each host in a pool, asks for
+gzip/deflate (and brotli, if the brotli package is installed) compressed
+responses and decodes them, keeps cookies such as the ASP.NET session id,
+follows redirects and applies separate connect and read timeouts. The
+actual sending of requests is done by a transport, which can be replaced,
+for example to serve recorded responses in tests.
+"""
+import collections
+import gzip
+import http.client
+import queue
+import threading
+import zlib
+from email.message import Message
+from io import BytesIO
+from urllib.error import HTTPError, URLError
+from urllib.parse import urljoin, urlsplit
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+USER_AGENT = "fundatascraper"
+
+REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+
+MAX_REDIRECTS = 5
+
+Response = collections.namedtuple(
+    "Response", ["url", "status", "reason", "headers", "body"]
+)
+
+
+def accept_encoding():
+    """Return the Accept-Encoding header for the decoders available."""
+    if brotli is not None:
+        return "gzip, deflate, br"
+    return "gzip, deflate"
+
+
+def decode_body(body, encoding):
+    """Undo the Content-Encoding `encoding` of a response body."""
+    encoding = (encoding or "identity").strip().lower()
+    if encoding in ("identity", ""):
+        return body
+    if encoding in ("gzip", "x-gzip"):
+        return gzip.decompress(body)
+    if encoding == "deflate":
+        try:
+            return zlib.decompress(body)
+        except zlib.error:
+            return zlib.decompress(body, -zlib.MAX_WBITS)
+    if encoding == "br" and brotli is not None:
+        return brotli.decompress(body)
+    raise ValueError("Unsupported Content-Encoding: {}".format(encoding))
+
+
+class PooledTransport:
+    """
+    Sends requests over persistent HTTP/1.1 connections, keeping up to
+    `max_per_host` idle connections per host for reuse.
+    """
+    def __init__(self, connect_timeout=10, read_timeout=30, max_per_host=8):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_per_host = max_per_host
+        self.pools = {}
+        self.lock = threading.Lock()
+        self.connections_opened = 0
+
+    def pool_for(self, key):
+        """Return the queue of idle connections for (scheme, host, port)."""
+        with self.lock:
+            if key not in self.pools:
+                self.pools[key] = queue.LifoQueue(self.max_per_host)
+            return self.pools[key]
+
+    def connect(self, scheme, host, port):
+        """Open a new connection, applying the connect timeout."""
+        if scheme == "https":
+            connection = http.client.HTTPSConnection(
+                host, port, timeout=self.connect_timeout)
+        else:
+            connection = http.client.HTTPConnection(
+                host, port, timeout=self.connect_timeout)
+        try:
+            connection.connect()
+        except OSError as error:
+            raise URLError(error) from error
+        connection.sock.settimeout(self.read_timeout)
+        with self.lock:
+            self.connections_opened += 1
+        return connection
+
+    def send(self, method, url, body, headers):
+        """
+        Send one request and read the whole response.
+        returns: (status, reason, headers, raw body)
+        """
+        parts = urlsplit(url)
+        scheme = parts.scheme or "http"
+        port = parts.port or (443 if scheme == "https" else 80)
+        key = (scheme, parts.hostname, port)
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+
+        pool = self.pool_for(key)
+        try:
+            connection, reused = pool.get_nowait(), True
+        except queue.Empty:
+            connection, reused = self.connect(*key), False
+
+        while True:
+            try:
+                connection.request(method, path, body, headers)
+                response = connection.getresponse()
+                data = response.read()
+                break
+            except (http.client.RemoteDisconnected, BrokenPipeError,
+                    ConnectionResetError):
+                connection.close()
+                # A pooled connection may have been closed by the server
+                # while idle; retry once on a fresh one.
+                if not reused:
+                    raise
+                connection, reused = self.connect(*key), False
+            except Exception:
+                connection.close()
+                raise
+
+        if response.will_close:
+            connection.close()
+        else:
+            try:
+                pool.put_nowait(connection)
+            except queue.Full:
+                connection.close()
+        return response.status, response.reason, response.msg, data
+
+    def close(self):
+        """Close every idle connection."""
+        with self.lock:
+            pools = list(self.pools.values())
+        for pool in pools:
+            while True:
+                try:
+                    pool.get_nowait().close()
+                except queue.Empty:
+                    break
+
+
+class HttpSession:
+    """
+    Client for fundata.com pages. Responses with status 400 or above raise
+    urllib.error.HTTPError, like urllib.request.urlopen.
+    """
+    def __init__(self, transport=None, connect_timeout=10, read_timeout=30,
+                 max_per_host=8, headers=None):
+        if transport is None:
+            transport = PooledTransport(connect_timeout, read_timeout,
+                                        max_per_host)
+        self.transport = transport
+        self.headers = {"User-Agent": USER_AGENT,
+                        "Accept-Encoding": accept_encoding(),
+                        "Connection": "keep-alive"}
+        self.headers.update(headers or {})
+        self.cookies = {}
+        self.cookies_lock = threading.Lock()
+        self.bytes_received = 0
+
+    def request(self, method, url, body=None, headers=None):
+        """
+        Send a request, following redirects.
+        returns: Response with the decoded body.
+        """
+        for _ in range(MAX_REDIRECTS + 1):
+            request_headers = dict(self.headers)
+            request_headers.update(headers or {})
+            cookie = self.cookie_header(url)
+            if cookie:
+                request_headers["Cookie"] = cookie
+            if body is not None:
+                request_headers.setdefault(
+                    "Content-Type", "application/x-www-form-urlencoded")
+
+            status, reason, response_headers, data = self.transport.send(
+                method, url, body, request_headers)
+            self.bytes_received += len(data)
+            self.store_cookies(url, response_headers)
+
+            if status in REDIRECT_STATUSES and "Location" in response_headers:
+                url = urljoin(url, response_headers["Location"])
+                if status in (301, 302, 303):
+                    method, body = "GET", None
+                continue
+
+            data = decode_body(data, response_headers.get("Content-Encoding"))
+            if status >= 400:
+                raise HTTPError(url, status, reason, response_headers,
+                                BytesIO(data))
+            return Response(url, status, reason, response_headers, data)
+        raise HTTPError(url, status, "Too many redirects", response_headers,
+                        None)
+
+    def get(self, url, headers=None):
+        """Send a GET request."""
+        return self.request("GET", url, headers=headers)
+
+    def post(self, url, body, headers=None):
+        """Send a POST request with an encoded form `body`."""
+        return self.request("POST", url, body=body, headers=headers)
+
+    def cookie_header(self, url):
+        """Return the Cookie header for a request to `url`."""
+        host = urlsplit(url).hostname
+        with self.cookies_lock:
+            cookies = self.cookies.get(host, {})
+            return "; ".join("{}={}".format(name, value)
+                             for name, value in cookies.items())
+
+    def store_cookies(self, url, headers):
+        """Remember the cookies set by a response from `url`."""
+        if isinstance(headers, Message):
+            set_cookies = headers.get_all("Set-Cookie") or []
+        else:
+            set_cookies = [headers["Set-Cookie"]] \
+                if "Set-Cookie" in headers else []
+        host = urlsplit(url).hostname
+        for set_cookie in set_cookies:
+            name, _, value = set_cookie.split(";", 1)[0].partition("=")
+            with self.cookies_lock:
+                self.cookies.setdefault(host, {})[name.strip()] = \
+                    value.strip()
+
+    def close(self):
+        """Close the transport's connections."""
+        self.transport.close()
+
+
+_DEFAULT_SESSION = None
+_DEFAULT_SESSION_LOCK = threading.Lock()
+
+
+def default_session():
+    """Return the session shared by callers that do not pass their own."""
+    global _DEFAULT_SESSION  # pylint: disable=global-statement
+    with _DEFAULT_SESSION_LOCK:
+        if _DEFAULT_SESSION is None:
+            _DEFAULT_SESSION = HttpSession()
+        return _DEFAULT_SESSION
@@ -0,0 +1,283 @@
+"""
+Module containing the shard queue of a crawl split across worker processes.
+
+A coordinator partitions the fund list into shards of hrefs and stores them
+in an SQLite database that every worker opens:
+
+    <queue_dir>/queue.sqlite          shards and their leases
+    <queue_dir>/shards/<id>.<n>.jsonl journal of attempt n at a shard
+
+Workers, on the same machine or on others sharing the directory, lease one
+shard at a time. A lease lasts `lease_seconds` and is renewed by a
+heartbeat thread while the worker crawls the shard into its own
+CrawlJournal. If a worker dies its lease runs out and the shard is handed
+to the next worker that asks. Once every shard is done, merge() replays
+the journal of each shard's completed attempt into the output sinks.
+"""
+import collections
+import os
+import socket
+import sqlite3
+import threading
+import time
+from fundatascraper.journal import CrawlJournal
+
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+
+DEFAULT_SHARD_SIZE = 500
+
+DEFAULT_LEASE_SECONDS = 300
+
+Shard = collections.namedtuple("Shard", ["shard_id", "attempt", "hrefs"])
+
+
+def default_worker_id():
+    """Return an id unique to this process, such as "host-1234"."""
+    return "{}-{}".format(socket.gethostname(), os.getpid())
+
+
+class ShardQueue:
+    """
+    SQLite-backed queue of shards. Each process should open its own
+    ShardQueue; leasing is atomic across processes.
+    """
+    def __init__(self, directory, lease_seconds=DEFAULT_LEASE_SECONDS):
+        self.directory = directory
+        self.lease_seconds = lease_seconds
+        os.makedirs(os.path.join(directory, "shards"), exist_ok=True)
+        self.db = sqlite3.connect(os.path.join(directory, "queue.sqlite"),
+                                  timeout=60, isolation_level=None,
+                                  check_same_thread=False)
+        self.lock = threading.Lock()
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS shards ("
+            " shard_id INTEGER PRIMARY KEY,"
+            " hrefs TEXT NOT NULL,"
+            " status TEXT NOT NULL,"
+            " worker TEXT,"
+            " lease_expires REAL,"
+            " attempt INTEGER NOT NULL DEFAULT 0,"
+            " done_attempt INTEGER)"
+        )
+
+    def transaction(self, function):
+        """
+        Call function(db) inside a write transaction, which holds the
+        database lock against other processes until it commits.
+        """
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                result = function(self.db)
+                self.db.execute("COMMIT")
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+        return result
+
+    def create(self, href_list, shard_size=DEFAULT_SHARD_SIZE):
+        """
+        Split `href_list` into shards of `shard_size` hrefs, unless the
+        queue already holds shards, so a restarted coordinator picks up the
+        existing ones.
+        returns: number of shards in the queue.
+        """
+        def create_shards(db):
+            count = db.execute("SELECT COUNT(*) FROM shards").fetchone()[0]
+            if count:
+                return count
+            for start in range(0, len(href_list), shard_size):
+                db.execute("INSERT INTO shards (hrefs, status) VALUES (?, ?)",
+                           ("\n".join(href_list[start:start + shard_size]),
+                            PENDING))
+                count += 1
+            return count
+        return self.transaction(create_shards)
+
+    def lease(self, worker, now=None):
+        """
+        Lease the first shard that is pending or whose lease has expired.
+        returns: Shard, or None if no shard is available right now.
+        """
+        now = time.time() if now is None else now
+
+        def lease_shard(db):
+            row = db.execute(
+                "SELECT shard_id, attempt, hrefs FROM shards"
+                " WHERE status = ? OR (status = ? AND lease_expires < ?)"
+                " ORDER BY shard_id LIMIT 1", (PENDING, LEASED, now)
+            ).fetchone()
+            if row is None:
+                return None
+            shard_id, attempt, hrefs = row
+            db.execute(
+                "UPDATE shards SET status = ?, worker = ?, lease_expires = ?,"
+                " attempt = ? WHERE shard_id = ?",
+                (LEASED, worker, now + self.lease_seconds, attempt + 1,
+                 shard_id))
+            return Shard(shard_id, attempt + 1,
+                         hrefs.split("\n") if hrefs else [])
+        return self.transaction(lease_shard)
+
+    def update_lease(self, shard, worker, assignments, parameters,
+                     unexpired_at=None):
+        """
+        Update the shard's row with `assignments` if `worker` still holds
+        the lease of this attempt and, if `unexpired_at` is given, the lease
+        has not run out by then.
+        returns: True if the row was updated.
+        """
+        condition = " WHERE shard_id = ? AND attempt = ? AND worker = ?" \
+            " AND status = ?"
+        condition_parameters = (shard.shard_id, shard.attempt, worker,
+                                LEASED)
+        if unexpired_at is not None:
+            condition += " AND lease_expires >= ?"
+            condition_parameters += (unexpired_at,)
+        return self.transaction(lambda db: db.execute(
+            "UPDATE shards SET " + assignments + condition,
+            tuple(parameters) + condition_parameters
+        ).rowcount > 0)
+
+    def renew(self, shard, worker, now=None):
+        """
+        Extend the lease on `shard`.
+        returns: False if the lease has passed to another worker.
+        """
+        now = time.time() if now is None else now
+        return self.update_lease(shard, worker, "lease_expires = ?",
+                                 (now + self.lease_seconds,))
+
+    def complete(self, shard, worker, now=None):
+        """
+        Mark `shard` done with this attempt's journal, if `worker` owns an
+        unexpired lease on this attempt.
+        returns: False if the lease has run out or passed to another worker,
+        in which case the shard is crawled again and that attempt is the one
+        that counts.
+        """
+        now = time.time() if now is None else now
+        return self.update_lease(
+            shard, worker,
+            "status = ?, done_attempt = attempt, lease_expires = NULL",
+            (DONE,), unexpired_at=now)
+
+    def release(self, shard, worker):
+        """Give up the lease on `shard` so another worker can take it."""
+        self.update_lease(shard, worker,
+                          "status = ?, lease_expires = NULL", (PENDING,))
+
+    def journal_path(self, shard_id, attempt):
+        """Return the path of the journal of one attempt at a shard."""
+        return os.path.join(self.directory, "shards",
+                            "{}.{}.jsonl".format(shard_id, attempt))
+
+    def counts(self):
+        """Return the number of shards in each status."""
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT status, COUNT(*) FROM shards GROUP BY status"
+            ).fetchall()
+        counts = {PENDING: 0, LEASED: 0, DONE: 0}
+        counts.update(rows)
+        return counts
+
+    def finished(self):
+        """True once every shard is done."""
+        counts = self.counts()
+        return counts[PENDING] == 0 and counts[LEASED] == 0
+
+    def completed_journals(self):
+        """Return the journal path of every done shard, in shard order."""
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT shard_id, done_attempt FROM shards"
+                " WHERE status = ? ORDER BY shard_id", (DONE,)
+            ).fetchall()
+        return [self.journal_path(shard_id, attempt)
+                for shard_id, attempt in rows]
+
+    def close(self):
+        """Close the database."""
+        with self.lock:
+            self.db.close()
+
+
+class LeaseKeeper:
+    """
+    Heartbeat thread renewing the lease on a shard every third of the lease
+    time. `lost` is set if the lease could not be renewed.
+    """
+    def __init__(self, queue, shard, worker):
+        self.queue = queue
+        self.shard = shard
+        self.worker = worker
+        self.stopped = threading.Event()
+        self.lost = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def run(self):
+        """Renew the lease until stopped or lost."""
+        while not self.stopped.wait(self.queue.lease_seconds / 3.0):
+            if not self.queue.renew(self.shard, self.worker):
+                self.lost.set()
+                return
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        self.thread.join()
+
+
+def work(queue, crawl_shard, worker=None, poll=1.0):
+    """
+    Lease and crawl shards until every shard in `queue` is done. For each
+    shard, crawl_shard(shard, journal) must crawl shard.hrefs into the
+    CrawlJournal `journal`. If it raises, the shard is released for another
+    worker and the exception propagates.
+    returns: number of shards this worker completed.
+    """
+    worker = worker or default_worker_id()
+    completed = 0
+    while True:
+        shard = queue.lease(worker)
+        if shard is None:
+            if queue.finished():
+                return completed
+            # Every remaining shard is leased; wait in case a lease expires.
+            time.sleep(poll)
+            continue
+        path = queue.journal_path(shard.shard_id, shard.attempt)
+        try:
+            with LeaseKeeper(queue, shard, worker) as keeper, \
+                    CrawlJournal(path) as journal:
+                crawl_shard(shard, journal)
+        except BaseException:
+            queue.release(shard, worker)
+            raise
+        # A lost lease means another worker may be crawling the shard, so
+        # this attempt must not be the one merged.
+        if not keeper.lost.is_set() and queue.complete(shard, worker):
+            completed += 1
+
+
+def merge(queue, sinks):
+    """
+    Write the records of every done shard to `sinks`, skipping tables that
+    have no sink.
+    returns: list of the failed entries of the shard journals.
+    """
+    failures = []
+    for path in queue.completed_journals():
+        with CrawlJournal(path) as journal:
+            for _, fund_records in journal.completed_records():
+                for table, records in fund_records.items():
+                    if table in sinks:
+                        sinks[table].write_many(records)
+            failures.extend(journal.failed_entries())
+    return failures
@@ -0,0 +1,490 @@
+"""
+Module containing the sinks that write scraped records to disk.
+
+Records are buffered column-wise and flushed in batches of `row_group_size`
+rows, so memory use stays flat however many funds are scraped. While a
+batch fills up, the Parquet and Arrow sinks encode every CHUNK_CELLS
+buffered values into Arrow columns, which holds wide tables such as
+single_values in a fraction of the memory of Python objects. With
+normalization on, each batch is converted to typed columns by
+fundatascraper.normalize as it is flushed. Parquet and Arrow IPC output
+need pyarrow; pickle output is kept for compatibility with the original
+single_values.pkl etc. files but holds every row in memory until the sink
+is closed.
+
+The sqlite and duckdb formats write every table into one database,
+funds.sqlite or funds.duckdb, for querying without loading whole tables.
+DuckDB output needs duckdb.
+"""
+import datetime
+import os
+import sqlite3
+import pandas as pd
+from fundatascraper import normalize
+from fundatascraper.schema import FIELDS
+
+DEFAULT_ROW_GROUP_SIZE = 10000
+
+# Cells (rows times columns) buffered as Python objects before the Parquet
+# and Arrow sinks encode them into Arrow columns, so a wide table does not
+# hold `row_group_size` rows of Python strings until its row group is full.
+CHUNK_CELLS = 100000
+
+# Column names and Arrow type aliases of each output table.
+TABLES = {
+    "single_values": [("href", "string")] +
+                     [(field.name, "string") for field in FIELDS],
+    "allocations": [("href", "string"), ("allocation_type", "category"),
+                    ("category", "string"), ("weight", "float32")],
+    "top10_holdings": [("href", "string"), ("rank", "int8"),
+                       ("security", "string"), ("weight", "float32")],
+    "errors": [("href", "string"), ("field", "string"),
+               ("element_id", "string")],
+}
+
+FORMATS = ("parquet", "arrow", "pickle", "sqlite", "duckdb")
+
+EXTENSIONS = {"parquet": ".parquet", "arrow": ".arrow", "pickle": ".pkl",
+              "sqlite": ".sqlite", "duckdb": ".duckdb"}
+
+# File name, without extension, of the database of the database formats.
+DATABASE_NAME = "funds"
+
+# Column types of the database formats for each type alias. float32 columns
+# are stored as doubles of their decimal value, so 2.35 reads back as 2.35.
+SQL_TYPES = {"string": "TEXT", "category": "TEXT", "float32": "DOUBLE",
+             "float64": "DOUBLE", "int8": "INTEGER", "int16": "INTEGER",
+             "int32": "INTEGER", "int64": "INTEGER"}
+
+# Columns indexed in the database formats besides href and scrape_date.
+DATABASE_INDEXES = {"single_values": ["management_co"]}
+
+# Typed versions of tables, as (schema conversion, batch transform).
+NORMALIZERS = {
+    "single_values": (normalize.normalized_schema,
+                      normalize.normalize_single_values),
+}
+
+PANDAS_TYPES = {"string": "object", "float32": "float32",
+                "float64": "float64", "int8": "Int8", "int16": "Int16",
+                "int32": "Int32", "int64": "Int64", "category": "category"}
+
+
+def arrow_type(alias, dictionaries=True):
+    """
+    Return the pyarrow type for a type alias of a schema. Category columns
+    are dictionary encoded unless `dictionaries` is false.
+    """
+    import pyarrow as pa  # pylint: disable=import-outside-toplevel
+    if alias == "category":
+        if dictionaries:
+            return pa.dictionary(pa.int32(), pa.string())
+        return pa.string()
+    return pa.type_for_alias(alias)
+
+
+def arrow_schema(schema, dictionaries=True):
+    """Build a pyarrow schema from a list of (name, type alias) pairs."""
+    import pyarrow as pa  # pylint: disable=import-outside-toplevel
+    return pa.schema([(name, arrow_type(alias, dictionaries))
+                      for name, alias in schema])
+
+
+def arrow_table(batch, schema):
+    """Convert a batch of columns or a DataFrame to a pyarrow Table."""
+    import pyarrow as pa  # pylint: disable=import-outside-toplevel
+    if isinstance(batch, pd.DataFrame):
+        return pa.Table.from_pandas(batch, schema=schema,
+                                    preserve_index=False)
+    return pa.Table.from_pydict(batch, schema=schema)
+
+
+def table_schemas(fields=None, tables=None):
+    """
+    Return TABLES restricted to the tables named in `tables`, with only the
+    single valued `fields` (plus href) in single_values. None keeps all.
+    """
+    schemas = {}
+    for table, schema in TABLES.items():
+        if tables is not None and table not in tables:
+            continue
+        if table == "single_values" and fields is not None:
+            schema = [(name, alias) for name, alias in schema
+                      if name == "href" or name in fields]
+        schemas[table] = schema
+    return schemas
+
+
+def pandas_types(schema):
+    """Return the pandas dtype of each column of `schema`."""
+    return {name: PANDAS_TYPES[alias] for name, alias in schema}
+
+
+class ColumnBuffer:
+    """Accumulates records as one list per column."""
+    def __init__(self, schema):
+        self.names = [name for name, _ in schema]
+        self.columns = {name: [] for name in self.names}
+        self.num_rows = 0
+
+    def append(self, record):
+        """Add a record (dict keyed by column name); missing keys are null."""
+        for name in self.names:
+            self.columns[name].append(record.get(name))
+        self.num_rows += 1
+
+    def take(self):
+        """Return the buffered columns and start a new, empty buffer."""
+        columns = self.columns
+        self.columns = {name: [] for name in self.names}
+        self.num_rows = 0
+        return columns
+
+
+class Sink:
+    """
+    Base class for sinks. Records are buffered as Python objects in chunks
+    of `chunk_size` rows (by default the whole batch). Each full chunk is
+    passed through `transform`, if given, as a DataFrame that must come back
+    with the column types of `schema`, and then through encode(). Once
+    `row_group_size` rows have been encoded the chunks are joined by
+    combine() and passed to flush_columns() as one batch.
+    """
+    chunk_size = None
+
+    def __init__(self, path, schema, row_group_size=DEFAULT_ROW_GROUP_SIZE,
+                 transform=None):
+        self.path = path
+        self.schema = schema
+        self.row_group_size = row_group_size
+        self.transform = transform
+        self.buffer = ColumnBuffer(schema)
+        self.chunks = []
+        self.chunked_rows = 0
+        self.chunk_end = self.next_chunk_end()
+        self.rows_written = 0
+
+    def next_chunk_end(self):
+        """
+        Return the number of buffered rows at which the next chunk is full.
+        The last chunk of a batch is cut short so that batches hold exactly
+        `row_group_size` rows.
+        """
+        return min(self.chunk_size or self.row_group_size,
+                   self.row_group_size - self.chunked_rows)
+
+    def write(self, record):
+        """Buffer a record, encoding the chunk once it is full."""
+        self.buffer.append(record)
+        if self.buffer.num_rows >= self.chunk_end:
+            self.encode_buffer()
+            if self.chunked_rows >= self.row_group_size:
+                self.flush()
+
+    def write_many(self, records):
+        """Buffer every record in `records`."""
+        for record in records:
+            self.write(record)
+
+    def encode_buffer(self):
+        """Move the buffered rows into an encoded chunk."""
+        num_rows = self.buffer.num_rows
+        if num_rows:
+            batch = self.buffer.take()
+            if self.transform is not None:
+                batch = self.transform(
+                    pd.DataFrame(batch, columns=self.buffer.names)
+                )
+            self.chunks.append(self.encode(batch))
+            self.chunked_rows += num_rows
+            self.chunk_end = self.next_chunk_end()
+
+    def encode(self, batch):
+        """
+        Return a transformed chunk in the form kept until the batch is
+        flushed; subclasses may store it more compactly.
+        """
+        return batch
+
+    def combine(self, chunks):
+        """Join the encoded chunks into one batch for flush_columns()."""
+        if len(chunks) == 1:
+            return chunks[0]
+        if isinstance(chunks[0], pd.DataFrame):
+            return pd.concat(chunks, ignore_index=True)
+        return {name: [value for chunk in chunks for value in chunk[name]]
+                for name in self.buffer.names}
+
+    def flush(self):
+        """Pass the buffered and encoded rows to flush_columns()."""
+        self.encode_buffer()
+        if self.chunks:
+            chunks, self.chunks = self.chunks, []
+            self.flush_columns(self.combine(chunks))
+            self.rows_written += self.chunked_rows
+            self.chunked_rows = 0
+            self.chunk_end = self.next_chunk_end()
+
+    def flush_columns(self, columns):
+        """
+        Write a batch, given as a dict of column lists, a DataFrame or the
+        result of combine(); implemented by subclasses.
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """Flush remaining rows and finish the output file."""
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ParquetSink(Sink):
+    """Writes each batch as a row group of a Parquet file."""
+    def __init__(self, path, schema, row_group_size=DEFAULT_ROW_GROUP_SIZE,
+                 transform=None):
+        self.chunk_size = max(CHUNK_CELLS // len(schema), 1)
+        super().__init__(path, schema, row_group_size, transform)
+        import pyarrow.parquet as pq  # pylint: disable=import-outside-toplevel
+        self.arrow_schema = arrow_schema(schema)
+        self.writer = pq.ParquetWriter(path, self.arrow_schema)
+
+    def encode(self, batch):
+        return arrow_table(batch, self.arrow_schema)
+
+    def combine(self, chunks):
+        import pyarrow as pa  # pylint: disable=import-outside-toplevel
+        return pa.concat_tables(chunks)
+
+    def flush_columns(self, columns):
+        if not hasattr(columns, "schema"):
+            columns = arrow_table(columns, self.arrow_schema)
+        self.writer.write_table(columns, row_group_size=self.row_group_size)
+
+    def close(self):
+        super().close()
+        self.writer.close()
+
+
+class ArrowSink(Sink):
+    """
+    Writes each batch as a record batch of an Arrow IPC file. The IPC file
+    format allows only one dictionary per column, so category columns are
+    stored as plain strings.
+    """
+    def __init__(self, path, schema, row_group_size=DEFAULT_ROW_GROUP_SIZE,
+                 transform=None):
+        self.chunk_size = max(CHUNK_CELLS // len(schema), 1)
+        super().__init__(path, schema, row_group_size, transform)
+        import pyarrow as pa  # pylint: disable=import-outside-toplevel
+        self.arrow_schema = arrow_schema(schema, dictionaries=False)
+        self.writer = pa.ipc.new_file(path, self.arrow_schema)
+
+    def encode(self, batch):
+        return arrow_table(batch, self.arrow_schema)
+
+    def combine(self, chunks):
+        import pyarrow as pa  # pylint: disable=import-outside-toplevel
+        # One record batch per flush, as when rows were buffered whole.
+        return pa.concat_tables(chunks).combine_chunks()
+
+    def flush_columns(self, columns):
+        if not hasattr(columns, "schema"):
+            columns = arrow_table(columns, self.arrow_schema)
+        self.writer.write_table(columns)
+
+    def close(self):
+        super().close()
+        self.writer.close()
+
+
+class PickleSink(Sink):
+    """
+    Legacy sink writing a pickled pandas DataFrame. Batches are kept in
+    memory until close().
+    """
+    def __init__(self, path, schema, row_group_size=DEFAULT_ROW_GROUP_SIZE,
+                 transform=None):
+        super().__init__(path, schema, row_group_size, transform)
+        self.frames = []
+
+    def flush_columns(self, columns):
+        self.frames.append(pd.DataFrame(columns, columns=self.buffer.names))
+
+    def close(self):
+        super().close()
+        if self.frames:
+            frame = pd.concat(self.frames, ignore_index=True)
+        else:
+            frame = pd.DataFrame(columns=self.buffer.names)
+        # Concatenating batches with different categories falls back to
+        # object columns, so the schema's types are applied at the end.
+        frame = frame.astype(pandas_types(self.schema))
+        frame.to_pickle(self.path)
+        self.frames = []
+
+
+def sql_values(values):
+    """Return a column's values with NaN and NA replaced by None."""
+    return [None if value is pd.NA or value is None or value != value
+            else value for value in values]
+
+
+class DatabaseSink(Sink):
+    """
+    Writes each batch into the table `table` of an SQLite database, inserting
+    the whole batch in one transaction. Every row gets a scrape_date column.
+    Rows of an earlier run with the same scrape date are replaced, and rows
+    of other dates are kept, so one database can collect daily runs. The
+    table's indexes are built when the sink is closed.
+    """
+    def __init__(self, path, schema, row_group_size=DEFAULT_ROW_GROUP_SIZE,
+                 transform=None, table=None, scrape_date=None):
+        # pylint: disable=too-many-arguments
+        super().__init__(path, schema, row_group_size, transform)
+        self.table = table or os.path.splitext(os.path.basename(path))[0]
+        self.scrape_date = scrape_date or datetime.date.today().isoformat()
+        self.db = self.connect(path)
+        self.create_table()
+        self.db.execute('DELETE FROM "{}" WHERE scrape_date = ?'.format(
+            self.table), (self.scrape_date,))
+        self.insert_sql = 'INSERT INTO "{}" ({}) VALUES ({})'.format(
+            self.table,
+            ", ".join('"{}"'.format(name)
+                      for name in self.buffer.names + ["scrape_date"]),
+            ", ".join("?" * (len(self.buffer.names) + 1)))
+
+    def connect(self, path):
+        """Open the database in autocommit mode."""
+        db = sqlite3.connect(path, isolation_level=None)
+        db.execute("PRAGMA journal_mode = WAL")
+        db.execute("PRAGMA synchronous = NORMAL")
+        return db
+
+    def create_table(self):
+        """
+        Create the table, or add the columns of the schema it is missing if
+        an earlier run wrote fewer fields.
+        """
+        columns = [(name, SQL_TYPES[alias]) for name, alias in self.schema]
+        columns.append(("scrape_date", "TEXT NOT NULL"))
+        self.db.execute('CREATE TABLE IF NOT EXISTS "{}" ({})'.format(
+            self.table, ", ".join('"{}" {}'.format(name, sql_type)
+                                  for name, sql_type in columns)))
+        existing = {row[1] for row in self.db.execute(
+            'PRAGMA table_info("{}")'.format(self.table)).fetchall()}
+        for name, sql_type in columns:
+            if name not in existing:
+                self.db.execute('ALTER TABLE "{}" ADD COLUMN "{}" {}'.format(
+                    self.table, name, sql_type))
+
+    def flush_columns(self, columns):
+        if isinstance(columns, pd.DataFrame):
+            values = []
+            for name in self.buffer.names:
+                column = columns[name]
+                if column.dtype == "float32":
+                    # Store 2.35 rather than its float32 value 2.3499999...
+                    column = column.astype(str).astype("float64")
+                values.append(sql_values(column.tolist()))
+        else:
+            values = [sql_values(columns[name]) for name in self.buffer.names]
+        values.append([self.scrape_date] * len(values[0]))
+        self.db.execute("BEGIN TRANSACTION")
+        try:
+            self.insert(values)
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+        self.db.execute("COMMIT")
+
+    def insert(self, values):
+        """Insert a batch given as one list of values per column."""
+        self.db.executemany(self.insert_sql, zip(*values))
+
+    def close(self):
+        super().close()
+        indexed = [name for name in ["href"] +
+                   DATABASE_INDEXES.get(self.table, [])
+                   if name in self.buffer.names]
+        for column in indexed + ["scrape_date"]:
+            self.db.execute(
+                'CREATE INDEX IF NOT EXISTS "{0}_{1}" ON "{0}" ("{1}")'
+                .format(self.table, column))
+        self.db.close()
+
+
+class DuckDBSink(DatabaseSink):
+    """
+    DatabaseSink writing a DuckDB database instead of SQLite. Each batch is
+    inserted from a DataFrame in one statement; DuckDB's executemany runs
+    one statement per row.
+    """
+    def connect(self, path):
+        import duckdb  # pylint: disable=import-outside-toplevel
+        return duckdb.connect(path)
+
+    def insert(self, values):
+        names = self.buffer.names + ["scrape_date"]
+        self.db.register("batch", pd.DataFrame(dict(zip(names, values)),
+                                               columns=names))
+        try:
+            self.db.execute('INSERT INTO "{}" ({}) SELECT * FROM batch'
+                            .format(self.table,
+                                    ", ".join('"{}"'.format(name)
+                                              for name in names)))
+        finally:
+            self.db.unregister("batch")
+
+
+SINKS = {"parquet": ParquetSink, "arrow": ArrowSink, "pickle": PickleSink,
+         "sqlite": DatabaseSink, "duckdb": DuckDBSink}
+
+
+def open_sinks(output_format="parquet", directory=".",
+               row_group_size=DEFAULT_ROW_GROUP_SIZE, tables=None,
+               normalized=False, scrape_date=None):
+    """
+    Open a sink for every table in `tables` (default: all of TABLES), writing
+    <directory>/<table><extension>, or tables of <directory>/funds.sqlite or
+    funds.duckdb stamped with `scrape_date` (default: today). With
+    `normalized` set, tables listed in NORMALIZERS are written with typed
+    columns; the database formats are always normalized so that numeric
+    columns can be compared in queries.
+    returns: dict mapping table name to sink.
+    """
+    # pylint: disable=too-many-arguments
+    if output_format not in SINKS:
+        raise ValueError("Unknown output format: {}".format(output_format))
+    tables = TABLES if tables is None else tables
+    sink_class = SINKS[output_format]
+    database = issubclass(sink_class, DatabaseSink)
+    os.makedirs(directory, exist_ok=True)
+    sinks = {}
+    for table, schema in tables.items():
+        transform = None
+        if (normalized or database) and table in NORMALIZERS:
+            convert_schema, transform = NORMALIZERS[table]
+            schema = convert_schema(schema)
+        if database:
+            sinks[table] = sink_class(
+                os.path.join(directory,
+                             DATABASE_NAME + EXTENSIONS[output_format]),
+                schema, row_group_size, transform, table, scrape_date
+            )
+        else:
+            sinks[table] = sink_class(
+                os.path.join(directory, table + EXTENSIONS[output_format]),
+                schema, row_group_size, transform
+            )
+    return sinks
+
+
+def close_sinks(sinks):
+    """Close every sink in the dict returned by open_sinks()."""
+    for sink in sinks.values():
+        sink.close()
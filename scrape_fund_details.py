@@ -1,104 +1,487 @@
-#pylint: disable-msg=too-many-locals
 """
 Program that scrapes details of mutual funds from fundata website.
 """
+import argparse
+import datetime
+import os
+import subprocess
+import sys
 import time
-from random import randint
-import pandas as pd
-from fundatascraper import fundlist
-from fundatascraper.fund_page import FundProfileScraper
+from fundatascraper import fundlist, incremental, schema, shards, writers
+from fundatascraper.cache import PageCache
+from fundatascraper.fetch import ConcurrentFetcher
+from fundatascraper.history import SnapshotStore
+from fundatascraper.journal import (CrawlJournal, journal_scrape_date,
+                                    write_dead_letter)
+from fundatascraper.metrics import Metrics, ProgressReporter
+from fundatascraper.parsers import BACKENDS
+from fundatascraper.pipeline import CrawlPipeline
+from fundatascraper.session import HttpSession
 
-def main():
+BASE_URL = 'http://idata.fundata.com'
+
+
+def comma_list(value):
+    """ Split a comma separated command line value into a list. """
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+def parse_args(argv=None):
+    """ Parse command line options. """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--workers', type=int, default=4,
+                        help='maximum number of page downloads in flight')
+    parser.add_argument('--rate', type=float, default=1.0,
+                        help='maximum requests per second to fundata.com')
+    parser.add_argument('--burst', type=int, default=1,
+                        help='number of requests allowed in a single burst')
+    parser.add_argument('--retries', type=int, default=3,
+                        help='times a page is retried after a transient'
+                             ' network error')
+    parser.add_argument('--backoff', type=float, default=1.0,
+                        help='base delay in seconds of the exponential'
+                             ' backoff between retries')
+    parser.add_argument('--connect-timeout', type=float, default=10,
+                        help='seconds to wait for a connection to open')
+    parser.add_argument('--read-timeout', type=float, default=30,
+                        help='seconds to wait for data from an open'
+                             ' connection')
+    parser.add_argument('--base-url', default=BASE_URL,
+                        help='site the fund page hrefs are relative to')
+    parser.add_argument('--search-url', default=fundlist.SEARCH_URL,
+                        help='url of the fund search listing')
+    parser.add_argument('--list-mode', choices=('http', 'selenium'),
+                        default='http',
+                        help='how to page through the fund search listing')
+    parser.add_argument('--list-workers', type=int, default=1,
+                        help='search pages requested at once while paging'
+                             ' through the fund list')
+    parser.add_argument('--parser', choices=BACKENDS, default='html.parser',
+                        help='backend used to parse fund pages')
+    parser.add_argument('--parse-workers', type=int, default=0,
+                        help='number of parser processes (default: parse in'
+                             ' the main process)')
+    parser.add_argument('--fields', type=comma_list,
+                        help='comma separated single valued fields to'
+                             ' scrape (default: all)')
+    parser.add_argument('--tables', type=comma_list,
+                        help='comma separated output tables to write, out of'
+                             ' ' + ', '.join(writers.TABLES) +
+                             ' (default: all)')
+    parser.add_argument('--output-format', choices=writers.FORMATS,
+                        default='parquet',
+                        help='file format of the output tables')
+    parser.add_argument('--normalize', action='store_true',
+                        help='write single values as typed numeric and'
+                             ' category columns instead of raw strings')
+    parser.add_argument('--output-dir', default='.',
+                        help='directory the output tables are written to')
+    parser.add_argument('--row-group-size', type=int,
+                        default=writers.DEFAULT_ROW_GROUP_SIZE,
+                        help='rows buffered per table before each flush')
+    parser.add_argument('--journal',
+                        help='progress journal used to resume an interrupted'
+                             ' crawl, removed once a run completes without'
+                             ' failures (default: OUTPUT_DIR/journal.jsonl)')
+    parser.add_argument('--cache-dir',
+                        help='directory of the raw page cache (default: no'
+                             ' cache)')
+    parser.add_argument('--cache-ttl', type=float,
+                        help='seconds a cached page is used without asking'
+                             ' the site whether it changed (default: always'
+                             ' revalidate)')
+    parser.add_argument('--cache-max-mb', type=float,
+                        help='evict least recently used pages beyond this'
+                             ' size')
+    parser.add_argument('--offline', action='store_true',
+                        help='re-parse the pages in --cache-dir without'
+                             ' making any requests')
+    parser.add_argument('--incremental', metavar='STATE_DIR',
+                        help='write a change set against the snapshot in'
+                             ' STATE_DIR instead of full output tables')
+    parser.add_argument('--full-every', type=float, default=7,
+                        help='days between full re-scrapes in incremental'
+                             ' mode')
+    parser.add_argument('--history', metavar='HISTORY_DIR',
+                        help='also append the scraped funds to the snapshot'
+                             ' history in HISTORY_DIR')
+    parser.add_argument('--scrape-date',
+                        help='date the funds are stored under in --history'
+                             ' and in database output (default: the date of'
+                             ' the run being resumed, or today)')
+    parser.add_argument('--progress-interval', type=float, default=10,
+                        help='seconds between progress lines on stderr'
+                             ' (0: no progress lines)')
+    parser.add_argument('--metrics-file',
+                        help='file kept up to date with crawl metrics in the'
+                             ' Prometheus text format')
+    parser.add_argument('--summary',
+                        help='JSON summary of the run written at exit'
+                             ' (default: OUTPUT_DIR/run_summary.json)')
+    parser.add_argument('--coordinator', metavar='QUEUE_DIR',
+                        help='split the fund list into shards in QUEUE_DIR,'
+                             ' wait for workers to crawl them and merge'
+                             ' their output')
+    parser.add_argument('--worker', metavar='QUEUE_DIR',
+                        help='crawl shards leased from the coordinator\'s'
+                             ' QUEUE_DIR until all are done')
+    parser.add_argument('--local-workers', type=int, default=0,
+                        help='worker processes the coordinator starts on'
+                             ' this machine')
+    parser.add_argument('--shard-size', type=int,
+                        default=shards.DEFAULT_SHARD_SIZE,
+                        help='funds per shard')
+    parser.add_argument('--lease', type=float,
+                        default=shards.DEFAULT_LEASE_SECONDS,
+                        help='seconds before the shard of a worker that'
+                             ' stopped responding is handed to another')
+    args = parser.parse_args(argv)
+    if args.coordinator and args.worker:
+        parser.error('--coordinator and --worker are exclusive')
+    if (args.coordinator or args.worker) and args.incremental:
+        parser.error('--incremental cannot be used with --coordinator or'
+                     ' --worker')
+    if args.offline and not args.cache_dir:
+        parser.error('--offline requires --cache-dir')
+    if args.fields:
+        unknown = set(args.fields).difference(schema.FIELDS_BY_NAME)
+        if unknown:
+            parser.error('unknown fields: ' + ', '.join(sorted(unknown)))
+    if args.tables:
+        unknown = set(args.tables).difference(writers.TABLES)
+        if unknown:
+            parser.error('unknown tables: ' + ', '.join(sorted(unknown)))
+    if args.incremental and (args.fields or args.tables):
+        parser.error('--fields and --tables cannot be used with'
+                     ' --incremental')
+    if args.history and (args.fields or args.tables or args.incremental or
+                         args.worker):
+        parser.error('--history cannot be used with --fields, --tables,'
+                     ' --incremental or --worker')
+    return args
+
+
+def open_cache(args):
+    """ Open the page cache selected on the command line, if any. """
+    if not args.cache_dir:
+        return None
+    max_bytes = None
+    if args.cache_max_mb is not None:
+        max_bytes = int(args.cache_max_mb * 1024 * 1024)
+    return PageCache(args.cache_dir, ttl=args.cache_ttl, max_bytes=max_bytes)
+
+
+def cached_href_list(cache, base_url=BASE_URL):
+    """ Return the hrefs of every fund page in the cache. """
+    return [url[len(base_url):] for url in cache.urls()
+            if url.startswith(base_url + '/')]
+
+
+def replay_journal(journal, sinks, metrics):
+    """ Write the funds completed in `journal` to `sinks`. """
+    for _, fund_records in journal.completed_records():
+        for table, records in fund_records.items():
+            # The journal may hold tables left out of this run.
+            if table in sinks:
+                sinks[table].write_many(records)
+        metrics.increment("funds_resumed")
+
+
+def stream_fund_list(listing, href_list, errors, metrics, reporter):
+    """
+    Yield the hrefs of the lazy fund list `listing` as its pages arrive,
+    appending each to `href_list`. Once the list is complete its length
+    becomes the reporter's total. An error while paging is appended to
+    `errors` rather than raised, so the funds listed so far are still
+    scraped.
+    """
+    start = time.perf_counter()
+    try:
+        for href in listing:
+            href_list.append(href)
+            yield href
+    except Exception as error:  # pylint: disable=broad-except
+        errors.append(error)
+        return
+    metrics.observe("fund_list", time.perf_counter() - start)
+    reporter.total = len(href_list)
+
+
+def crawl(pipeline, href_list, journal, sinks, metrics):
+    """
+    Scrape every fund in `href_list`, which may be a lazy iterable,
+    recording each in `journal` and writing its records to `sinks`.
+    returns: list of (href, exception) for the funds that failed.
+    """
+    failures = []
+    first = True
+    for href, fund_records in pipeline.run(href_list):
+        if isinstance(fund_records, Exception):
+            journal.record_failed(href, fund_records)
+            failures.append((href, fund_records))
+            metrics.increment("funds_failed")
+            continue
+        with metrics.timer("write"):
+            journal.record_done(href, fund_records)
+            for table, records in fund_records.items():
+                if table in sinks:
+                    sinks[table].write_many(records)
+        if first:
+            metrics.observe("first_record", metrics.elapsed())
+            first = False
+        metrics.increment("funds_scraped")
+        metrics.increment("missing_fields",
+                          len(fund_records.get("errors", ())))
+    return failures
+
+
+def crawl_journal_path(args):
+    """ Return the path of the journal of a crawl. """
+    return args.journal or os.path.join(args.output_dir, 'journal.jsonl')
+
+
+def resolve_scrape_date(args):
+    """
+    Fill in args.scrape_date if it was not given. A crawl resuming from its
+    journal keeps the scrape date of the interrupted run, even when it is
+    resumed after midnight; otherwise the date is today.
+    """
+    if args.scrape_date is None and not (args.coordinator or args.worker or
+                                         args.incremental):
+        args.scrape_date = journal_scrape_date(crawl_journal_path(args))
+    if args.scrape_date is None:
+        args.scrape_date = datetime.date.today().isoformat()
+
+
+def append_history(args, journal_paths, href_list, metrics):
+    """ Append the funds completed in the journals to args.history. """
+    def funds():
+        for path in journal_paths:
+            with CrawlJournal(path) as journal:
+                yield from journal.completed_records()
+
+    with metrics.timer("history"), SnapshotStore(args.history) as store:
+        counts = store.append(args.scrape_date, funds(), href_list)
+    print("History {} on {}: {written} written, {unchanged} unchanged,"
+          " {deleted} deleted".format(args.history, args.scrape_date,
+                                      **counts))
+
+
+# Coordinator options, with their values, that workers do not take. Local
+# workers write their summaries to the queue directory instead of the
+# coordinator's files.
+COORDINATOR_OPTIONS = ('--local-workers', '--history', '--scrape-date',
+                       '--summary', '--metrics-file')
+
+
+def worker_argv(argv):
+    """ Turn the coordinator's command line into a worker's. """
+    result = []
+    skip = False
+    for arg in argv:
+        if skip:
+            skip = False
+        elif arg == '--coordinator':
+            result.append('--worker')
+        elif arg.startswith('--coordinator='):
+            result.append('--worker=' + arg.split('=', 1)[1])
+        elif arg in COORDINATOR_OPTIONS:
+            skip = True
+        elif not arg.startswith(tuple(option + '='
+                                      for option in COORDINATOR_OPTIONS)):
+            result.append(arg)
+    return result
+
+
+def run_worker(args, pipeline, metrics):
+    """ Crawl shards from the queue in args.worker until all are done. """
+    queue = shards.ShardQueue(args.worker, args.lease)
+
+    def crawl_shard(shard, journal):
+        crawl(pipeline, journal.pending(shard.hrefs), journal, {}, metrics)
+
+    try:
+        completed = shards.work(queue, crawl_shard)
+    finally:
+        queue.close()
+    print("Completed {} shards".format(completed))
+
+
+def run_coordinator(args, argv, href_list, metrics):
+    """
+    Queue `href_list` as shards in args.coordinator, start any local
+    workers, wait for every shard to be done and merge the shard journals
+    into the output tables.
+    returns: list of failed journal entries.
+    """
+    queue = shards.ShardQueue(args.coordinator, args.lease)
+    try:
+        count = queue.create(href_list, args.shard_size)
+        print("{} funds in {} shards".format(len(href_list), count))
+        workers = [subprocess.Popen([sys.executable, os.path.abspath(__file__)]
+                                    + worker_argv(argv))
+                   for _ in range(args.local_workers)]
+        while not queue.finished():
+            if workers and all(worker.poll() is not None
+                               for worker in workers):
+                raise SystemExit("All local workers exited with shards left:"
+                                 " {}".format(queue.counts()))
+            time.sleep(1)
+        for worker in workers:
+            worker.wait()
+
+        sinks = writers.open_sinks(
+            args.output_format, args.output_dir, args.row_group_size,
+            writers.table_schemas(args.fields, args.tables),
+            normalized=args.normalize, scrape_date=args.scrape_date)
+        try:
+            with metrics.timer("merge"):
+                failures = shards.merge(queue, sinks)
+        finally:
+            writers.close_sinks(sinks)
+        if args.history:
+            append_history(args, queue.completed_journals(), href_list,
+                           metrics)
+    finally:
+        queue.close()
+    return failures
+
+
+def main(argv=None):
     """ Scrape details of all mutual funds listed on fundata.com """
-    href_list = fundlist.get_fund_list()
-
-    single_values = None
-    asset_allocations = None
-    geo_allocations = None
-    sector_allocations = None
-    top10_holdings = None
-
-    for href in href_list:
-        url = 'http://idata.fundata.com' + href
-        fund_profile = FundProfileScraper(url)
-
-        value_dict = fund_profile.scrape_all_single_value()
-        if single_values is None:
-            single_values = pd.DataFrame([value_dict.values()],
-                                         columns=value_dict.keys())
-        else:
-            temp_df = pd.DataFrame(value_dict.values(),
-                                   columns=value_dict.keys())
-            single_values.append(temp_df)
-
-        asset_allocation_list = fund_profile.scrape_asset_allocation()
-        allocations_with_href = [[href, asset_class]
-                                 for asset_class in asset_allocation_list]
-        if asset_allocations is None:
-            asset_allocations = pd.DataFrame(
-                allocations_with_href,
-                columns=['href', 'asset_allocation']
-            )
-        else:
-            temp_df = pd.DataFrame(
-                allocations_with_href,
-                columns=['href', 'asset_allocation']
-            )
-            asset_allocations.append(temp_df)
-
-
-        geo_allocations_list = fund_profile.scrape_geo_allocation()
-        geo_allocations_href = [[href, geo_class]
-                                for geo_class in geo_allocations_list]
-        if geo_allocations is None:
-            geo_allocations = pd.DataFrame(
-                geo_allocations_href,
-                columns=['href', 'geo_allocation']
-            )
+    if argv is None:
+        argv = sys.argv[1:]
+    args = parse_args(argv)
+    resolve_scrape_date(args)
+    metrics = Metrics()
+    cache = open_cache(args)
+    session = HttpSession(connect_timeout=args.connect_timeout,
+                          read_timeout=args.read_timeout,
+                          max_per_host=args.workers)
+    fetcher = ConcurrentFetcher(max_workers=args.workers, rate=args.rate,
+                                burst=args.burst, cache=cache,
+                                offline=args.offline, retries=args.retries,
+                                backoff=args.backoff, session=session,
+                                metrics=metrics)
+    listing = None
+    if args.worker:
+        href_list = None
+    elif args.offline:
+        href_list = cached_href_list(cache, args.base_url)
+        if not href_list:
+            cache.close()
+            raise SystemExit('No pages under {} in the cache {}; check'
+                             ' --base-url'.format(args.base_url,
+                                                  args.cache_dir))
+    else:
+        # The search pages share the fetcher's rate budget for the site.
+        listing = fundlist.iter_fund_list(
+            mode=args.list_mode, search_url=args.search_url, rate=args.rate,
+            session=session, page_workers=args.list_workers,
+            bucket=fetcher.bucket_for(args.search_url), metrics=metrics)
+        if args.coordinator or args.incremental:
+            with metrics.timer("fund_list"):
+                href_list = list(listing)
+            listing = None
         else:
-            temp_df = pd.DataFrame(
-                geo_allocations_href,
-                columns=['href', 'geo_allocation']
-            )
-            geo_allocations.append(temp_df)
-
-        sector_allocations_list = fund_profile.scrape_sector_allocation()
-        sector_allocations_href = [[href, sector_class]
-                                   for sector_class in sector_allocations_list]
-        if sector_allocations is None:
-            sector_allocations = pd.DataFrame(
-                sector_allocations_href,
-                columns=['href', 'sector_allocation']
-            )
-        else:
-            temp_df = pd.DataFrame(
-                sector_allocations_href,
-                columns=['href', 'sector_allocation']
-            )
-            sector_allocations.append(temp_df)
-
-        top10_holding_list = fund_profile.scrape_top10_holdings()
-        top10_holding_href = [[href, holding]
-                              for holding in top10_holding_list]
-        if top10_holdings is None:
-            top10_holdings = pd.DataFrame(
-                top10_holding_href,
-                columns=['href', 'holding']
-            )
-        else:
-            temp_df = pd.DataFrame(
-                top10_holding_href,
-                columns=['href', 'holding']
-            )
-            top10_holdings.append(temp_df)
-
-        time.sleep(randint(1, 5))
-
-    single_values.to_pickle('./single_values.pkl')
-    asset_allocations.to_pickle('./asset_allocations.pkl')
-    geo_allocations.to_pickle('./geo_allocations.pkl')
-    sector_allocations.to_pickle('sector_allocations.pkl')
-    top10_holdings.to_pickle('top10_holdings.pkl')
+            # Filled in by stream_fund_list() as the crawl goes.
+            href_list = []
+    reporter = ProgressReporter(metrics,
+                                len(href_list) if href_list else None,
+                                args.progress_interval, None,
+                                args.metrics_file).start()
+    summary_path = args.summary or os.path.join(args.output_dir,
+                                                'run_summary.json')
+    if args.worker and not args.summary:
+        summary_path = os.path.join(args.worker, 'workers',
+                                    shards.default_worker_id() + '.json')
+    pipeline = CrawlPipeline(fetcher, args.base_url,
+                             parse_workers=args.parse_workers,
+                             parser=args.parser, metrics=metrics,
+                             fields=args.fields, tables=args.tables)
+
+    if args.worker or args.coordinator:
+        failures = []
+        try:
+            if args.worker:
+                run_worker(args, pipeline, metrics)
+            else:
+                failures = run_coordinator(args, argv, href_list, metrics)
+                write_dead_letter(os.path.join(args.output_dir,
+                                               'dead_letter.jsonl'), failures)
+        finally:
+            reporter.stop()
+            metrics.write_summary(summary_path)
+            session.close()
+            if cache is not None:
+                cache.close()
+        if failures:
+            print("{} funds failed, see {}".format(
+                len(failures),
+                os.path.join(args.output_dir, 'dead_letter.jsonl')))
+        return
+
+    if args.incremental:
+        path, counts = incremental.refresh(
+            href_list, fetcher, args.incremental, args.base_url,
+            parser=args.parser, full_every=args.full_every * 24 * 60 * 60
+        )
+        print("Wrote {}: {insert} inserts, {update} updates, {delete}"
+              " deletes, {failed} failed".format(path, **counts))
+        if counts['failed']:
+            print("Failed funds are listed in {}".format(os.path.join(
+                args.incremental, 'dead_letter.jsonl')))
+        reporter.stop()
+        metrics.write_summary(summary_path)
+        session.close()
+        if cache is not None:
+            cache.close()
+        return
+
+    sinks = writers.open_sinks(args.output_format, args.output_dir,
+                               args.row_group_size,
+                               writers.table_schemas(args.fields, args.tables),
+                               normalized=args.normalize,
+                               scrape_date=args.scrape_date)
+    # A journal left by a run of another scrape date is started over, so a
+    # later day's run never replays the records of an earlier one.
+    journal_path = crawl_journal_path(args)
+    journal = CrawlJournal(journal_path, args.scrape_date)
+    hrefs = href_list
+    list_errors = []
+    if listing is not None:
+        # Funds are scraped as soon as their search page arrives.
+        hrefs = stream_fund_list(listing, href_list, list_errors, metrics,
+                                 reporter)
+    failures = []
+    try:
+        # Funds finished by an earlier run are copied from the journal
+        # instead of being downloaded and parsed again.
+        replay_journal(journal, sinks, metrics)
+        failures = crawl(pipeline, journal.pending(hrefs), journal, sinks,
+                         metrics)
+        if list_errors:
+            raise list_errors[0]
+        if args.history:
+            append_history(args, [journal_path], href_list, metrics)
+    finally:
+        journal.close()
+        with metrics.timer("close_sinks"):
+            writers.close_sinks(sinks)
+        write_dead_letter(os.path.join(args.output_dir, 'dead_letter.jsonl'),
+                          failures)
+        reporter.stop()
+        metrics.write_summary(summary_path)
+        session.close()
+        if cache is not None:
+            cache.close()
+    if failures:
+        print("{} funds failed, see {}".format(
+            len(failures), os.path.join(args.output_dir, 'dead_letter.jsonl')))
+    else:
+        # Every fund is in the output, so there is nothing left to resume;
+        # the next run (such as an --offline re-parse) starts from scratch.
+        os.remove(journal_path)
 
 
 if __name__ == "__main__":
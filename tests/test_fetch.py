@@ -0,0 +1,104 @@
+"""
+Tests of the page cache revalidation in fundatascraper.fetch: cached pages
+are requested again with If-None-Match/If-Modified-Since, a 304 Not
+Modified reuses the cached body and a 200 replaces it.
+
+Usage: python -m pytest tests
+"""
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+# pylint: disable=wrong-import-position
+from fundatascraper.cache import CacheMiss, PageCache
+from fundatascraper.fetch import ConcurrentFetcher
+from fundatascraper.session import HttpSession
+
+URL = 'http://funds.test/fund?id=1'
+
+
+class ScriptedTransport:
+    """Transport answering each request with the next scripted response."""
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def send(self, method, url, body, headers):
+        """Record the request and return the next response."""
+        self.requests.append((method, url, dict(headers)))
+        return self.responses.pop(0)
+
+    def close(self):
+        """Nothing to close."""
+
+
+def fetcher_for(cache, transport, offline=False):
+    """Return a ConcurrentFetcher sending its requests to `transport`."""
+    return ConcurrentFetcher(cache=cache, offline=offline, rate=1e9,
+                             burst=1000, retries=0,
+                             session=HttpSession(transport=transport))
+
+
+@pytest.fixture(name='cache')
+def cache_fixture(tmp_path):
+    cache = PageCache(str(tmp_path))
+    cache.put(URL, b'old page', etag='"v1"',
+              last_modified='Mon, 05 Jan 2026 00:00:00 GMT')
+    yield cache
+    cache.close()
+
+
+def test_not_modified_keeps_body(cache):
+    transport = ScriptedTransport([(304, 'Not Modified', {}, b'')])
+    fetcher = fetcher_for(cache, transport)
+    assert fetcher.fetch_once(URL) == b'old page'
+    _, _, headers = transport.requests[0]
+    assert headers['If-None-Match'] == '"v1"'
+    assert headers['If-Modified-Since'] == 'Mon, 05 Jan 2026 00:00:00 GMT'
+    assert cache.get(URL).body == b'old page'
+    assert fetcher.metrics.counters['not_modified'] == 1
+
+
+def test_changed_page_replaces_body(cache):
+    transport = ScriptedTransport([(200, 'OK', {'ETag': '"v2"'}, b'new page')])
+    fetcher = fetcher_for(cache, transport)
+    assert fetcher.fetch_once(URL) == b'new page'
+    assert transport.requests[0][2]['If-None-Match'] == '"v1"'
+    page = cache.get(URL)
+    assert (page.body, page.etag) == (b'new page', '"v2"')
+
+
+def test_ttl_trusts_recent_pages(cache):
+    cache.ttl = 3600
+    transport = ScriptedTransport([])
+    assert fetcher_for(cache, transport).fetch_once(URL) == b'old page'
+    assert not transport.requests
+
+
+def test_offline_uses_cache_only(cache):
+    transport = ScriptedTransport([])
+    fetcher = fetcher_for(cache, transport, offline=True)
+    assert fetcher.fetch_once(URL) == b'old page'
+    with pytest.raises(CacheMiss):
+        fetcher.fetch_once(URL + '2')
+    assert not transport.requests
+
+
+def test_eviction_sees_batched_reads(tmp_path):
+    cache = PageCache(str(tmp_path))
+    cache.put(URL, b'old page')
+    time.sleep(0.01)
+    cache.put(URL + '2', b'other page')
+    time.sleep(0.01)
+    cache.get(URL)
+    assert URL in cache.accessed
+    # The page read last is kept even though it was stored first.
+    cache.max_bytes = cache.size() - 1
+    cache.evict()
+    assert cache.urls() == [URL]
+    assert not cache.accessed
+    cache.close()
@@ -0,0 +1,42 @@
+"""
+Tests of paging through the fund list in fundatascraper.fundlist against
+the replay server in benchmarks/replay.py, whose pager, like the real
+site's, only links to the pages of the current block of ten.
+
+Usage: python -m pytest tests
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir,
+                                'benchmarks'))
+
+# pylint: disable=wrong-import-position
+from fundatascraper import fundlist
+from fundatascraper.metrics import Metrics
+from replay import FUND_PATH, ReplayServer
+
+NUM_FUNDS = 235
+FUNDS_PER_PAGE = 10
+
+
+@pytest.fixture(name='server', scope='module')
+def server_fixture():
+    with ReplayServer(NUM_FUNDS, funds_per_page=FUNDS_PER_PAGE) as server:
+        yield server
+
+
+@pytest.mark.parametrize('page_workers', [1, 3])
+def test_every_fund_listed_once(server, page_workers):
+    metrics = Metrics()
+    hrefs = list(fundlist.iter_fund_list(
+        'http', server.search_url, rate=1000, page_workers=page_workers,
+        metrics=metrics))
+    assert sorted(hrefs) == sorted('{}?id={}'.format(FUND_PATH, fund_id)
+                                   for fund_id in range(NUM_FUNDS))
+    assert len(set(hrefs)) == len(hrefs)
+    assert metrics.counters['list_pages'] == 24
+    assert metrics.counters['funds_listed'] == NUM_FUNDS
@@ -0,0 +1,87 @@
+"""
+Tests of the snapshot store in fundatascraper.history: runs that leave a
+fund unchanged, change it or drop it from the fund list, read back with
+history() and cross_section().
+
+Usage: python -m pytest tests
+"""
+import copy
+import glob
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+# pylint: disable=wrong-import-position
+from fundatascraper.fund_page import FundProfileScraper
+from fundatascraper.history import SnapshotStore
+
+pytest.importorskip('pyarrow')
+
+FIXTURE = sorted(glob.glob(os.path.join(
+    os.path.dirname(__file__), os.pardir, 'benchmarks', 'fixtures',
+    '*.html')))[0]
+
+FUND_A = '/fund?id=1'
+FUND_B = '/fund?id=2'
+
+
+def fixture_records(href):
+    """Return the records of the fixture page scraped as fund `href`."""
+    with open(FIXTURE, 'rb') as fixture:
+        return FundProfileScraper(FIXTURE, html=fixture.read())\
+            .scrape_records(href)
+
+
+def with_navps(records, navps):
+    """Return a copy of `records` with another NAVPS."""
+    records = copy.deepcopy(records)
+    records['single_values'][0]['navps'] = navps
+    return records
+
+
+def test_unchanged_changed_and_removed_funds(tmp_path):
+    fund_a, fund_b = fixture_records(FUND_A), fixture_records(FUND_B)
+    changed_a = with_navps(fund_a, '$30.00')
+    with SnapshotStore(str(tmp_path)) as store:
+        first = store.append('2024-01-01', [(FUND_A, fund_a),
+                                            (FUND_B, fund_b)])
+        unchanged = store.append('2024-01-02', [(FUND_A, fund_a),
+                                                (FUND_B, fund_b)])
+        changed = store.append('2024-01-03', [(FUND_A, changed_a),
+                                              (FUND_B, fund_b)])
+        removed = store.append('2024-01-04', [(FUND_A, changed_a)],
+                               href_list=[FUND_A])
+
+        assert first['written'] > 0
+        assert unchanged == {'written': 0, 'unchanged': 2 * len(fund_a),
+                             'deleted': 0}
+        assert changed['written'] == 1
+        # A deleted version for each table fund B had rows in.
+        assert removed['written'] == 0
+        assert removed['deleted'] == sum(1 for rows in fund_b.values()
+                                         if rows)
+        assert store.dates() == ['2024-01-01', '2024-01-02', '2024-01-03',
+                                 '2024-01-04']
+
+        history = store.history(FUND_A, ['navps'])
+        assert history['scrape_date'].tolist() == ['2024-01-01',
+                                                   '2024-01-03']
+        assert history['navps'].tolist() == pytest.approx([27.7827, 30.0])
+        assert store.history(FUND_B, ['navps'])['scrape_date'].tolist() == \
+            ['2024-01-01']
+        assert len(store.history(FUND_A, table='top10_holdings')) == \
+            len(fund_a['top10_holdings'])
+
+        def navps_on(as_of):
+            section = store.cross_section(as_of, ['navps'])
+            return {href: round(float(navps), 4)
+                    for href, navps in zip(section['href'],
+                                           section['navps'])}
+
+        assert navps_on('2024-01-02') == {FUND_A: 27.7827, FUND_B: 27.7827}
+        assert navps_on('2024-01-03') == {FUND_A: 30.0, FUND_B: 27.7827}
+        assert navps_on('2024-01-04') == {FUND_A: 30.0}
+        assert navps_on('2023-12-31') == {}
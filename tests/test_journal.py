@@ -0,0 +1,114 @@
+"""
+Tests of the crawl journal in fundatascraper.journal and of resuming an
+interrupted crawl of the replay server with scrape_fund_details.py.
+
+Usage: python -m pytest tests
+"""
+import json
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir,
+                                'benchmarks'))
+
+# pylint: disable=wrong-import-position
+import scrape_fund_details
+from fundatascraper import pipeline
+from fundatascraper.journal import CrawlJournal, journal_scrape_date
+from replay import ReplayServer
+
+RECORDS = {'single_values': [{'href': '/a'}]}
+
+
+class Interrupted(BaseException):
+    """Stands in for the crawl process being killed."""
+
+
+def test_repair_truncated_last_line(tmp_path):
+    path = str(tmp_path / 'journal.jsonl')
+    with CrawlJournal(path, '2024-01-31') as journal:
+        journal.record_done('/a', RECORDS)
+        journal.record_failed('/b', OSError('timed out'))
+    with open(path, 'ab') as journal:
+        journal.write(b'{"href": "/c", "status": "do')
+
+    with CrawlJournal(path) as journal:
+        assert journal.scrape_date == '2024-01-31'
+        assert journal.completed() == {'/a'}
+        assert [entry['href'] for entry in journal.failed_entries()] == \
+            ['/b']
+        journal.record_done('/c', RECORDS)
+    with open(path, 'rb') as journal:
+        lines = journal.read().splitlines()
+    assert len(lines) == 4
+    assert [json.loads(line).get('href') for line in lines] == \
+        [None, '/a', '/b', '/c']
+
+
+def test_pending_skips_completed(tmp_path):
+    path = str(tmp_path / 'journal.jsonl')
+    with CrawlJournal(path) as journal:
+        journal.record_done('/a', RECORDS)
+        journal.record_failed('/b', OSError('timed out'))
+        journal.record_done('/c', RECORDS)
+    with CrawlJournal(path) as journal:
+        hrefs = (href for href in ['/a', '/b', '/c', '/d'])
+        assert list(journal.pending(hrefs)) == ['/b', '/d']
+        assert [href for href, _ in journal.completed_records()] == \
+            ['/a', '/c']
+
+
+def test_other_scrape_date_starts_over(tmp_path):
+    path = str(tmp_path / 'journal.jsonl')
+    with CrawlJournal(path, '2024-01-31') as journal:
+        journal.record_done('/a', RECORDS)
+    with CrawlJournal(path, '2024-02-01') as journal:
+        assert journal.completed() == set()
+    assert journal_scrape_date(path) == '2024-02-01'
+
+
+def test_resumed_crawl_writes_each_fund_once(tmp_path, monkeypatch):
+    output_dir = str(tmp_path)
+    parse_page = pipeline.parse_page
+    parsed = []
+
+    def interrupted_parse_page(*args):
+        if len(parsed) == 12:
+            raise Interrupted()
+        parsed.append(args[1])
+        return parse_page(*args)
+
+    with ReplayServer(30, funds_per_page=10) as server:
+        argv = ['--base-url', server.base_url,
+                '--search-url', server.search_url, '--rate', '1000',
+                '--burst', '100', '--workers', '2', '--output-dir',
+                output_dir, '--output-format', 'sqlite',
+                '--progress-interval', '0']
+        monkeypatch.setattr(pipeline, 'parse_page', interrupted_parse_page)
+        with pytest.raises(Interrupted):
+            scrape_fund_details.main(argv + ['--scrape-date', '2024-01-31'])
+        journal_path = os.path.join(output_dir, 'journal.jsonl')
+        with CrawlJournal(journal_path) as journal:
+            assert journal.scrape_date == '2024-01-31'
+            assert len(journal.completed()) == 12
+
+        # Resumed the next day without --scrape-date.
+        def counted_parse_page(*args):
+            parsed.append(args[1])
+            return parse_page(*args)
+        monkeypatch.setattr(pipeline, 'parse_page', counted_parse_page)
+        scrape_fund_details.main(argv)
+        assert len(parsed) == 30
+
+    assert not os.path.exists(journal_path)
+    database = sqlite3.connect(os.path.join(output_dir, 'funds.sqlite'))
+    rows = database.execute(
+        'SELECT href, scrape_date FROM single_values').fetchall()
+    database.close()
+    assert len(rows) == 30
+    assert len({href for href, _ in rows}) == 30
+    assert {scrape_date for _, scrape_date in rows} == {'2024-01-31'}
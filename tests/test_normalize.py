@@ -0,0 +1,92 @@
+"""
+Tests of the conversions in fundatascraper.normalize, on the raw values of
+the fixture page in benchmarks/fixtures and on the other forms the site
+uses.
+
+Usage: python -m pytest tests
+"""
+import glob
+import math
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+# pylint: disable=wrong-import-position
+from fundatascraper import normalize
+from fundatascraper.fund_page import FundProfileScraper
+
+FIXTURE = sorted(glob.glob(os.path.join(
+    os.path.dirname(__file__), os.pardir, 'benchmarks', 'fixtures',
+    '*.html')))[0]
+
+NA = None
+
+# (field, raw value, converted value); None stands for NA.
+CONVERSIONS = [
+    # Raw values from the fixture page.
+    ('inception_return', '-2.05%', -2.05),
+    ('mer', '2.35%', 2.35),
+    ('max_front_end', '5.00%', 5.0),
+    ('fund_10year_return', '-', NA),
+    ('navps', '$27.7827', 27.7827),
+    ('change', '-0.2565', -0.2565),
+    ('std_dev', '8.91', 8.91),
+    ('assets', '$1,234.5M', 1234.5),
+    ('rank', '2', 2),
+    ('quartile_rank__5year_return', '3', 3),
+    ('quartile_rank__10year_return', '-', NA),
+    ('load', 'Optional', 'Optional'),
+    ('sales_status', 'Open', 'Open'),
+    ('volatility_rank', 'Moderate', 'Moderate'),
+    # Other forms.
+    ('mer', ' 1.10 % ', 1.10),
+    ('change', '(1.23)', -1.23),
+    ('navps', 'N/A', NA),
+    ('navps', '', NA),
+    ('assets', '$850K', 0.85),
+    ('assets', '$2.1B', 2100.0),
+    ('assets', '$500,000', 0.5),
+    ('assets', '-', NA),
+    ('assets', '$12.3X', NA),
+    ('rank', '4th', 4),
+    ('load', '-', NA),
+    ('sales_status', 'N/A', NA),
+]
+
+CONVERTED_TYPES = {
+    normalize.to_float32: 'float32',
+    normalize.to_assets: 'float32',
+    normalize.to_quartile: 'Int8',
+    normalize.to_category: 'category',
+}
+
+
+@pytest.mark.parametrize('field,raw,expected', CONVERSIONS)
+def test_conversion(field, raw, expected):
+    converted = normalize.COLUMN_CONVERTERS[field](pd.Series([raw]))
+    assert str(converted.dtype) == CONVERTED_TYPES[
+        normalize.COLUMN_CONVERTERS[field]]
+    value = converted.iloc[0]
+    if expected is NA:
+        assert pd.isna(value)
+    elif isinstance(expected, float):
+        assert math.isclose(value, expected, rel_tol=1e-6)
+    else:
+        assert value == expected
+
+
+def test_fixture_page():
+    with open(FIXTURE, 'rb') as fixture:
+        html = fixture.read()
+    raw = pd.DataFrame(
+        [FundProfileScraper(FIXTURE, html=html).scrape_all_single_value()])
+    frame = normalize.normalize_single_values(raw)
+    for name, converter in normalize.COLUMN_CONVERTERS.items():
+        assert str(frame[name].dtype) == CONVERTED_TYPES[converter]
+        # Only the values the page leaves blank become NA.
+        assert pd.isna(frame[name].iloc[0]) == (raw[name].iloc[0] == '-')
+    assert frame['management_co'].equals(raw['management_co'])
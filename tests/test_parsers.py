@@ -0,0 +1,158 @@
+"""
+Conformance tests for the parser backends in fundatascraper.parsers: every
+backend must give the scrape_* methods the same values as html.parser, on
+the saved pages in benchmarks/fixtures and on malformed markup.
+
+Usage: python -m pytest tests
+"""
+import glob
+import importlib.util
+import io
+import os
+import sys
+
+import pytest
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+# pylint: disable=wrong-import-position
+from fundatascraper import fund_page
+from fundatascraper.fund_page import FundProfileScraper
+from fundatascraper.parsers import BACKENDS, SoupDocument, parse_document
+
+FIXTURES = sorted(glob.glob(os.path.join(
+    os.path.dirname(__file__), os.pardir, 'benchmarks', 'fixtures',
+    '*.html')))
+
+# The <p> is still open where the page ends.
+MALFORMED = """<html><body>
+<span id="title">Fund &amp; <b>Co</b> &eacute;</span>
+<span id="empty"></span>
+<map id="map"><area title="Equity: 50%"><area title="Bond: 50%" /></map>
+<table id="rows">
+<tr><th>Security</th><th>Weight</th>
+<tr><td>Royal Bank<td>4.78%
+<tr><td><b>TD</b> Bank<td>4.07%<!-- comment -->
+</table>
+<table id="nested"><tr><td>a<table><tr><td>x</td></tr></table>b<td>c
+</table>
+<p id="after">end
+</body></html>"""
+
+TARGETS = ('title', 'empty', 'map', 'rows', 'nested', 'after')
+
+
+def backend_param(backend):
+    """Skip the lxml backend when lxml is not installed."""
+    marks = []
+    if backend == 'lxml' and importlib.util.find_spec('lxml') is None:
+        marks.append(pytest.mark.skip(reason='lxml is not installed'))
+    return pytest.param(backend, marks=marks)
+
+
+ALL_BACKENDS = [backend_param(backend) for backend in BACKENDS]
+
+
+def unstrained_scraper(path, html):
+    """
+    Return a FundProfileScraper reading a BeautifulSoup tree of the whole
+    page, the reference every backend is compared with.
+    """
+    scraper = FundProfileScraper(path, html=html)
+    scraper.document.close()
+    scraper.document = SoupDocument(html, 'html.parser')
+    return scraper
+
+
+def scrape_everything(scraper):
+    """Return the output of every scrape_* method of `scraper`."""
+    return (scraper.scrape_all_single_value(),
+            scraper.scrape_asset_allocation(),
+            scraper.scrape_sector_allocation(),
+            scraper.scrape_geo_allocation(),
+            scraper.scrape_top10_holdings().values.tolist(),
+            [str(error) for error in scraper.errors])
+
+
+def read_fixture(path):
+    """Return the bytes of a fixture page."""
+    with open(path, 'rb') as fixture:
+        return fixture.read()
+
+
+def without_end_tags(html, table_id, tags):
+    """Remove the end tags `tags` from the table `table_id` of `html`."""
+    start = html.index(b'id="' + table_id.encode() + b'"')
+    end = html.index(b'</table>', start)
+    table = html[start:end]
+    for tag in tags:
+        table = table.replace(b'</' + tag + b'>', b'')
+    return html[:start] + table + html[end:]
+
+
+@pytest.mark.parametrize('backend', ALL_BACKENDS)
+@pytest.mark.parametrize('path', FIXTURES, ids=os.path.basename)
+def test_fixture_pages(path, backend):
+    html = read_fixture(path)
+    expected = scrape_everything(unstrained_scraper(path, html))
+    for source in (html, html.decode('utf-8'), io.BytesIO(html)):
+        scraper = FundProfileScraper(path, html=source, parser=backend)
+        assert scrape_everything(scraper) == expected
+
+
+@pytest.mark.parametrize('backend', ALL_BACKENDS)
+@pytest.mark.parametrize('tags', [(b'td',), (b'tr',), (b'td', b'tr')],
+                         ids=['no-td', 'no-tr', 'no-td-tr'])
+@pytest.mark.parametrize('path', FIXTURES, ids=os.path.basename)
+def test_holdings_without_end_tags(path, tags, backend):
+    html = read_fixture(path)
+    expected = FundProfileScraper(path, html=html).scrape_top10_holdings()
+    malformed = without_end_tags(html, fund_page.TOP10_HOLDINGS_TABLE, tags)
+    scraper = FundProfileScraper(path, html=malformed, parser=backend)
+    holdings = scraper.scrape_top10_holdings()
+    # Without </tr> the line break before the next row is in the last cell.
+    assert holdings.apply(lambda column: column.str.strip()).equals(
+        expected.apply(lambda column: column.str.strip()))
+    assert not scraper.errors
+    records = scraper.scrape_top10_holding_records('/fund')
+    assert [record['weight'] for record in records] == \
+        [record['weight'] for record in FundProfileScraper(
+            path, html=html).scrape_top10_holding_records('/fund')]
+
+
+@pytest.mark.parametrize('backend', ALL_BACKENDS)
+def test_malformed_markup(backend):
+    soup = BeautifulSoup(MALFORMED, 'html.parser')
+    reference = SoupDocument(MALFORMED, 'html.parser')
+    document = parse_document(MALFORMED, backend, TARGETS)
+    for element_id in TARGETS:
+        assert document.text(element_id) == soup.find(id=element_id).text
+    assert document.text('title') == 'Fund & Co é'
+    assert document.text('empty') == ''
+    assert document.text('after') == 'end\n'
+    assert document.area_titles('map') == [
+        area['title'] for area in soup.find(id='map').find_all('area')]
+    assert document.area_titles('map') == ['Equity: 50%', 'Bond: 50%']
+    assert document.table_rows('rows') == reference.table_rows('rows')
+    assert document.table_rows('rows') == [
+        [], ['Royal Bank', '4.78%\n'], ['TD Bank', '4.07%\n']]
+    with pytest.raises(KeyError):
+        document.text('missing')
+
+
+@pytest.mark.parametrize('backend', ALL_BACKENDS)
+def test_nested_table(backend):
+    reference = SoupDocument(MALFORMED, 'html.parser')
+    document = parse_document(MALFORMED, backend, TARGETS)
+    assert document.table_rows('nested') == reference.table_rows('nested')
+    assert document.table_rows('nested') == [['ab', 'c\n'], ['x']]
+
+
+@pytest.mark.parametrize('backend', ALL_BACKENDS)
+def test_missing_elements(backend):
+    scraper = FundProfileScraper('empty', html=b'<html></html>',
+                                 parser=backend)
+    assert scraper.scrape_top10_holdings().empty
+    assert scraper.scrape_asset_allocation() == []
+    assert len(scraper.errors) == 2
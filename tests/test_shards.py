@@ -0,0 +1,78 @@
+"""
+Tests of the shard queue in fundatascraper.shards: leases run out and pass
+to other workers, and a worker that lost its lease cannot complete the
+shard.
+
+Usage: python -m pytest tests
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+# pylint: disable=wrong-import-position
+from fundatascraper import shards
+from fundatascraper.shards import ShardQueue
+
+HREFS = ['/a', '/b', '/c']
+
+
+def test_expired_lease_is_reassigned(tmp_path):
+    queue = ShardQueue(str(tmp_path), lease_seconds=10)
+    assert queue.create(HREFS, shard_size=2) == 2
+    first = queue.lease('worker-1', now=0)
+    second = queue.lease('worker-2', now=5)
+    assert (first.shard_id, first.attempt, first.hrefs) == (1, 1, ['/a', '/b'])
+    assert second.hrefs == ['/c']
+    assert queue.lease('worker-3', now=5) is None
+    assert queue.renew(second, 'worker-2', now=9)
+
+    # worker-1's lease ran out at 10; worker-2's was renewed until 19.
+    retry = queue.lease('worker-3', now=11)
+    assert (retry.shard_id, retry.attempt) == (1, 2)
+    assert queue.lease('worker-4', now=11) is None
+    assert not queue.renew(first, 'worker-1', now=12)
+    assert not queue.complete(first, 'worker-1', now=12)
+
+    assert queue.complete(retry, 'worker-3', now=12)
+    assert queue.complete(second, 'worker-2', now=12)
+    assert queue.finished()
+    assert queue.completed_journals() == [queue.journal_path(1, 2),
+                                          queue.journal_path(2, 1)]
+    queue.close()
+
+
+def test_stale_complete_fails(tmp_path):
+    queue = ShardQueue(str(tmp_path), lease_seconds=10)
+    queue.create(HREFS, shard_size=10)
+    shard = queue.lease('worker-1', now=0)
+    assert not queue.complete(shard, 'worker-2', now=1)
+    # Expired, even though no other worker has taken the shard yet.
+    assert not queue.complete(shard, 'worker-1', now=11)
+    assert queue.lease('worker-2', now=11).attempt == 2
+    assert not queue.finished()
+    queue.close()
+
+
+def test_work_does_not_complete_lost_shard(tmp_path):
+    queue = ShardQueue(str(tmp_path), lease_seconds=0.3)
+    queue.create(HREFS, shard_size=10)
+    other = ShardQueue(str(tmp_path), lease_seconds=0.3)
+    attempts = []
+
+    def crawl_shard(shard, journal):
+        attempts.append(shard.attempt)
+        for href in shard.hrefs:
+            journal.record_done(href, {})
+        # Another worker takes the shard, as if this one had stalled.
+        later = time.time() + 60
+        stolen = other.lease('thief', now=later)
+        time.sleep(0.3)
+        assert other.complete(stolen, 'thief', now=later)
+
+    assert shards.work(queue, crawl_shard, worker='worker-1', poll=0.1) == 0
+    assert attempts == [1]
+    assert queue.completed_journals() == [queue.journal_path(1, 2)]
+    queue.close()
+    other.close()